@@ -12,88 +12,313 @@
 具体实现将于后续补充。
 """
 
+from typing import TYPE_CHECKING
+import importlib
+
 # 版本信息
 __version__ = "0.1.0"
 
-# 数据结构和枚举
-from .schemas import (
-    Dimension,
-    BadCode,
-    TaskInput,
-    ScoreDetail,
-    DiscriminativeKeyword,
-    PerBadComparison,
-    DimensionAggStats,
-    TaskLevelAggregation,
-    ModelOutput,
-    validate_task_input,
-    to_json_compatible,
-)
-
-# IO 工具
-from .io_utils import (
-    read_tasks_jsonl,
-    write_jsonl,
-    ensure_dir,
-)
-
-# 数据适配器
-from .adapters import (
-    record_to_task_input,
-    records_to_task_inputs,
-)
-
-# Prompt 构造
-from .prompting import (
-    build_1vN_prompt,
-)
-
-# LLM 调用接口
-from .llm_runner import (
-    call_model,
-    parse_model_response,
-    extract_json_block,
-)
-
-# 单任务分析
-from .per_task import (
-    analyze_task,
-    analyze_tasks,
-)
-
-# 聚合分析
-from .aggregate import (
-    aggregate_dimension_stats,
-    aggregate_keywords,
-    export_aggregates,
-)
-
-# 可视化
-from .visualize import (
-    plot_task_dimension_lollipop,
-    plot_task_keywords_bar,
-    plot_task_wordcloud,
-    plot_global_radar,
-    plot_global_heatmaps,
-    plot_pattern_wordcloud,
-)
-
-# 报告生成
-from .report import (
-    build_report_markdown,
-)
-
-# Pipeline（一键运行）
-from .pipeline import (
-    run_pipeline,
-)
-
-# 多 vLLM 实例支持
-from .multi_vllm import (
-    MultiVLLMClient,
-    create_multi_vllm_client,
-    get_vllm_urls_from_env,
-)
+# 公开名称 -> 所在子模块。子模块在首次访问对应名称时才导入（PEP 562），
+# 使 `import analyze` 不再连带导入 openai / tqdm / matplotlib 等重依赖，
+# 只用到聚合或 IO 的短命令与工作进程可以毫秒级启动。
+_LAZY_ATTRS = {
+    # 数据结构和枚举
+    "Dimension": "schemas",
+    "BadCode": "schemas",
+    "TaskInput": "schemas",
+    "ScoreDetail": "schemas",
+    "DiscriminativeKeyword": "schemas",
+    "PerBadComparison": "schemas",
+    "DimensionAggStats": "schemas",
+    "TaskLevelAggregation": "schemas",
+    "ModelOutput": "schemas",
+    "validate_task_input": "schemas",
+    "to_json_compatible": "schemas",
+
+    # IO 工具
+    "read_tasks_jsonl": "io_utils",
+    "write_jsonl": "io_utils",
+    "ensure_dir": "io_utils",
+
+    # 数据适配器
+    "record_to_task_input": "adapters",
+    "records_to_task_inputs": "adapters",
+
+    # Prompt 构造
+    "build_1vN_prompt": "prompting",
+    "build_packed_prompt": "prompting",
+    "PromptTemplate": "prompting",
+    "SINGLE_TEMPLATE": "prompting",
+    "PACKED_TEMPLATE": "prompting",
+    "estimate_tokens": "prompting",
+
+    # LLM 调用接口
+    "call_model": "llm_runner",
+    "call_model_samples": "llm_runner",
+    "call_model_result": "llm_runner",
+    "call_model_samples_result": "llm_runner",
+    "decode_response": "llm_runner",
+    "LLMResponse": "llm_runner",
+    "parse_model_response": "llm_runner",
+    "extract_json_block": "llm_runner",
+
+    # 单任务分析
+    "analyze_task": "per_task",
+    "analyze_pack": "per_task",
+    "analyze_tasks": "per_task",
+    "analyze_tasks_routed": "per_task",
+
+    # 任务调度
+    "TaskScheduler": "scheduling",
+    "order_units": "scheduling",
+
+    # 多 worker 任务队列
+    "JobQueue": "job_queue",
+    "run_worker": "job_queue",
+
+    # 多任务打包
+    "pack_tasks": "packing",
+    "demux_packed_response": "packing",
+    "demux_packed_data": "packing",
+    "split_task": "packing",
+    "merge_split_outputs": "packing",
+
+    # 不确定性挖掘
+    "score_uncertainty": "uncertainty",
+    "select_for_reannotation": "uncertainty",
+
+    # 聚合分析
+    "aggregate_dimension_stats": "aggregate",
+    "aggregate_keywords": "aggregate",
+    "export_aggregates": "aggregate",
+    "aggregate_grouped": "aggregate",
+    "export_grouped_aggregates": "aggregate",
+
+    # 短语规范化与近义合并
+    "canonical_key": "phrases",
+    "PhraseCanonicalizer": "phrases",
+
+    # 维度差的统计推断
+    "bootstrap_dimension_stats": "stats",
+
+    # 分层抽样
+    "StratifiedSampler": "sampling",
+    "stratified_sample": "sampling",
+    "export_stratified_sample": "sampling",
+
+    # Hard Negative 合成
+    "inject_defect": "hard_negative",
+    "synthesize_bad_codes": "hard_negative",
+    "synthesize_hard_negatives_jsonl": "hard_negative",
+
+    # 多次运行对比
+    "compare_runs": "compare",
+
+    # LLM 调用遥测
+    "configure_telemetry": "telemetry",
+    "get_telemetry": "telemetry",
+    "render_prometheus": "telemetry",
+    "start_metrics_server": "telemetry",
+    # 阶段计时与剖析
+    "StageTimer": "profiling",
+
+    # 可视化
+    "plot_task_dimension_lollipop": "visualize",
+    "plot_task_keywords_bar": "visualize",
+    "plot_task_wordcloud": "visualize",
+    "plot_global_radar": "visualize",
+    "plot_global_heatmaps": "visualize",
+    "plot_pattern_wordcloud": "visualize",
+
+    # 任务级图表批量渲染
+    "render_task_figures": "batch_render",
+
+    # 报告生成
+    "build_report_markdown": "report",
+    "build_report_html": "report",
+
+    # Pipeline（一键运行）
+    "run_pipeline": "pipeline",
+
+    # 多 vLLM 实例支持
+    "MultiVLLMClient": "multi_vllm",
+    "create_multi_vllm_client": "multi_vllm",
+    "get_vllm_urls_from_env": "multi_vllm",
+    "ModelPool": "multi_vllm",
+    "parse_model_pools": "multi_vllm",
+    "get_model_pools_from_env": "multi_vllm",
+}
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # 缓存，后续访问不再经过 __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
+
+
+if TYPE_CHECKING:  # 供静态分析与 IDE 补全使用，运行时不导入
+    # 数据结构和枚举
+    from .schemas import (
+        Dimension,
+        BadCode,
+        TaskInput,
+        ScoreDetail,
+        DiscriminativeKeyword,
+        PerBadComparison,
+        DimensionAggStats,
+        TaskLevelAggregation,
+        ModelOutput,
+        validate_task_input,
+        to_json_compatible,
+    )
+
+    # IO 工具
+    from .io_utils import (
+        read_tasks_jsonl,
+        write_jsonl,
+        ensure_dir,
+    )
+
+    # 数据适配器
+    from .adapters import (
+        record_to_task_input,
+        records_to_task_inputs,
+    )
+
+    # Prompt 构造
+    from .prompting import (
+        build_1vN_prompt,
+        build_packed_prompt,
+        estimate_tokens,
+        PromptTemplate,
+        SINGLE_TEMPLATE,
+        PACKED_TEMPLATE,
+    )
+
+    # LLM 调用接口
+    from .llm_runner import (
+        call_model,
+        call_model_samples,
+        call_model_result,
+        call_model_samples_result,
+        decode_response,
+        LLMResponse,
+        parse_model_response,
+        extract_json_block,
+    )
+
+    # 单任务分析
+    from .per_task import (
+        analyze_task,
+        analyze_pack,
+        analyze_tasks,
+        analyze_tasks_routed,
+    )
+
+    # 任务调度
+    from .scheduling import TaskScheduler, order_units
+
+    # 多 worker 任务队列
+    from .job_queue import JobQueue, run_worker
+
+    # 多任务打包
+    from .packing import (
+        pack_tasks,
+        demux_packed_response,
+        demux_packed_data,
+        split_task,
+        merge_split_outputs,
+    )
+
+    # 不确定性挖掘
+    from .uncertainty import (
+        score_uncertainty,
+        select_for_reannotation,
+    )
+
+    # 聚合分析
+    from .aggregate import (
+        aggregate_dimension_stats,
+        aggregate_keywords,
+        export_aggregates,
+        aggregate_grouped,
+        export_grouped_aggregates,
+    )
+
+    # 短语规范化与近义合并
+    from .phrases import (
+        canonical_key,
+        PhraseCanonicalizer,
+    )
+
+    # 维度差的统计推断
+    from .stats import bootstrap_dimension_stats
+
+    # 分层抽样
+    from .sampling import (
+        StratifiedSampler,
+        stratified_sample,
+        export_stratified_sample,
+    )
+
+    # Hard Negative 合成
+    from .hard_negative import (
+        inject_defect,
+        synthesize_bad_codes,
+        synthesize_hard_negatives_jsonl,
+    )
+
+    # 多次运行对比
+    from .compare import compare_runs
+
+    # LLM 调用遥测
+    from .telemetry import configure_telemetry, get_telemetry, render_prometheus, start_metrics_server
+
+    # 阶段计时与剖析
+    from .profiling import StageTimer
+
+    # 可视化
+    from .visualize import (
+        plot_task_dimension_lollipop,
+        plot_task_keywords_bar,
+        plot_task_wordcloud,
+        plot_global_radar,
+        plot_global_heatmaps,
+        plot_pattern_wordcloud,
+    )
+
+    # 任务级图表批量渲染
+    from .batch_render import (
+        render_task_figures,
+    )
+
+    # 报告生成
+    from .report import (
+        build_report_markdown,
+        build_report_html,
+    )
+
+    # Pipeline（一键运行）
+    from .pipeline import (
+        run_pipeline,
+    )
+
+    # 多 vLLM 实例支持
+    from .multi_vllm import (
+        MultiVLLMClient,
+        create_multi_vllm_client,
+        get_vllm_urls_from_env,
+        ModelPool,
+        parse_model_pools,
+        get_model_pools_from_env,
+    )
 
 __all__ = [
     # 版本
@@ -123,20 +348,81 @@ __all__ = [
     
     # Prompt 构造
     "build_1vN_prompt",
+    "build_packed_prompt",
+    "PromptTemplate",
+    "SINGLE_TEMPLATE",
+    "PACKED_TEMPLATE",
+    "estimate_tokens",
     
     # LLM 调用
     "call_model",
+    "call_model_samples",
+    "call_model_result",
+    "call_model_samples_result",
+    "decode_response",
+    "LLMResponse",
     "parse_model_response",
     "extract_json_block",
     
     # 单任务分析
     "analyze_task",
+    "analyze_pack",
     "analyze_tasks",
+    "analyze_tasks_routed",
+
+    # 任务调度
+    "TaskScheduler",
+    "order_units",
+
+    # 多 worker 任务队列
+    "JobQueue",
+    "run_worker",
+    
+    # 多任务打包
+    "pack_tasks",
+    "demux_packed_response",
+    "demux_packed_data",
+    "split_task",
+    "merge_split_outputs",
+    
+    # 不确定性挖掘
+    "score_uncertainty",
+    "select_for_reannotation",
     
     # 聚合分析
     "aggregate_dimension_stats",
     "aggregate_keywords",
     "export_aggregates",
+    "aggregate_grouped",
+    "export_grouped_aggregates",
+
+    # 短语规范化与近义合并
+    "canonical_key",
+    "PhraseCanonicalizer",
+
+    # 维度差的统计推断
+    "bootstrap_dimension_stats",
+    
+    # 分层抽样
+    "StratifiedSampler",
+    "stratified_sample",
+    "export_stratified_sample",
+    
+    # Hard Negative 合成
+    "inject_defect",
+    "synthesize_bad_codes",
+    "synthesize_hard_negatives_jsonl",
+
+    # 多次运行对比
+    "compare_runs",
+
+    # LLM 调用遥测
+    "configure_telemetry",
+    "get_telemetry",
+    "render_prometheus",
+    "start_metrics_server",
+    # 阶段计时与剖析
+    "StageTimer",
     
     # 可视化
     "plot_task_dimension_lollipop",
@@ -146,8 +432,12 @@ __all__ = [
     "plot_global_heatmaps",
     "plot_pattern_wordcloud",
     
+    # 任务级图表批量渲染
+    "render_task_figures",
+    
     # 报告生成
     "build_report_markdown",
+    "build_report_html",
     
     # Pipeline
     "run_pipeline",
@@ -156,4 +446,7 @@ __all__ = [
     "MultiVLLMClient",
     "create_multi_vllm_client",
     "get_vllm_urls_from_env",
+    "ModelPool",
+    "parse_model_pools",
+    "get_model_pools_from_env",
 ]
@@ -6,6 +6,8 @@
   - good_code: list[str] (1 个元素) -> 取第一个作为 good_code
   - bad_code:  list[str] (1~3 个)   -> 逐个生成 BadCode（bad_id: b1..bN）
 - 可选：task_id、language（如未提供将使用默认或生成）
+- 可选：priority: int，调度优先级（越大越先派发，默认 0）
+- 可选：defect_tags: list[list[str]]，与 bad_code 逐个对应（合成 Hard Negative 时写入）
 """
 
 from __future__ import annotations
@@ -42,6 +44,7 @@ def record_to_task_input(
 
     good_list = _as_list_str(rec.get("good_code"))
     bad_list = _as_list_str(rec.get("bad_code"))
+    tag_lists = rec.get("defect_tags") or []
 
     # 任务 ID 与语言
     task_id = str(rec.get("task_id") or (f"T{idx:04d}" if idx is not None else _uuid.uuid4().hex[:8]))
@@ -52,7 +55,15 @@ def record_to_task_input(
         language=language,
         prompt=str(rec["task"]),
         good_code=good_list[0] if good_list else "",
-        bad_codes=[BadCode(bad_id=f"b{i+1}", code=code) for i, code in enumerate(bad_list)],
+        bad_codes=[
+            BadCode(
+                bad_id=f"b{i+1}",
+                code=code,
+                defect_tags=_as_list_str(tag_lists[i]) if i < len(tag_lists) else [],
+            )
+            for i, code in enumerate(bad_list)
+        ],
+        priority=int(rec.get("priority") or 0),
     )
 
 
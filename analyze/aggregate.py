@@ -4,19 +4,27 @@
 - 解析 per_task 输出（JSONL）；
 - 计算跨任务维度统计；
 - 聚合关键词权重；
+- 按语言 / 任务 ID 前缀一次遍历计算分组切片；
 - 导出 CSV 结果。
 """
 
 from __future__ import annotations
 
-from typing import Dict, Iterable, List, Tuple
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from array import array
+from functools import partial
 import csv
 import json
+import math
 import os
 import re
+import shutil
 
 from .schemas import Dimension
 from .io_utils import ensure_dir
+from .phrases import PhraseCanonicalizer
+from .sketches import CountMinSketch, HyperLogLog, SpaceSaving
+from .stats import STAT_FIELDS, bootstrap_dimension_stats
 
 
 # 中文字符检测与归一
@@ -28,7 +36,7 @@ def _normalize_phrase_cn(s: str) -> str:
     规则：
     - 去首尾空白；
     - 若短语中不包含任何中文字符，返回空串（用于过滤纯英文/符号项）；
-    - 可在此扩展同义词合并/清洗逻辑。
+    - 写法差异与近义合并由 analyze/phrases.py 的 PhraseCanonicalizer 负责。
     """
     s = (s or "").strip()
     if not s:
@@ -47,54 +55,72 @@ def _iter_jsonl(path: str):
             yield json.loads(line)
 
 
-def aggregate_dimension_stats(per_task: Iterable[dict]) -> List[dict]:
-    """计算所有任务在各维度上的全局统计。
+# 维度名（按 Dimension 定义顺序）；热路径中避免反复访问枚举属性
+_DIM_NAMES = tuple(d.value for d in Dimension)
 
-    输入为 per_task 的 JSON dict 序列；输出为每维一行的统计 dict：
-    {dimension, tasks, avg_of_means, avg_of_medians, avg_of_mins, avg_of_maxes, avg_consistency,
-     avg_good_score, avg_bad_score}
+
+def _score_pairs(cmp: dict) -> Dict[str, Tuple[float, float]]:
+    """提取单个 per_bad 比较中各维度的 (good, bad) 分数；缺失或非法的维度跳过。"""
+    dim_scores = (cmp.get("dimension_scores") or {})
+    pairs: Dict[str, Tuple[float, float]] = {}
+    for name in _DIM_NAMES:
+        detail = dim_scores.get(name)
+        if not detail:
+            continue
+        try:
+            good_val = detail.get("good")
+            bad_val = detail.get("bad")
+            if good_val is None or bad_val is None:
+                continue
+            pairs[name] = (float(good_val), float(bad_val))
+        except Exception:
+            continue
+    return pairs
+
+
+_DIM_STAT_KEYS = ("mean_delta", "median_delta", "min_delta", "max_delta", "consistency", "good_scores", "bad_scores")
+
+
+class _DimensionAcc:
+    """维度统计的增量累加器：逐任务 add，最后 rows() 输出每维一行。
+
+    只保存各项的 (和, 个数)，内存与任务数无关。
+    record_tasks=True 时另按任务对齐记录每维的平均 delta 与一致性（缺失为 NaN），
+    供 stats.bootstrap_dimension_stats 计算置信区间（每任务每维 16 字节）。
     """
-    # 维度 -> 各项列表
-    acc: Dict[str, Dict[str, List[float]]] = {
-        d.value: {
-            "mean_delta": [],
-            "median_delta": [],
-            "min_delta": [],
-            "max_delta": [],
-            "consistency": [],
-            "good_scores": [],
-            "bad_scores": [],
-        }
-        for d in Dimension
-    }
 
-    for item in per_task:
+    def __init__(self, record_tasks: bool = False):
+        self.acc: Dict[str, Dict[str, List[float]]] = {
+            d.value: {k: [0.0, 0] for k in _DIM_STAT_KEYS} for d in Dimension
+        }
+        self.task_means: Optional[Dict[str, array]] = None
+        self.task_consistency: Optional[Dict[str, array]] = None
+        if record_tasks:
+            self.task_means = {d.value: array("d") for d in Dimension}
+            self.task_consistency = {d.value: array("d") for d in Dimension}
+
+    def _push(self, name: str, key: str, value: float) -> None:
+        slot = self.acc[name][key]
+        slot[0] += value
+        slot[1] += 1
+
+    def add(self, item: dict) -> None:
         per_bad = item.get("per_bad_comparisons") or []
         # 先为每个维度收集当前任务的 delta 列表（统一用 good - bad 计算）
         per_dim_deltas: Dict[str, List[float]] = {d.value: [] for d in Dimension}
         for cmp in per_bad:
-            dim_scores = (cmp.get("dimension_scores") or {})
-            for d in Dimension:
-                name = d.value
-                detail = dim_scores.get(name) or {}
-                try:
-                    good_val = detail.get("good")
-                    bad_val = detail.get("bad")
-                    if good_val is None or bad_val is None:
-                        continue
-                    g = float(good_val)
-                    b = float(bad_val)
-                    delta_val = g - b
-                    per_dim_deltas[name].append(delta_val)
-
-                    # 同时累计原始分数用于雷达图
-                    acc[name]["good_scores"].append(g)
-                    acc[name]["bad_scores"].append(b)
-                except Exception:
-                    continue
+            for name, (g, b) in _score_pairs(cmp).items():
+                per_dim_deltas[name].append(g - b)
+
+                # 同时累计原始分数用于雷达图
+                self._push(name, "good_scores", g)
+                self._push(name, "bad_scores", b)
 
         for name, deltas in per_dim_deltas.items():
             if not deltas:
+                if self.task_means is not None:
+                    self.task_means[name].append(math.nan)
+                    self.task_consistency[name].append(math.nan)
                 continue
             deltas_sorted = sorted(deltas)
             n = len(deltas_sorted)
@@ -107,51 +133,61 @@ def aggregate_dimension_stats(per_task: Iterable[dict]) -> List[dict]:
             max_delta = deltas_sorted[-1]
             consistency = sum(1 for v in deltas_sorted if abs(v) >= 2.0) / n
 
-            acc[name]["mean_delta"].append(round(mean_delta, 6))
-            acc[name]["median_delta"].append(round(median_delta, 6))
-            acc[name]["min_delta"].append(round(min_delta, 6))
-            acc[name]["max_delta"].append(round(max_delta, 6))
-            acc[name]["consistency"].append(round(consistency, 6))
-
-        # 已在上述循环中同步累积 good_scores / bad_scores
-
-    rows: List[dict] = []
-    for name, lists in acc.items():
-        def _avg(xs: List[float]) -> float:
-            return round(sum(xs) / len(xs), 6) if xs else 0.0
+            self._push(name, "mean_delta", round(mean_delta, 6))
+            self._push(name, "median_delta", round(median_delta, 6))
+            self._push(name, "min_delta", round(min_delta, 6))
+            self._push(name, "max_delta", round(max_delta, 6))
+            self._push(name, "consistency", round(consistency, 6))
+            if self.task_means is not None:
+                self.task_means[name].append(round(mean_delta, 6))
+                self.task_consistency[name].append(round(consistency, 6))
+
+    def rows(self, stats: Optional[Dict[str, dict]] = None) -> List[dict]:
+        """每维一行；stats 为 bootstrap_dimension_stats 的结果时追加置信区间与检验列。"""
+        def _avg(slot: List[float]) -> float:
+            return round(slot[0] / slot[1], 6) if slot[1] else 0.0
+
+        rows: List[dict] = []
+        for name, slots in self.acc.items():
+            rows.append(
+                {
+                    "dimension": name,
+                    "tasks": slots["mean_delta"][1],
+                    "avg_of_means": _avg(slots["mean_delta"]),
+                    "avg_of_medians": _avg(slots["median_delta"]),
+                    "avg_of_mins": _avg(slots["min_delta"]),
+                    "avg_of_maxes": _avg(slots["max_delta"]),
+                    "avg_consistency": _avg(slots["consistency"]),
+                    "avg_good_score": _avg(slots["good_scores"]),
+                    "avg_bad_score": _avg(slots["bad_scores"]),
+                }
+            )
+            if stats is not None:
+                rows[-1].update(stats.get(name) or {k: None for k in STAT_FIELDS})
+        return rows
 
-        rows.append(
-            {
-                "dimension": name,
-                "tasks": max(
-                    len(lists["mean_delta"]),
-                    len(lists["median_delta"]),
-                    len(lists["min_delta"]),
-                    len(lists["max_delta"]),
-                    len(lists["consistency"]),
-                ),
-                "avg_of_means": _avg(lists["mean_delta"]),
-                "avg_of_medians": _avg(lists["median_delta"]),
-                "avg_of_mins": _avg(lists["min_delta"]),
-                "avg_of_maxes": _avg(lists["max_delta"]),
-                "avg_consistency": _avg(lists["consistency"]),
-                "avg_good_score": _avg(lists["good_scores"]),
-                "avg_bad_score": _avg(lists["bad_scores"]),
-            }
+    def bootstrap(self, n_resamples: int, *, seed: Optional[int] = 0) -> Optional[Dict[str, dict]]:
+        """对记录的逐任务数据做 Bootstrap；未安装 numpy 时提示并返回 None。"""
+        if self.task_means is None:
+            raise ValueError("需以 record_tasks=True 创建累加器")
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            print("[提示] 未安装 numpy，跳过置信区间计算。安装命令: pip install numpy")
+            return None
+        return bootstrap_dimension_stats(
+            self.task_means, self.task_consistency, n_resamples=n_resamples, seed=seed
         )
-    return rows
 
 
-def aggregate_keywords(per_task: Iterable[dict]) -> List[dict]:
-    """跨任务聚合关键词并计算权重。
+class _KeywordAcc:
+    """关键词权重的增量累加器：(phrase, dimension) -> 权重和与出现任务集合。"""
 
-    输出为每个 (phrase, dimension) 的一行：
-    {phrase, dimension, weight_sum, task_count}
-    """
-    kw_weight: Dict[Tuple[str, str], float] = {}
-    kw_tasks: Dict[Tuple[str, str], set] = {}
+    def __init__(self):
+        self.kw_weight: Dict[Tuple[str, str], float] = {}
+        self.kw_tasks: Dict[Tuple[str, str], set] = {}
 
-    for item in per_task:
+    def add(self, item: dict) -> None:
         task_id = item.get("task_id", "")
         per_bad = item.get("per_bad_comparisons") or []
         for cmp in per_bad:
@@ -168,47 +204,65 @@ def aggregate_keywords(per_task: Iterable[dict]) -> List[dict]:
                 except Exception:
                     continue
                 key = (phrase, dim)
-                kw_weight[key] = kw_weight.get(key, 0.0) + w
-                kw_tasks.setdefault(key, set()).add(task_id)
-
-    rows: List[dict] = []
-    for (phrase, dim), wsum in kw_weight.items():
-        rows.append(
-            {
-                "phrase": phrase,
-                "dimension": dim,
-                "weight_sum": round(wsum, 6),
-                "task_count": len(kw_tasks.get((phrase, dim), set())),
-            }
-        )
-    # 按权重降序
-    rows.sort(key=lambda r: (-r["weight_sum"], r["phrase"]))
-    return rows
+                self.kw_weight[key] = self.kw_weight.get(key, 0.0) + w
+                self.kw_tasks.setdefault(key, set()).add(task_id)
 
+    def phrase_counts(self) -> Dict[str, float]:
+        counts: Dict[str, float] = {}
+        for (phrase, _), wsum in self.kw_weight.items():
+            counts[phrase] = counts.get(phrase, 0.0) + abs(wsum)
+        return counts
+
+    def rows(self, canonicalizer: Optional[PhraseCanonicalizer] = None) -> List[dict]:
+        kw_weight, kw_tasks = self.kw_weight, self.kw_tasks
+        if canonicalizer is not None:
+            kw_weight, kw_tasks = {}, {}
+            for (phrase, dim), wsum in self.kw_weight.items():
+                key = (canonicalizer.canonical(phrase), dim)
+                kw_weight[key] = kw_weight.get(key, 0.0) + wsum
+                kw_tasks.setdefault(key, set()).update(self.kw_tasks.get((phrase, dim), ()))
+        rows: List[dict] = []
+        for (phrase, dim), wsum in kw_weight.items():
+            rows.append(
+                {
+                    "phrase": phrase,
+                    "dimension": dim,
+                    "weight_sum": round(wsum, 6),
+                    "task_count": len(kw_tasks.get((phrase, dim), set())),
+                }
+            )
+        # 按权重降序
+        rows.sort(key=lambda r: (-r["weight_sum"], r["phrase"]))
+        return rows
 
-def aggregate_patterns(per_task: Iterable[dict]) -> Tuple[List[dict], List[dict]]:
-    """聚合正向与反向模式，并统计出现频次。"""
 
-    items = list(per_task)
+class _PatternCounter:
+    """单类模式的计数：phrase -> 出现次数与出现任务集合。"""
 
-    def _collect_from_per_bad(key: str):
-        counts: Dict[str, float] = {}
-        tasks: Dict[str, set] = {}
-        for item in items:
-            task_id = item.get("task_id", "")
-            per_bad = item.get("per_bad_comparisons") or []
-            seen_in_task = set()
-            for cmp in per_bad:
-                patterns = cmp.get(key) or []
-                for pat in patterns:
-                    phrase = _normalize_phrase_cn(str(pat))
-                    if not phrase:
-                        continue
-                    counts[phrase] = counts.get(phrase, 0.0) + 1.0
-                    seen_in_task.add(phrase)
-            for phrase in seen_in_task:
-                tasks.setdefault(phrase, set()).add(task_id)
+    def __init__(self):
+        self.counts: Dict[str, float] = {}
+        self.tasks: Dict[str, set] = {}
 
+    def add_task(self, task_id: str, patterns: Iterable) -> None:
+        """累计一个任务内的模式列表（同一任务内重复出现计多次，任务数只计一次）。"""
+        seen_in_task = set()
+        for pat in patterns:
+            phrase = _normalize_phrase_cn(str(pat))
+            if not phrase:
+                continue
+            self.counts[phrase] = self.counts.get(phrase, 0.0) + 1.0
+            seen_in_task.add(phrase)
+        for phrase in seen_in_task:
+            self.tasks.setdefault(phrase, set()).add(task_id)
+
+    def rows(self, canonicalizer: Optional[PhraseCanonicalizer] = None) -> List[dict]:
+        counts, tasks = self.counts, self.tasks
+        if canonicalizer is not None:
+            counts, tasks = {}, {}
+            for phrase, cnt in self.counts.items():
+                canon = canonicalizer.canonical(phrase)
+                counts[canon] = counts.get(canon, 0.0) + cnt
+                tasks.setdefault(canon, set()).update(self.tasks.get(phrase, ()))
         rows = []
         for phrase, cnt in counts.items():
             rows.append(
@@ -221,54 +275,294 @@ def aggregate_patterns(per_task: Iterable[dict]) -> Tuple[List[dict], List[dict]
         rows.sort(key=lambda r: (-r["count"], r["pattern"]))
         return rows
 
-    # 正向模式：优先任务级（仅一次），兼容旧 per-bad
-    pos_counts: Dict[str, float] = {}
-    pos_tasks: Dict[str, set] = {}
-    for item in items:
+
+class _PatternAcc:
+    """正向 / 反向模式的增量累加器（counter_factory 决定精确或近似计数）。"""
+
+    def __init__(self, counter_factory: Callable[[], "_PatternCounter"] = None):
+        counter_factory = counter_factory or _PatternCounter
+        self.positive = counter_factory()
+        self.anti = counter_factory()
+
+    def add(self, item: dict) -> None:
         task_id = item.get("task_id", "")
+        per_bad = item.get("per_bad_comparisons") or []
+        # 正向模式：优先任务级（仅一次），兼容旧 per-bad
         top_pos = item.get("positive_patterns") or []
         if top_pos:
-            for pat in top_pos:
-                phrase = _normalize_phrase_cn(str(pat))
+            self.positive.add_task(task_id, top_pos)
+        else:
+            self.positive.add_task(task_id, (p for cmp in per_bad for p in (cmp.get("positive_patterns") or [])))
+        self.anti.add_task(task_id, (p for cmp in per_bad for p in (cmp.get("anti_patterns") or [])))
+
+    def phrase_counts(self) -> Dict[str, float]:
+        counts = dict(self.positive.counts)
+        for phrase, cnt in self.anti.counts.items():
+            counts[phrase] = counts.get(phrase, 0.0) + cnt
+        return counts
+
+    def rows(self, canonicalizer: Optional[PhraseCanonicalizer] = None) -> Tuple[List[dict], List[dict]]:
+        return self.positive.rows(canonicalizer), self.anti.rows(canonicalizer)
+
+
+# ---------------------------------------------------------------------------
+# 近似模式：Space-Saving + Count-Min + HyperLogLog，内存只与容量有关
+# ---------------------------------------------------------------------------
+
+def _cms_for(capacity: int) -> CountMinSketch:
+    return CountMinSketch(width=max(1024, 4 * capacity), depth=4)
+
+
+def _merge_hll(hlls: List[HyperLogLog]) -> HyperLogLog:
+    merged = HyperLogLog(hlls[0].p)
+    for h in hlls:
+        merged.merge(h)
+    return merged
+
+
+def _approx_rows(
+    ss: SpaceSaving,
+    cms: CountMinSketch,
+    cms_key: Callable[[Hashable], str],
+    group_key: Callable[[Hashable], Hashable],
+    max_members: Optional[int] = None,
+) -> List[Tuple[Hashable, float, float, int, int]]:
+    """汇总近似计数：group_key 相同的键合并（计数相加、HLL 求并）。
+
+    返回 (分组键, 估计值, 误差上界, 任务数估计, 任务数误差) 列表；
+    估计值取 Space-Saving 与 Count-Min 的较小者（两者都只高估），真值位于 [估计值 - 误差, 估计值]。
+    任务数误差 = HLL 相对误差 + 替换时继承的任务数（继承部分只高估）。
+    max_members 为已处理的任务数，任务数估计不超过它。
+    """
+    acc: Dict[Hashable, list] = {}
+    for key, count, err, hll, inherited in ss.items():
+        est = min(count, cms.estimate(cms_key(key)))
+        lower = max(0.0, count - err)
+        slot = acc.setdefault(group_key(key), [0.0, 0.0, [], 0])
+        slot[0] += est
+        slot[1] += min(est, lower)
+        slot[2].append(hll)
+        slot[3] += inherited
+    rows = []
+    for gk, (est, lower, hlls, inherited) in acc.items():
+        hll = hlls[0] if len(hlls) == 1 else _merge_hll(hlls)
+        n = hll.count()
+        if max_members is not None:
+            n = min(n, max_members)
+        n_err = min(n, int(math.ceil(n * hll.relative_error)) + inherited)
+        rows.append((gk, est, est - lower, n, n_err))
+    return rows
+
+
+class _ApproxKeywordAcc:
+    """关键词权重的近似累加器：最多保留 capacity 个 (phrase, dimension)。
+
+    输出比精确模式多 weight_err / task_count_err 两列（真值 ≥ weight_sum - weight_err）。
+    负权重按 0 计（草图要求非负更新）。
+    """
+
+    def __init__(self, capacity: int, hll_p: int = 8):
+        self.ss = SpaceSaving(capacity, hll_p=hll_p)
+        self.cms = _cms_for(capacity)
+        self.tasks = 0
+
+    def add(self, item: dict) -> None:
+        task_id = str(item.get("task_id", ""))
+        self.tasks += 1
+        for cmp in item.get("per_bad_comparisons") or []:
+            for kw in cmp.get("discriminative_keywords") or []:
+                phrase = str(kw.get("phrase", "")).strip()
+                dim = str(kw.get("dimension", ""))
                 if not phrase:
                     continue
-                pos_counts[phrase] = pos_counts.get(phrase, 0.0) + 1.0
-                pos_tasks.setdefault(phrase, set()).add(task_id)
-        else:
-            per_bad = item.get("per_bad_comparisons") or []
-            seen_in_task = set()
-            for cmp in per_bad:
-                for pat in (cmp.get("positive_patterns") or []):
-                    phrase = _normalize_phrase_cn(str(pat))
-                    if not phrase:
-                        continue
-                    pos_counts[phrase] = pos_counts.get(phrase, 0.0) + 1.0
-                    seen_in_task.add(phrase)
-            for phrase in seen_in_task:
-                pos_tasks.setdefault(phrase, set()).add(task_id)
-
-    positives = []
-    for phrase, cnt in pos_counts.items():
-        positives.append({
-            "pattern": phrase,
-            "count": int(cnt),
-            "task_count": len(pos_tasks.get(phrase, set())),
-        })
-    positives.sort(key=lambda r: (-r["count"], r["pattern"]))
-    antis = _collect_from_per_bad("anti_patterns")
-    return positives, antis
-
-
-def export_aggregates(per_task_path: str, out_dimension_csv: str, out_keywords_csv: str) -> Tuple[str, str, str, str]:
-    """读取 per_task JSONL 并导出跨任务 CSV 聚合结果。
+                try:
+                    w = max(0.0, float(kw.get("weight", kw.get("weight_sum", 0.0)) or 0.0))
+                except Exception:
+                    continue
+                self.ss.add((phrase, dim), w, member=task_id)
+                self.cms.add(f"{dim}\x1f{phrase}", w)
 
-    返回写入的文件路径。
+    def phrase_counts(self) -> Dict[str, float]:
+        counts: Dict[str, float] = {}
+        for (phrase, _), count, _, _, _ in self.ss.items():
+            counts[phrase] = counts.get(phrase, 0.0) + count
+        return counts
+
+    def rows(self, canonicalizer: Optional[PhraseCanonicalizer] = None) -> List[dict]:
+        canon = canonicalizer.canonical if canonicalizer is not None else (lambda p: p)
+        rows = [
+            {
+                "phrase": phrase,
+                "dimension": dim,
+                "weight_sum": round(est, 6),
+                "weight_err": round(err, 6),
+                "task_count": n,
+                "task_count_err": n_err,
+            }
+            for (phrase, dim), est, err, n, n_err in _approx_rows(
+                self.ss,
+                self.cms,
+                lambda k: f"{k[1]}\x1f{k[0]}",
+                lambda k: (canon(k[0]), k[1]),
+                max_members=self.tasks,
+            )
+        ]
+        rows.sort(key=lambda r: (-r["weight_sum"], r["phrase"]))
+        return rows
+
+
+class _ApproxPatternCounter:
+    """单类模式的近似计数（接口同 _PatternCounter）。"""
+
+    def __init__(self, capacity: int, hll_p: int = 8):
+        self.ss = SpaceSaving(capacity, hll_p=hll_p)
+        self.cms = _cms_for(capacity)
+        self.tasks = 0
+
+    @property
+    def counts(self) -> Dict[str, float]:
+        return {phrase: count for phrase, count, _, _, _ in self.ss.items()}
+
+    def add_task(self, task_id: str, patterns: Iterable) -> None:
+        self.tasks += 1
+        for pat in patterns:
+            phrase = _normalize_phrase_cn(str(pat))
+            if not phrase:
+                continue
+            self.ss.add(phrase, 1.0, member=str(task_id))
+            self.cms.add(phrase, 1.0)
+
+    def rows(self, canonicalizer: Optional[PhraseCanonicalizer] = None) -> List[dict]:
+        canon = canonicalizer.canonical if canonicalizer is not None else (lambda p: p)
+        rows = [
+            {
+                "pattern": phrase,
+                "count": int(round(est)),
+                "count_err": int(math.ceil(err)),
+                "task_count": n,
+                "task_count_err": n_err,
+            }
+            for phrase, est, err, n, n_err in _approx_rows(
+                self.ss, self.cms, lambda k: k, canon, max_members=self.tasks
+            )
+        ]
+        rows.sort(key=lambda r: (-r["count"], r["pattern"]))
+        return rows
+
+
+def _make_accs(approx_capacity: Optional[int] = None, record_tasks: bool = False):
+    """创建 (维度, 关键词, 模式) 累加器；approx_capacity 为正时关键词与模式使用近似计数。"""
+    if approx_capacity:
+        return (
+            _DimensionAcc(record_tasks),
+            _ApproxKeywordAcc(approx_capacity),
+            _PatternAcc(partial(_ApproxPatternCounter, approx_capacity)),
+        )
+    return _DimensionAcc(record_tasks), _KeywordAcc(), _PatternAcc()
+
+
+_KEYWORD_FIELDS = ["phrase", "dimension", "weight_sum", "task_count"]
+_KEYWORD_APPROX_FIELDS = ["phrase", "dimension", "weight_sum", "weight_err", "task_count", "task_count_err"]
+_PATTERN_FIELDS = ["pattern", "count", "task_count"]
+_PATTERN_APPROX_FIELDS = ["pattern", "count", "count_err", "task_count", "task_count_err"]
+
+
+def _fit_canonicalizer(canonicalizer: PhraseCanonicalizer, kw_acc: _KeywordAcc, pat_acc: _PatternAcc) -> None:
+    """以关键词与模式的全部短语拟合合并表，并写出缓存（若配置了 cache_path）。"""
+    counts = kw_acc.phrase_counts()
+    for phrase, cnt in pat_acc.phrase_counts().items():
+        counts[phrase] = counts.get(phrase, 0.0) + cnt
+    canonicalizer.fit(counts)
+    canonicalizer.save()
+
+
+def aggregate_dimension_stats(per_task: Iterable[dict], *, bootstrap_resamples: int = 0) -> List[dict]:
+    """计算所有任务在各维度上的全局统计。
+
+    输入为 per_task 的 JSON dict 序列；输出为每维一行的统计 dict：
+    {dimension, tasks, avg_of_means, avg_of_medians, avg_of_mins, avg_of_maxes, avg_consistency,
+     avg_good_score, avg_bad_score}
+    bootstrap_resamples > 0 时追加 STAT_FIELDS 列（置信区间、效应量与配对检验 p 值）。
+    """
+    acc = _DimensionAcc(record_tasks=bootstrap_resamples > 0)
+    for item in per_task:
+        acc.add(item)
+    return acc.rows(acc.bootstrap(bootstrap_resamples) if bootstrap_resamples > 0 else None)
+
+
+def aggregate_keywords(
+    per_task: Iterable[dict],
+    *,
+    canonicalizer: Optional[PhraseCanonicalizer] = None,
+    approx_capacity: Optional[int] = None,
+) -> List[dict]:
+    """跨任务聚合关键词并计算权重。
+
+    输出为每个 (phrase, dimension) 的一行：
+    {phrase, dimension, weight_sum, task_count}
+    传入 canonicalizer 时，近义短语合并为同一行（见 analyze/phrases.py）。
+    approx_capacity 为正时使用近似模式：只保留约 Top-capacity 个键，内存有界，
+    并额外输出 weight_err / task_count_err 误差列（见 analyze/sketches.py）。
     """
-    items = list(_iter_jsonl(per_task_path))
+    acc = _make_accs(approx_capacity)[1]
+    for item in per_task:
+        acc.add(item)
+    if canonicalizer is not None:
+        canonicalizer.fit(acc.phrase_counts())
+    return acc.rows(canonicalizer)
 
-    dim_rows = aggregate_dimension_stats(items)
-    kw_rows = aggregate_keywords(items)
-    pos_rows, anti_rows = aggregate_patterns(items)
+
+def aggregate_patterns(
+    per_task: Iterable[dict],
+    *,
+    canonicalizer: Optional[PhraseCanonicalizer] = None,
+    approx_capacity: Optional[int] = None,
+) -> Tuple[List[dict], List[dict]]:
+    """聚合正向与反向模式，并统计出现频次（传入 canonicalizer 时合并近义模式）。
+
+    approx_capacity 为正时使用近似模式，额外输出 count_err / task_count_err 误差列。
+    """
+    acc = _make_accs(approx_capacity)[2]
+    for item in per_task:
+        acc.add(item)
+    if canonicalizer is not None:
+        canonicalizer.fit(acc.phrase_counts())
+    return acc.rows(canonicalizer)
+
+
+def export_aggregates(
+    per_task_path: str,
+    out_dimension_csv: str,
+    out_keywords_csv: str,
+    *,
+    merge_phrases: bool = False,
+    merge_cache: Optional[str] = None,
+    merge_threshold: float = 0.8,
+    approx_capacity: Optional[int] = None,
+    bootstrap_resamples: int = 0,
+) -> Tuple[str, str, str, str]:
+    """读取 per_task JSONL 并导出跨任务 CSV 聚合结果（单次遍历）。
+
+    merge_phrases=True 时对关键词与模式做规范化与近义合并，合并表缓存到 merge_cache。
+    approx_capacity 为正时关键词与模式使用近似模式（内存有界，CSV 带误差列）。
+    bootstrap_resamples 为正时维度统计追加 Bootstrap 置信区间与配对检验列（需 numpy）。
+    返回写入的文件路径。
+    """
+    dim_acc, kw_acc, pat_acc = _make_accs(approx_capacity, record_tasks=bootstrap_resamples > 0)
+    for item in _iter_jsonl(per_task_path):
+        dim_acc.add(item)
+        kw_acc.add(item)
+        pat_acc.add(item)
+
+    canonicalizer = None
+    if merge_phrases:
+        canonicalizer = PhraseCanonicalizer(threshold=merge_threshold, cache_path=merge_cache)
+        _fit_canonicalizer(canonicalizer, kw_acc, pat_acc)
+
+    dim_stats = dim_acc.bootstrap(bootstrap_resamples) if bootstrap_resamples > 0 else None
+    dim_rows = dim_acc.rows(dim_stats)
+    kw_rows = kw_acc.rows(canonicalizer)
+    pos_rows, anti_rows = pat_acc.rows(canonicalizer)
 
     ensure_dir(os.path.dirname(out_dimension_csv) or ".")
     ensure_dir(os.path.dirname(out_keywords_csv) or ".")
@@ -288,15 +582,18 @@ def export_aggregates(per_task_path: str, out_dimension_csv: str, out_keywords_c
                 "avg_consistency",
                 "avg_good_score",
                 "avg_bad_score",
-            ],
+            ] + (STAT_FIELDS if dim_stats is not None else []),
         )
         writer.writeheader()
         writer.writerows(dim_rows)
 
+    kw_fields = _KEYWORD_APPROX_FIELDS if approx_capacity else _KEYWORD_FIELDS
+    pattern_fields = _PATTERN_APPROX_FIELDS if approx_capacity else _PATTERN_FIELDS
+
     with open(out_keywords_csv, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(
             f,
-            fieldnames=["phrase", "dimension", "weight_sum", "task_count"],
+            fieldnames=kw_fields,
         )
         writer.writeheader()
         writer.writerows(kw_rows)
@@ -304,7 +601,7 @@ def export_aggregates(per_task_path: str, out_dimension_csv: str, out_keywords_c
     with open(pos_patterns_csv, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(
             f,
-            fieldnames=["pattern", "count", "task_count"],
+            fieldnames=pattern_fields,
         )
         writer.writeheader()
         writer.writerows(pos_rows)
@@ -312,9 +609,183 @@ def export_aggregates(per_task_path: str, out_dimension_csv: str, out_keywords_c
     with open(anti_patterns_csv, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(
             f,
-            fieldnames=["pattern", "count", "task_count"],
+            fieldnames=pattern_fields,
         )
         writer.writeheader()
         writer.writerows(anti_rows)
 
     return out_dimension_csv, out_keywords_csv, pos_patterns_csv, anti_patterns_csv
+
+
+# ---------------------------------------------------------------------------
+# 分组聚合：按语言 × 任务 ID 前缀一次遍历计算所有切片
+# ---------------------------------------------------------------------------
+
+# 切片中表示“全部”的取值（汇总行）
+ALL_GROUP = "__all__"
+
+_PREFIX_SEP_RE = re.compile(r"^(.+?)[-_/:.]")
+_PREFIX_ALPHA_RE = re.compile(r"^\D+")
+
+
+def task_id_prefix(task_id: str) -> str:
+    """任务 ID 前缀：首个分隔符（- _ / : .）之前的部分；无分隔符时取开头的非数字部分。
+
+    例如 "leetcode-123" -> "leetcode"，"T0001" -> "T"；都不满足时返回空串。
+    """
+    task_id = str(task_id)
+    m = _PREFIX_SEP_RE.match(task_id)
+    if m:
+        return m.group(1)
+    m = _PREFIX_ALPHA_RE.match(task_id)
+    return m.group(0) if m else ""
+
+
+def _group_keys(language: str, prefix: str) -> List[Tuple[str, str]]:
+    """任务所属的全部切片：(语言, 前缀) 及其各级汇总。"""
+    return [
+        (ALL_GROUP, ALL_GROUP),
+        (language, ALL_GROUP),
+        (ALL_GROUP, prefix),
+        (language, prefix),
+    ]
+
+
+def aggregate_grouped(
+    per_task: Iterable[dict],
+    *,
+    prefix_fn: Callable[[str], str] = task_id_prefix,
+    canonicalizer: Optional[PhraseCanonicalizer] = None,
+    approx_capacity: Optional[int] = None,
+) -> Dict[str, List[dict]]:
+    """一次遍历计算按语言、任务 ID 前缀分组的维度 / 关键词 / 模式统计。
+
+    每个任务同时计入 (语言, 前缀)、(语言, 全部)、(全部, 前缀)、(全部, 全部) 四个切片，
+    因此 (ALL_GROUP, ALL_GROUP) 切片与全局聚合结果一致。语言取自结果中的 language 字段
+    （由 analyze_task 从输入任务带出），缺失时记为 "unknown"。
+
+    返回 {"dimension": [...], "keywords": [...], "patterns": [...]}，每行额外带
+    language / prefix 列（模式表另有 kind 列：positive / anti）。
+    传入 canonicalizer 时，以全量切片的短语拟合一次合并表，所有切片共用。
+    approx_capacity 为正时每个切片的关键词与模式使用近似计数（每切片内存有界）。
+    """
+    groups: Dict[Tuple[str, str], Tuple[_DimensionAcc, _KeywordAcc, _PatternAcc]] = {}
+    for item in per_task:
+        language = str(item.get("language") or "unknown")
+        prefix = prefix_fn(str(item.get("task_id", "")))
+        for key in _group_keys(language, prefix):
+            accs = groups.get(key)
+            if accs is None:
+                accs = groups[key] = _make_accs(approx_capacity)
+            for acc in accs:
+                acc.add(item)
+
+    if canonicalizer is not None and (ALL_GROUP, ALL_GROUP) in groups:
+        _, kw_all, pat_all = groups[(ALL_GROUP, ALL_GROUP)]
+        _fit_canonicalizer(canonicalizer, kw_all, pat_all)
+
+    out: Dict[str, List[dict]] = {"dimension": [], "keywords": [], "patterns": []}
+    for (language, prefix), (dim_acc, kw_acc, pat_acc) in sorted(groups.items()):
+        slice_cols = {"language": language, "prefix": prefix}
+        out["dimension"].extend({**slice_cols, **r} for r in dim_acc.rows())
+        out["keywords"].extend({**slice_cols, **r} for r in kw_acc.rows(canonicalizer))
+        positives, antis = pat_acc.rows(canonicalizer)
+        out["patterns"].extend({**slice_cols, "kind": "positive", **r} for r in positives)
+        out["patterns"].extend({**slice_cols, "kind": "anti", **r} for r in antis)
+    return out
+
+
+_GROUPED_FIELDS = {
+    "dimension": [
+        "language", "prefix", "dimension", "tasks", "avg_of_means", "avg_of_medians",
+        "avg_of_mins", "avg_of_maxes", "avg_consistency", "avg_good_score", "avg_bad_score",
+    ],
+    "keywords": ["language", "prefix"] + _KEYWORD_FIELDS,
+    "patterns": ["language", "prefix", "kind"] + _PATTERN_FIELDS,
+}
+
+_GROUPED_APPROX_FIELDS = {
+    **_GROUPED_FIELDS,
+    "keywords": ["language", "prefix"] + _KEYWORD_APPROX_FIELDS,
+    "patterns": ["language", "prefix", "kind"] + _PATTERN_APPROX_FIELDS,
+}
+
+
+def _write_partitioned_csv(table_dir: str, rows: List[dict], fields: List[str]) -> int:
+    """按 language / prefix 写出 Hive 风格分区：{table_dir}/language=X/prefix=Y/part-0.csv。
+
+    分区列不重复写入文件内容。返回写出的分区数。
+    """
+    from urllib.parse import quote
+
+    parts: Dict[Tuple[str, str], List[dict]] = {}
+    for r in rows:
+        parts.setdefault((r["language"], r["prefix"]), []).append(r)
+    data_fields = [f for f in fields if f not in ("language", "prefix")]
+    for (language, prefix), part_rows in parts.items():
+        part_dir = os.path.join(table_dir, f"language={quote(language, safe='')}", f"prefix={quote(prefix, safe='')}")
+        ensure_dir(part_dir)
+        with open(os.path.join(part_dir, "part-0.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=data_fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(part_rows)
+    return len(parts)
+
+
+def export_grouped_aggregates(
+    per_task_path: str,
+    out_dir: str,
+    *,
+    prefix_fn: Callable[[str], str] = task_id_prefix,
+    parquet: bool = True,
+    merge_phrases: bool = False,
+    merge_cache: Optional[str] = None,
+    merge_threshold: float = 0.8,
+    approx_capacity: Optional[int] = None,
+) -> Dict[str, str]:
+    """读取 per_task JSONL，一次遍历导出分组聚合结果。
+
+    输出目录结构（每张表一个子目录，按语言与任务 ID 前缀分区，汇总切片取值为 ALL_GROUP）：
+    - {out_dir}/dimension/language=*/prefix=*/part-0.csv
+    - {out_dir}/keywords/...
+    - {out_dir}/patterns/...
+    若安装了 pandas 与 pyarrow 且 parquet=True，另写出同样分区的 {out_dir}/{table}.parquet/ 数据集。
+
+    merge_phrases / merge_cache / merge_threshold / approx_capacity 同 export_aggregates。
+    返回 表名 -> 输出目录。
+    """
+    canonicalizer = None
+    if merge_phrases:
+        canonicalizer = PhraseCanonicalizer(threshold=merge_threshold, cache_path=merge_cache)
+    tables = aggregate_grouped(
+        _iter_jsonl(per_task_path),
+        prefix_fn=prefix_fn,
+        canonicalizer=canonicalizer,
+        approx_capacity=approx_capacity,
+    )
+    ensure_dir(out_dir)
+
+    pd = None
+    if parquet:
+        try:
+            import pandas as pd
+            import pyarrow  # noqa: F401
+        except ImportError:
+            pd = None
+            print("[提示] 未安装 pandas / pyarrow，仅导出分区 CSV。安装命令: pip install pandas pyarrow")
+
+    paths: Dict[str, str] = {}
+    for name, rows in tables.items():
+        fields = (_GROUPED_APPROX_FIELDS if approx_capacity else _GROUPED_FIELDS)[name]
+        table_dir = os.path.join(out_dir, name)
+        pq_dir = os.path.join(out_dir, f"{name}.parquet")
+        # 清除上次的分区，避免残留切片（parquet 数据集写入是追加式的）
+        for d in (table_dir, pq_dir):
+            if os.path.isdir(d):
+                shutil.rmtree(d)
+        _write_partitioned_csv(table_dir, rows, fields)
+        paths[name] = table_dir
+        if pd is not None and rows:
+            pd.DataFrame(rows, columns=fields).to_parquet(pq_dir, partition_cols=["language", "prefix"], index=False)
+            paths[f"{name}_parquet"] = pq_dir
+    return paths
@@ -0,0 +1,263 @@
+"""任务级图表的批量并行渲染。
+
+plot_task_dimension_lollipop / plot_task_keywords_bar / plot_task_wordcloud 每次只渲染一个任务，
+且依赖 pyplot 的全局状态，无法在线程间并行。本模块以进程池批量渲染 per_task.jsonl 中的任务：
+- 每个工作进程启动时只初始化一次 matplotlib（Agg 后端）与中文字体；
+- 以任务分批提交，限制在途批次数，内存与任务总数无关；
+- 以 (任务内容, 图类型, 字体) 的哈希记录在清单文件中，输入未变化的图直接跳过。
+
+输出：{out_dir}/{task_id}/{lollipop,keywords,wordcloud}.png；记录带 model 字段（多模型池 A/B 评测，
+同一 task_id 每个模型一行）时为 {out_dir}/{task_id}/{model}/{kind}.png，各模型的图与清单条目互不覆盖。
+目录名由 task_id / model 经百分号编码得到（见 _safe_name），不同 ID 不会映射到同一目录，也不会越出 out_dir。
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+
+from .io_utils import ensure_dir
+from .telemetry import count_cache
+
+
+FIGURE_KINDS: Tuple[str, ...] = ("lollipop", "keywords", "wordcloud")
+
+MANIFEST_NAME = ".render_manifest.json"
+
+# 渲染逻辑变化时递增，使旧清单失效
+_RENDER_VERSION = "2"
+
+# 目录名的最大字节数（多数文件系统单个路径分量上限为 255）
+_MAX_NAME_LEN = 200
+
+# 渲染过程中每完成这么多张图、或间隔这么多秒保存一次清单，中断的运行也能保留已渲染的缓存
+_MANIFEST_SAVE_EVERY = 200
+_MANIFEST_SAVE_INTERVAL_S = 30.0
+
+
+def _safe_name(task_id: str) -> str:
+    """把 ID 转为单个目录名：字母数字（含中文）与 "._-" 原样保留，其余字符（含 "/" 与 "%"）
+    按 UTF-8 百分号编码，不同 ID 得到不同目录名。
+
+    "." 与 ".." 编码为 "%2E" / "%2E%2E"，空 ID 为 "%"（编码结果中 "%" 不会单独出现）；
+    过长的名字截断后追加 sha1 前缀。
+    """
+    raw = str(task_id)
+    name = "".join(
+        c if c.isalnum() or c in "._-" else "".join(f"%{b:02X}" for b in c.encode("utf-8"))
+        for c in raw
+    )
+    if name in ("", ".", ".."):
+        name = name.replace(".", "%2E") or "%"
+    if len(name.encode("utf-8")) > _MAX_NAME_LEN:
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+        name = f"{name.encode('utf-8')[:_MAX_NAME_LEN - 13].decode('utf-8', 'ignore')}-{digest}"
+    return name
+
+
+def _figure_key(line: str, kind: str, font_path: Optional[str]) -> str:
+    h = hashlib.sha1()
+    for part in (_RENDER_VERSION, kind, font_path or "", line):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _init_worker(font_path: Optional[str]) -> None:
+    """工作进程初始化：强制 Agg 后端并注册中文字体，仅执行一次。"""
+    if font_path:
+        os.environ["FONT_PATH"] = font_path
+    from .visualize import _get_render_context
+
+    _get_render_context()
+
+
+def _render_batch(jobs: List[Tuple[str, str, str, Optional[str]]]) -> List[Tuple[str, str, Optional[str]]]:
+    """渲染一批图：jobs 为 (kind, task_json_line, out_path, font_path)。
+
+    返回 (kind, out_path, error) 列表，成功时 error 为 None。
+    """
+    from .visualize import (
+        _render_task_dimension_lollipop,
+        _render_task_keywords_bar,
+        _render_task_wordcloud,
+    )
+
+    out = []
+    for kind, line, out_path, font_path in jobs:
+        try:
+            obj = json.loads(line)
+            if kind == "lollipop":
+                _render_task_dimension_lollipop(obj, out_path)
+            elif kind == "keywords":
+                _render_task_keywords_bar(obj, out_path)
+            else:
+                _render_task_wordcloud(obj, out_path, font_path=font_path, cache=False)  # 由清单负责跳过
+            out.append((kind, out_path, None))
+        except Exception as e:
+            out.append((kind, out_path, f"{type(e).__name__}: {e}"))
+    return out
+
+
+def _load_manifest(path: str) -> Dict[str, str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path: str, manifest: Dict[str, str]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _iter_jobs(
+    per_task_jsonl: str,
+    out_dir: str,
+    kinds: Tuple[str, ...],
+    task_ids: Optional[set],
+    font_path: Optional[str],
+    manifest: Dict[str, str],
+    force: bool,
+    pending_keys: Dict[str, Tuple[str, str]],
+    stats: Dict[str, int],
+) -> Iterator[Tuple[str, str, str, Optional[str]]]:
+    with open(per_task_jsonl, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            task_id = str(obj.get("task_id", ""))
+            if task_ids is not None and task_id not in task_ids:
+                continue
+            task_dir = _safe_name(task_id)
+            if obj.get("model"):
+                task_dir = os.path.join(task_dir, _safe_name(obj["model"]))
+            for kind in kinds:
+                # 清单以相对路径为键（含模型名），输出目录整体移动后缓存仍然有效
+                rel = os.path.join(task_dir, f"{kind}.png")
+                out_path = os.path.join(out_dir, rel)
+                key = _figure_key(line, kind, font_path)
+                if not force and manifest.get(rel) == key and os.path.exists(out_path):
+                    stats["skipped"] += 1
+                    count_cache("batch_render", True)
+                    continue
+                count_cache("batch_render", False)
+                pending_keys[out_path] = (rel, key)
+                yield kind, line, out_path, font_path
+
+
+def render_task_figures(
+    per_task_jsonl: str,
+    out_dir: str,
+    *,
+    task_ids: Optional[Iterable[str]] = None,
+    kinds: Iterable[str] = FIGURE_KINDS,
+    font_path: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    batch_size: int = 16,
+    force: bool = False,
+) -> Dict[str, int]:
+    """以进程池批量渲染任务级图表，返回统计 {rendered, skipped, failed}。
+
+    Args:
+        per_task_jsonl: per_task.jsonl 路径
+        out_dir: 输出目录（每任务一个子目录；带 model 字段的记录再按模型分子目录）
+        task_ids: 仅渲染这些任务（None 为全部）
+        kinds: 图类型，取自 FIGURE_KINDS
+        font_path: 中文字体路径（默认读取 FONT_PATH 或自动探测）
+        max_workers: 进程数（默认 CPU 核数）
+        batch_size: 每次提交给工作进程的图数量
+        force: 忽略清单，全部重新渲染
+    """
+    kinds = tuple(kinds)
+    unknown = [k for k in kinds if k not in FIGURE_KINDS]
+    if unknown:
+        raise ValueError(f"未知的图类型: {unknown}")
+    font_path = font_path or os.environ.get("FONT_PATH")
+    ensure_dir(out_dir)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path)
+    pending_keys: Dict[str, Tuple[str, str]] = {}
+    stats = {"rendered": 0, "skipped": 0, "failed": 0}
+    wanted = set(task_ids) if task_ids is not None else None
+
+    jobs = _iter_jobs(per_task_jsonl, out_dir, kinds, wanted, font_path, manifest, force, pending_keys, stats)
+    batches = iter(lambda: list(itertools.islice(jobs, batch_size)), [])
+    workers = max_workers or os.cpu_count() or 1
+    reported_errors = set()
+    unsaved = 0
+    last_save = time.monotonic()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(font_path,)) as executor:
+            pending = [executor.submit(_render_batch, b) for b in itertools.islice(batches, 2 * workers)]
+            while pending:
+                results = pending.pop(0).result()
+                nxt = next(batches, None)
+                if nxt is not None:
+                    pending.append(executor.submit(_render_batch, nxt))
+                for kind, out_path, err in results:
+                    entry = pending_keys.pop(out_path, None)
+                    if err is None:
+                        stats["rendered"] += 1
+                        if entry is not None:
+                            manifest[entry[0]] = entry[1]
+                            unsaved += 1
+                    else:
+                        stats["failed"] += 1
+                        # 同类错误（如缺少 wordcloud）只提示一次
+                        if (kind, err) not in reported_errors:
+                            reported_errors.add((kind, err))
+                            print(f"[警告] {kind} 渲染失败: {err}（{out_path}）")
+                if unsaved >= _MANIFEST_SAVE_EVERY or (unsaved and time.monotonic() - last_save >= _MANIFEST_SAVE_INTERVAL_S):
+                    _save_manifest(manifest_path, manifest)
+                    unsaved = 0
+                    last_save = time.monotonic()
+    finally:
+        # 正常结束或中断（异常 / Ctrl-C）都保存已完成部分的清单
+        _save_manifest(manifest_path, manifest)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="并行批量渲染 per_task.jsonl 中各任务的图表")
+    parser.add_argument("per_task", help="per_task.jsonl 路径")
+    parser.add_argument("--out-dir", default="outputs/figs/tasks", help="输出目录")
+    parser.add_argument("--task-ids", default="", help="逗号分隔的任务 ID，或 @文件（每行一个）")
+    parser.add_argument("--kinds", default=",".join(FIGURE_KINDS), help="图类型，逗号分隔")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+    parser.add_argument("--force", action="store_true", help="忽略缓存清单，全部重新渲染")
+    args = parser.parse_args(argv)
+
+    task_ids = None
+    if args.task_ids.startswith("@"):
+        with open(args.task_ids[1:], "r", encoding="utf-8") as f:
+            task_ids = [line.strip() for line in f if line.strip()]
+    elif args.task_ids:
+        task_ids = [s.strip() for s in args.task_ids.split(",") if s.strip()]
+
+    stats = render_task_figures(
+        args.per_task,
+        args.out_dir,
+        task_ids=task_ids,
+        kinds=[k.strip() for k in args.kinds.split(",") if k.strip()],
+        max_workers=args.workers,
+        force=args.force,
+    )
+    print(f"✓ 渲染 {stats['rendered']}，跳过 {stats['skipped']}，失败 {stats['failed']}：{args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,339 @@
+"""多次运行的 per_task 结果对比：按 (task_id, bad_id) 连接并计算评分一致性。
+
+同一批任务换 prompt / 模型重跑后，需要知道两次结果在各维度上是否一致、哪些任务差别最大。
+本模块对两个或多个 per_task.jsonl 做外部排序 + 归并连接（sort-merge join）：
+- 每个运行按块读入、排序后写入临时分块文件，再用 heapq.merge 流式归并，内存与块大小有关、与运行规模无关；
+- 各运行的有序流按键对齐，一次遍历完成连接与统计；
+- 每对运行、每个维度累计 delta（good - bad，四舍五入为整数档位）的混淆矩阵，
+  输出 Cohen's kappa、二次加权 kappa、MAE 与完全一致率；
+- 保留差异最大的 Top-N 比较（各维度 |Δ差| 之和），写出 CSV 与 Markdown 报告。
+
+命令行：python -m analyze.compare run_a/per_task.jsonl run_b/per_task.jsonl -o outputs/compare
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import argparse
+import csv
+import datetime as _dt
+import heapq
+import itertools
+import json
+import math
+import os
+import tempfile
+
+from .aggregate import _DIM_NAMES, _iter_jsonl, _score_pairs
+from .io_utils import ensure_dir
+
+
+# (task_id, bad_id, 各维度 delta；缺失为 None)
+_Row = Tuple[str, str, List[Optional[float]]]
+
+_DIMS = list(_DIM_NAMES)
+
+_DIMENSION_FIELDS = ["run_a", "run_b", "dimension", "pairs", "kappa", "weighted_kappa", "mae", "exact_agreement"]
+_DISAGREEMENT_FIELDS = ["run_a", "run_b", "task_id", "bad_id", "total_abs_diff", "max_dimension", "deltas_a", "deltas_b"]
+
+
+def _iter_rows(path: str) -> Iterator[_Row]:
+    """逐条产出 per_task 中每个 per_bad 比较的 (task_id, bad_id, deltas)。
+
+    缺少 bad_id 时以比较在任务内的序号代替（"#0"、"#1"……）。
+    """
+    for item in _iter_jsonl(path):
+        task_id = str(item.get("task_id", ""))
+        for i, cmp in enumerate(item.get("per_bad_comparisons") or []):
+            bad_id = str(cmp.get("bad_id") or f"#{i}")
+            pairs = _score_pairs(cmp)
+            deltas = [(pairs[d][0] - pairs[d][1]) if d in pairs else None for d in _DIMS]
+            yield task_id, bad_id, deltas
+
+
+def _row_key(row: _Row) -> Tuple[str, str]:
+    return row[0], row[1]
+
+
+def _read_chunk(path: str) -> Iterator[_Row]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            task_id, bad_id, deltas = json.loads(line)
+            yield task_id, bad_id, deltas
+
+
+def _sorted_rows(path: str, tmp_dir: str, chunk_rows: int) -> Iterator[_Row]:
+    """外部排序：按块排序后写入 tmp_dir，再 k 路归并；仅一块时直接在内存中产出。"""
+    rows = _iter_rows(path)
+    chunk_paths: List[str] = []
+    while True:
+        chunk = list(itertools.islice(rows, chunk_rows))
+        if not chunk:
+            break
+        chunk.sort(key=_row_key)
+        if not chunk_paths and len(chunk) < chunk_rows:
+            yield from chunk
+            return
+        fd, chunk_path = tempfile.mkstemp(suffix=".jsonl", dir=tmp_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for row in chunk:
+                f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+        chunk_paths.append(chunk_path)
+    yield from heapq.merge(*(_read_chunk(p) for p in chunk_paths), key=_row_key)
+
+
+def _dedup(rows: Iterable[_Row], counter: Dict[str, int]) -> Iterator[_Row]:
+    """同一运行内重复的 (task_id, bad_id) 只保留第一条，重复数计入 counter["duplicates"]。"""
+    last = None
+    for row in rows:
+        key = _row_key(row)
+        if key == last:
+            counter["duplicates"] = counter.get("duplicates", 0) + 1
+            continue
+        last = key
+        yield row
+
+
+def merge_join(streams: Sequence[Iterator[_Row]]) -> Iterator[Tuple[Tuple[str, str], List[Optional[_Row]]]]:
+    """对多个按键有序的流做全外连接：产出 (键, 各流在该键上的行或 None)。"""
+    heads: List[Optional[_Row]] = [next(s, None) for s in streams]
+    while True:
+        keys = [_row_key(h) for h in heads if h is not None]
+        if not keys:
+            return
+        key = min(keys)
+        matched: List[Optional[_Row]] = []
+        for i, h in enumerate(heads):
+            if h is not None and _row_key(h) == key:
+                matched.append(h)
+                heads[i] = next(streams[i], None)
+            else:
+                matched.append(None)
+        yield key, matched
+
+
+class _Agreement:
+    """单个维度在一对运行之间的一致性累加器（混淆矩阵 + 绝对误差）。"""
+
+    __slots__ = ("confusion", "n", "abs_err")
+
+    def __init__(self):
+        self.confusion: Dict[Tuple[int, int], int] = {}
+        self.n = 0
+        self.abs_err = 0.0
+
+    def add(self, a: float, b: float) -> None:
+        cell = (int(round(a)), int(round(b)))
+        self.confusion[cell] = self.confusion.get(cell, 0) + 1
+        self.n += 1
+        self.abs_err += abs(a - b)
+
+    def result(self) -> dict:
+        n = self.n
+        if n == 0:
+            return {"pairs": 0, "kappa": None, "weighted_kappa": None, "mae": None, "exact_agreement": None}
+        row: Dict[int, int] = {}
+        col: Dict[int, int] = {}
+        for (a, b), c in self.confusion.items():
+            row[a] = row.get(a, 0) + c
+            col[b] = col.get(b, 0) + c
+        cats = sorted(set(row) | set(col))
+        po = sum(c for (a, b), c in self.confusion.items() if a == b) / n
+        pe = sum(row.get(k, 0) * col.get(k, 0) for k in cats) / (n * n)
+        kappa = (po - pe) / (1 - pe) if pe < 1 else 1.0
+        # 二次加权 kappa：权重按档位差的平方（以取值范围归一化）
+        span = (cats[-1] - cats[0]) or 1
+        observed = sum(c * ((a - b) / span) ** 2 for (a, b), c in self.confusion.items()) / n
+        expected = sum(
+            row.get(a, 0) * col.get(b, 0) * ((a - b) / span) ** 2 for a in cats for b in cats
+        ) / (n * n)
+        weighted = 1 - observed / expected if expected > 0 else 1.0
+        return {
+            "pairs": n,
+            "kappa": round(kappa, 6),
+            "weighted_kappa": round(weighted, 6),
+            "mae": round(self.abs_err / n, 6),
+            "exact_agreement": round(po, 6),
+        }
+
+
+def compare_runs(
+    run_paths: Sequence[str],
+    out_dir: str,
+    *,
+    labels: Optional[Sequence[str]] = None,
+    top_n: int = 50,
+    chunk_rows: int = 200_000,
+) -> dict:
+    """对比两个或多个 per_task.jsonl 运行，写出对比报告。
+
+    Args:
+        run_paths: 各运行的 per_task.jsonl 路径（≥ 2 个）
+        out_dir: 输出目录
+        labels: 运行名称（默认取路径所在目录名）
+        top_n: 每对运行保留的最大差异条数
+        chunk_rows: 外部排序每块的行数（控制内存）
+
+    Returns:
+        摘要 dict（覆盖率、各维度一致性、输出路径）；同时写出
+        compare_dimensions.csv / compare_disagreements.csv / compare_summary.json / compare_report.md。
+    """
+    if len(run_paths) < 2:
+        raise ValueError("至少需要两个运行才能对比")
+    if labels is None:
+        labels = [os.path.basename(os.path.dirname(os.path.abspath(p))) or p for p in run_paths]
+    labels = list(labels)
+    if len(labels) != len(run_paths):
+        raise ValueError("labels 数量需与运行数一致")
+    if len(set(labels)) != len(labels):
+        labels = [f"{i}:{lab}" for i, lab in enumerate(labels)]
+
+    pairs = list(itertools.combinations(range(len(run_paths)), 2))
+    agreements = {(i, j): [_Agreement() for _ in _DIMS] for i, j in pairs}
+    top: Dict[Tuple[int, int], list] = {p: [] for p in pairs}
+    present = [0] * len(run_paths)
+    in_all = 0
+    dup_counters: List[Dict[str, int]] = [{} for _ in run_paths]
+    seq = 0
+
+    ensure_dir(out_dir)
+    with tempfile.TemporaryDirectory(prefix="compare_", dir=out_dir) as tmp_dir:
+        streams = [
+            _dedup(_sorted_rows(p, tmp_dir, chunk_rows), dup_counters[i]) for i, p in enumerate(run_paths)
+        ]
+        for (task_id, bad_id), rows in merge_join(streams):
+            for i, r in enumerate(rows):
+                if r is not None:
+                    present[i] += 1
+            if all(r is not None for r in rows):
+                in_all += 1
+            for i, j in pairs:
+                ra, rb = rows[i], rows[j]
+                if ra is None or rb is None:
+                    continue
+                total = 0.0
+                worst, worst_diff = "", -1.0
+                accs = agreements[(i, j)]
+                for k, (a, b) in enumerate(zip(ra[2], rb[2])):
+                    if a is None or b is None:
+                        continue
+                    accs[k].add(a, b)
+                    diff = abs(a - b)
+                    total += diff
+                    if diff > worst_diff:
+                        worst, worst_diff = _DIMS[k], diff
+                if total <= 0:
+                    continue
+                seq += 1
+                item = (total, -seq, task_id, bad_id, worst, ra[2], rb[2])
+                heap = top[(i, j)]
+                if len(heap) < top_n:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+    dim_rows: List[dict] = []
+    for i, j in pairs:
+        for k, acc in enumerate(agreements[(i, j)]):
+            dim_rows.append({"run_a": labels[i], "run_b": labels[j], "dimension": _DIMS[k], **acc.result()})
+    dis_rows: List[dict] = []
+    for i, j in pairs:
+        for total, _, task_id, bad_id, worst, da, db in sorted(top[(i, j)], reverse=True):
+            dis_rows.append(
+                {
+                    "run_a": labels[i],
+                    "run_b": labels[j],
+                    "task_id": task_id,
+                    "bad_id": bad_id,
+                    "total_abs_diff": round(total, 6),
+                    "max_dimension": worst,
+                    "deltas_a": json.dumps(dict(zip(_DIMS, da)), ensure_ascii=False),
+                    "deltas_b": json.dumps(dict(zip(_DIMS, db)), ensure_ascii=False),
+                }
+            )
+
+    dim_csv = os.path.join(out_dir, "compare_dimensions.csv")
+    dis_csv = os.path.join(out_dir, "compare_disagreements.csv")
+    summary_json = os.path.join(out_dir, "compare_summary.json")
+    report_md = os.path.join(out_dir, "compare_report.md")
+    for path, fields, rows in ((dim_csv, _DIMENSION_FIELDS, dim_rows), (dis_csv, _DISAGREEMENT_FIELDS, dis_rows)):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    summary = {
+        "runs": [{"label": lab, "path": p, "comparisons": present[i], "duplicates": dup_counters[i].get("duplicates", 0)}
+                 for i, (lab, p) in enumerate(zip(labels, run_paths))],
+        "joined_in_all": in_all,
+        "dimensions": dim_rows,
+        "paths": {
+            "compare_dimensions": dim_csv,
+            "compare_disagreements": dis_csv,
+            "compare_summary": summary_json,
+            "compare_report": report_md,
+        },
+    }
+    with open(summary_json, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    _write_report_md(report_md, summary, dis_rows, top_n=min(top_n, 20))
+    return summary
+
+
+def _fmt(v) -> str:
+    return "-" if v is None or (isinstance(v, float) and math.isnan(v)) else f"{v:.3f}"
+
+
+def _write_report_md(path: str, summary: dict, dis_rows: List[dict], *, top_n: int) -> str:
+    ts = _dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    md = [f"# 运行对比报告\n\n生成时间：{ts}\n", "## 覆盖率\n", "| 运行 | 比较条数 | 重复 | 路径 |", "|---|---:|---:|---|"]
+    for r in summary["runs"]:
+        md.append(f"| {r['label']} | {r['comparisons']} | {r['duplicates']} | {r['path']} |")
+    md.append(f"\n所有运行共有的 (task_id, bad_id)：{summary['joined_in_all']}\n")
+    md.append("## 各维度一致性（delta = good - bad，按整数档位）\n")
+    md.append("| 运行 A | 运行 B | 维度 | 配对数 | Kappa | 加权 Kappa | MAE | 完全一致率 |")
+    md.append("|---|---|---|---:|---:|---:|---:|---:|")
+    for r in summary["dimensions"]:
+        md.append(
+            f"| {r['run_a']} | {r['run_b']} | {r['dimension']} | {r['pairs']} | {_fmt(r['kappa'])} | "
+            f"{_fmt(r['weighted_kappa'])} | {_fmt(r['mae'])} | {_fmt(r['exact_agreement'])} |"
+        )
+    md.append("\n## 差异最大的比较\n")
+    md.append("| 运行 A | 运行 B | task_id | bad_id | 各维度差值绝对值之和 | 差异最大维度 |")
+    md.append("|---|---|---|---|---:|---|")
+    shown: Dict[Tuple[str, str], int] = {}
+    for r in dis_rows:
+        pair = (r["run_a"], r["run_b"])
+        if shown.get(pair, 0) >= top_n:
+            continue
+        shown[pair] = shown.get(pair, 0) + 1
+        md.append(
+            f"| {r['run_a']} | {r['run_b']} | {r['task_id']} | {r['bad_id']} | "
+            f"{r['total_abs_diff']:.2f} | {r['max_dimension']} |"
+        )
+    md.append("\n完整列表见 compare_disagreements.csv。\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(md))
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="按 (task_id, bad_id) 对比多次运行的 per_task.jsonl")
+    parser.add_argument("runs", nargs="+", help="两个或多个 per_task.jsonl")
+    parser.add_argument("-o", "--output", default="outputs/compare", help="输出目录")
+    parser.add_argument("--labels", default="", help="逗号分隔的运行名称（默认取所在目录名）")
+    parser.add_argument("--top", type=int, default=50, help="每对运行保留的最大差异条数")
+    parser.add_argument("--chunk-rows", type=int, default=200_000, help="外部排序每块行数")
+    args = parser.parse_args(argv)
+
+    labels = [s.strip() for s in args.labels.split(",") if s.strip()] or None
+    summary = compare_runs(args.runs, args.output, labels=labels, top_n=args.top, chunk_rows=args.chunk_rows)
+    for r in summary["runs"]:
+        print(f"  - {r['label']}: {r['comparisons']} 条比较")
+    print(f"✓ 共有 {summary['joined_in_all']} 条比较可对齐")
+    print(f"✓ 对比报告: {summary['paths']['compare_report']}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,840 @@
+"""Hard Negative 合成：基于 AST 变换向 good_code 定向注入缺陷。
+
+对应 clean/README.md §10。每个注入器是一个 ast.NodeTransformer，
+输入 good_code，输出注入单一缺陷后的代码；多个注入器可叠加（1~3 个缺陷）。
+
+内置注入器（id → defect_tag）：
+- remove_try_except  → 缺少异常处理：去掉 try/except，仅保留 try 主体与 finally
+- remove_validation  → 缺少输入校验：删除 `if ...: raise ...` 形式的校验分支
+- magic_numbers      → 魔法数字：将模块级常量内联为字面量并删除常量定义
+- quadratic_lookup   → 低效算法（O(n²)）：集合改为列表（`.add` 改为带去重判断的 append），成员判断退化为线性扫描
+- strip_asserts      → 缺少测试断言：删除 assert 语句
+- strip_type_hints   → 缺少类型注解：删除参数 / 返回值 / 变量注解
+
+变换结果只拼接回原始源码中发生变化的语句 / 表达式（见 _Splicer），注释与格式保持原样，
+合成坏例与 good_code 的差异仅限所标注的缺陷；无法精确拼接时放弃该注入器。
+
+输出为与 read_tasks_jsonl 兼容的 JSONL（task / good_code / bad_code / defect_tags），
+合成的坏例追加在原始 bad_code 之后，defect_tags 与 bad_code 逐个对应。
+目前仅支持 language == "python" 的任务。
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import argparse
+import ast
+import bisect
+import copy
+import difflib
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+
+from .adapters import _as_list_str
+from .io_utils import ensure_dir
+
+
+def _ensure_body(stmts: List[ast.stmt]) -> List[ast.stmt]:
+    """删除语句后保证代码块非空。"""
+    return stmts or [ast.Pass()]
+
+
+class _RemoveTryExcept(ast.NodeTransformer):
+    def visit_Try(self, node: ast.Try):
+        self.generic_visit(node)
+        # else 分支是正常路径的一部分，随 try 体一起保留
+        return node.body + node.orelse + node.finalbody
+
+    visit_TryStar = visit_Try
+
+
+class _RemoveValidation(ast.NodeTransformer):
+    @staticmethod
+    def _is_guard(node: ast.stmt) -> bool:
+        return (
+            isinstance(node, ast.If)
+            and not node.orelse
+            and len(node.body) == 1
+            and isinstance(node.body[0], ast.Raise)
+        )
+
+    def generic_visit(self, node):
+        super().generic_visit(node)
+        for attr in ("body", "orelse", "finalbody"):
+            stmts = getattr(node, attr, None)
+            if isinstance(stmts, list) and stmts and isinstance(stmts[0], ast.stmt):
+                kept = [s for s in stmts if not self._is_guard(s)]
+                if len(kept) != len(stmts):
+                    setattr(node, attr, _ensure_body(kept) if attr == "body" else kept)
+        return node
+
+
+def _rebound_names(tree: ast.AST) -> Dict[str, int]:
+    """统计每个名字的绑定次数（赋值 / 删除 / def / class / import / 参数等）；global / nonlocal 声明的名字记为无穷。"""
+    counts: Dict[str, int] = {}
+
+    def _bind(name: Optional[str], n: int = 1) -> None:
+        if name:
+            counts[name] = counts.get(name, 0) + n
+
+    for n in ast.walk(tree):
+        if isinstance(n, ast.Name) and isinstance(n.ctx, (ast.Store, ast.Del)):
+            _bind(n.id)
+        elif isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            _bind(n.name)
+        elif isinstance(n, ast.arg):
+            _bind(n.arg)
+        elif isinstance(n, ast.alias):
+            _bind(n.asname or n.name.split(".")[0])
+        elif isinstance(n, ast.ExceptHandler):
+            _bind(n.name)
+        elif isinstance(n, (ast.MatchAs, ast.MatchStar)):
+            _bind(n.name)
+        elif isinstance(n, (ast.Global, ast.Nonlocal)):
+            for name in n.names:
+                _bind(name, 1 << 30)
+    return counts
+
+
+class _InlineConstants(ast.NodeTransformer):
+    """将模块级 UPPER_CASE 数值常量内联为字面量。
+
+    只处理仅绑定一次的常量：被重新赋值、增量赋值或出现在 global / nonlocal 中的名字保持不变，
+    否则删除定义后这些写入会改变语义（甚至 NameError）。
+    """
+
+    def visit_Module(self, node: ast.Module):
+        bindings = _rebound_names(node)
+        consts: Dict[str, ast.Constant] = {}
+        body: List[ast.stmt] = []
+        for stmt in node.body:
+            if (
+                isinstance(stmt, ast.Assign)
+                and len(stmt.targets) == 1
+                and isinstance(stmt.targets[0], ast.Name)
+                and stmt.targets[0].id.isupper()
+                and bindings.get(stmt.targets[0].id) == 1
+                and isinstance(stmt.value, ast.Constant)
+                and isinstance(stmt.value.value, (int, float))
+                and not isinstance(stmt.value.value, bool)
+            ):
+                consts[stmt.targets[0].id] = stmt.value
+                continue
+            body.append(stmt)
+        if not consts:
+            return node
+        self._consts = consts
+        node.body = _ensure_body([self.visit(s) for s in body])
+        return node
+
+    def visit_Name(self, node: ast.Name):
+        consts = getattr(self, "_consts", {})
+        if isinstance(node.ctx, ast.Load) and node.id in consts:
+            return ast.copy_location(ast.Constant(consts[node.id].value), node)
+        return node
+
+
+_SCOPES = (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+
+
+def _scope_nodes(scope: ast.AST) -> Iterator[ast.AST]:
+    """作用域内的节点：不进入嵌套的函数 / 类（嵌套作用域节点本身会产出）。"""
+    stack = list(ast.iter_child_nodes(scope))
+    while stack:
+        n = stack.pop()
+        yield n
+        if not isinstance(n, _SCOPES):
+            stack.extend(ast.iter_child_nodes(n))
+
+
+def _is_set_expr(node: ast.AST) -> bool:
+    return isinstance(node, (ast.Set, ast.SetComp)) or (
+        isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "set" and len(node.args) <= 1 and not node.keywords
+    )
+
+
+def _is_membership_operand(node: ast.AST, parent: Optional[ast.AST]) -> bool:
+    return (
+        isinstance(parent, ast.Compare)
+        and node in parent.comparators
+        and all(isinstance(op, (ast.In, ast.NotIn)) for op in parent.ops)
+    )
+
+
+def _is_pure(node: ast.AST) -> bool:
+    """表达式可重复求值（不含调用、await、yield、海象赋值）。"""
+    return not any(isinstance(n, (ast.Call, ast.Await, ast.Yield, ast.YieldFrom, ast.NamedExpr)) for n in ast.walk(node))
+
+
+class _QuadraticLookup(ast.NodeTransformer):
+    """集合改为列表，使 `in` 查找退化为 O(n)。
+
+    仅改写语义安全的集合：直接作为 `in` 右操作数的集合表达式，以及在同一函数作用域内
+    只被用于 `in` 判断与 `s.add(x)` 语句的集合变量（嵌套函数、global / nonlocal 中出现或作为参数的不改写）。
+    `s.add(x)` 改写为 `if x not in s: s.append(x)`，保持去重，结果与原代码一致；其余集合保持不变。
+    """
+
+    def visit_Module(self, node: ast.Module):
+        parents = {c: p for p in ast.walk(node) for c in ast.iter_child_nodes(p)}
+        self._targets = set()
+        self._adds: Dict[int, bool] = {}  # id(s.add(x) 语句) -> 是否已在 `if x not in s:` 之内
+        for n in ast.walk(node):
+            if _is_set_expr(n) and _is_membership_operand(n, parents.get(n)):
+                self._targets.add(id(n))
+        for scope in ast.walk(node):
+            if isinstance(scope, _SCOPES):
+                self._collect_scope(scope, parents)
+        self.generic_visit(node)
+        return node
+
+    def _collect_scope(self, scope: ast.AST, parents: Dict[ast.AST, ast.AST]) -> None:
+        local = list(_scope_nodes(scope))
+        candidates: Dict[str, List[ast.AST]] = {}
+        for n in local:
+            p = parents.get(n)
+            if _is_set_expr(n) and isinstance(p, ast.Assign) and p.value is n and len(p.targets) == 1 and isinstance(p.targets[0], ast.Name):
+                candidates.setdefault(p.targets[0].id, []).append(n)
+        if not candidates:
+            return
+
+        local_ids = {id(n) for n in local}
+        unsafe = set()
+        if not isinstance(scope, (ast.Module, ast.ClassDef)):
+            unsafe.update(a.arg for a in ast.walk(scope.args) if isinstance(a, ast.arg))
+        for n in ast.walk(scope):
+            if isinstance(n, (ast.Global, ast.Nonlocal)):
+                unsafe.update(n.names)
+            elif isinstance(n, ast.Name) and n.id in candidates and id(n) not in local_ids:
+                unsafe.add(n.id)  # 嵌套作用域中引用或重新绑定
+
+        adds: Dict[str, Dict[int, bool]] = {}
+        for n in local:
+            if not (isinstance(n, ast.Name) and n.id in candidates):
+                continue
+            p = parents.get(n)
+            if isinstance(n.ctx, ast.Store):
+                if not (isinstance(p, ast.Assign) and any(p.value is e for e in candidates[n.id])):
+                    unsafe.add(n.id)
+                continue
+            if isinstance(n.ctx, ast.Load) and _is_membership_operand(n, p):
+                continue
+            call = parents.get(p)
+            if (
+                isinstance(p, ast.Attribute)
+                and p.attr == "add"
+                and isinstance(call, ast.Call)
+                and call.func is p
+                and len(call.args) == 1
+                and not call.keywords
+                and _is_pure(call.args[0])
+                and isinstance(parents.get(call), ast.Expr)
+            ):
+                stmt = parents[call]
+                guard = parents.get(stmt)
+                guarded = (
+                    isinstance(guard, ast.If)
+                    and stmt in guard.body
+                    and isinstance(guard.test, ast.Compare)
+                    and len(guard.test.ops) == 1
+                    and isinstance(guard.test.ops[0], ast.NotIn)
+                    and ast.dump(guard.test.left) == ast.dump(call.args[0])
+                    and isinstance(guard.test.comparators[0], ast.Name)
+                    and guard.test.comparators[0].id == n.id
+                )
+                adds.setdefault(n.id, {})[id(stmt)] = guarded
+                continue
+            unsafe.add(n.id)
+
+        for name, exprs in candidates.items():
+            if name not in unsafe:
+                self._targets.update(id(e) for e in exprs)
+                self._adds.update(adds.get(name, {}))
+
+    def _convert(self, node: ast.AST, new: ast.AST) -> ast.AST:
+        return ast.copy_location(new, node)
+
+    def visit_Set(self, node: ast.Set):
+        target = id(node) in self._targets
+        self.generic_visit(node)
+        return self._convert(node, ast.List(elts=node.elts, ctx=ast.Load())) if target else node
+
+    def visit_SetComp(self, node: ast.SetComp):
+        target = id(node) in self._targets
+        self.generic_visit(node)
+        return self._convert(node, ast.ListComp(elt=node.elt, generators=node.generators)) if target else node
+
+    def visit_Call(self, node: ast.Call):
+        target = id(node) in self._targets
+        self.generic_visit(node)
+        if target:
+            return self._convert(node, ast.Call(func=ast.Name(id="list", ctx=ast.Load()), args=node.args, keywords=[]))
+        return node
+
+    def visit_Expr(self, node: ast.Expr):
+        if id(node) not in self._adds:
+            return self.generic_visit(node)
+        # s.add(x) -> if x not in s: s.append(x)（已在同样的判断之内时直接 append）
+        call = node.value
+        seq, item = call.func.value, call.args[0]
+        append = ast.Expr(ast.Call(
+            func=ast.Attribute(value=ast.Name(id=seq.id, ctx=ast.Load()), attr="append", ctx=ast.Load()),
+            args=[item],
+            keywords=[],
+        ))
+        if self._adds[id(node)]:
+            return self._convert(node, append)
+        test = ast.Compare(left=copy.deepcopy(item), ops=[ast.NotIn()], comparators=[ast.Name(id=seq.id, ctx=ast.Load())])
+        return self._convert(node, ast.If(test=test, body=[append], orelse=[]))
+
+
+class _StripAsserts(ast.NodeTransformer):
+    def generic_visit(self, node):
+        super().generic_visit(node)
+        for attr in ("body", "orelse", "finalbody"):
+            stmts = getattr(node, attr, None)
+            if isinstance(stmts, list) and stmts and isinstance(stmts[0], ast.stmt):
+                kept = [s for s in stmts if not isinstance(s, ast.Assert)]
+                if len(kept) != len(stmts):
+                    setattr(node, attr, _ensure_body(kept) if attr == "body" else kept)
+        return node
+
+
+class _StripTypeHints(ast.NodeTransformer):
+    def __init__(self):
+        self._in_class_body: List[bool] = [False]
+
+    def visit_arg(self, node: ast.arg):
+        node.annotation = None
+        return node
+
+    def _visit_func(self, node):
+        self._in_class_body.append(False)
+        self.generic_visit(node)
+        self._in_class_body.pop()
+        node.returns = None
+        return node
+
+    visit_FunctionDef = _visit_func
+    visit_AsyncFunctionDef = _visit_func
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._in_class_body.append(True)
+        self.generic_visit(node)
+        self._in_class_body.pop()
+        return node
+
+    def visit_AnnAssign(self, node: ast.AnnAssign):
+        # 类体中的注解赋值是 dataclass / NamedTuple 字段，去掉注解会删除字段，保留；
+        # 其它位置的纯声明删除后会改变作用域语义，同样保留
+        if self._in_class_body[-1] or node.value is None:
+            return node
+        return ast.copy_location(ast.Assign(targets=[node.target], value=node.value), node)
+
+
+def _stmt_key(stmt: ast.stmt) -> str:
+    """语句的粗粒度对齐键：种类 + 定义名 / 赋值目标。"""
+    if isinstance(stmt, ast.Assign):
+        name = "|".join(ast.dump(t) for t in stmt.targets)
+    elif isinstance(stmt, (ast.AnnAssign, ast.AugAssign)):
+        name = ast.dump(stmt.target)
+    else:
+        name = getattr(stmt, "name", "")
+    return f"{type(stmt).__name__}:{name}"
+
+
+class _NoSpan(Exception):
+    """节点缺少位置信息或不独占整行，需要由外层节点整体改写。"""
+
+
+class _Splicer:
+    """比较原始 AST 与变换后的 AST，只在原始源码中改写发生变化的语句 / 表达式。
+
+    未变化的部分（注释、空行、格式）原样保留，合成坏例与 good_code 的差异仅限注入的缺陷。
+    位置信息（col_offset）为 UTF-8 字节偏移，因此在字节串上拼接。
+    """
+
+    def __init__(self, code: str, tree: ast.AST):
+        self.src = code.encode("utf-8")
+        self.line_starts = [0]
+        for line in self.src.splitlines(keepends=True):
+            self.line_starts.append(self.line_starts[-1] + len(line))
+        self.edits: List[Tuple[int, int, bytes]] = []
+        # 多行字符串的续行（行号从 1 起）：调整缩进时原样保留，否则字符串内容会改变
+        self.string_lines = {
+            line
+            for n in ast.walk(tree)
+            if isinstance(n, (ast.Constant, ast.JoinedStr)) and n.end_lineno > n.lineno
+            for line in range(n.lineno + 1, n.end_lineno + 1)
+        }
+
+    def _line_at(self, offset: int) -> bytes:
+        """偏移所在的整行（含换行符）。"""
+        line = bisect.bisect_right(self.line_starts, offset) - 1
+        return self.src[self.line_starts[line]:self.line_starts[min(line + 1, len(self.line_starts) - 1)]]
+
+    def _merge_blank_lines(self, start: int, end: int) -> int:
+        """删除 [start, end) 后前后的空行会相接：只保留两侧空行数的较大者，返回扩展后的 end。"""
+        before = 0
+        pos = start
+        while pos > 0 and not self._line_at(pos - 1).strip():
+            before += 1
+            pos -= len(self._line_at(pos - 1))
+        after = []
+        pos = end
+        while pos < len(self.src) and not self._line_at(pos).strip():
+            after.append(len(self._line_at(pos)))
+            pos += after[-1]
+        return end + sum(after[:min(before, len(after))])
+
+    def _span(self, node: ast.AST) -> Tuple[int, int]:
+        if getattr(node, "end_lineno", None) is None:
+            raise _NoSpan
+        return (
+            self.line_starts[node.lineno - 1] + node.col_offset,
+            self.line_starts[node.end_lineno - 1] + node.end_col_offset,
+        )
+
+    def _lines(self, first: ast.stmt, last: ast.stmt) -> Tuple[int, int, bytes]:
+        """语句 first..last（含装饰器）所占的整行范围与缩进；与其他代码同行时抛出 _NoSpan。"""
+        decorators = getattr(first, "decorator_list", None)
+        head = decorators[0] if decorators else first
+        start, _ = self._span(head)
+        _, end = self._span(last)
+        line_start = self.line_starts[head.lineno - 1]
+        line_end = self.line_starts[min(last.end_lineno, len(self.line_starts) - 1)]
+        indent = self.src[line_start:start]
+        if decorators:
+            if not indent.endswith(b"@"):
+                raise _NoSpan
+            indent = indent[:-1]
+        tail = self.src[end:line_end].strip()
+        if indent.strip() or (tail and not tail.startswith(b"#")):
+            raise _NoSpan
+        return line_start, line_end, indent
+
+    def _copy(self, first: ast.stmt, last: ast.stmt, indent: bytes) -> bytes:
+        """原文中 first..last 的整行（连同紧邻其前的注释行），重新缩进到 indent。"""
+        start, end, orig_indent = self._lines(first, last)
+        line = bisect.bisect_right(self.line_starts, start) - 1
+        while line > 0:
+            prev = self.src[self.line_starts[line - 1]:self.line_starts[line]]
+            if not (prev.startswith(orig_indent) and prev.strip().startswith(b"#")):
+                break
+            line -= 1
+        out = []
+        for lineno, text in enumerate(self.src[self.line_starts[line]:end].splitlines(keepends=True), line + 1):
+            if lineno in self.string_lines:
+                out.append(text)
+            elif text.startswith(orig_indent):
+                out.append(indent + text[len(orig_indent):])
+            elif not text.strip():
+                out.append(text)
+            else:
+                raise _NoSpan
+        text = b"".join(out)
+        return text if text.endswith(b"\n") else text + b"\n"
+
+    def _stmts_text(self, stmts: List[ast.stmt], indent: bytes, region: List[ast.stmt] = ()) -> bytes:
+        """新语句的源码：与 region 中原有语句相同（如 try 主体被提出）时沿用原文并调整缩进，否则 unparse。
+
+        原文中相邻的语句成组复制，保留它们之间的注释。
+        """
+        originals: Dict[str, ast.stmt] = {}
+        position: Dict[int, Tuple[int, int]] = {}
+        for s in region:
+            for n in ast.walk(s):
+                for field in ("body", "orelse", "finalbody"):
+                    block = getattr(n, field, None)
+                    if isinstance(block, list):
+                        for i, x in enumerate(block):
+                            if isinstance(x, ast.stmt):
+                                originals.setdefault(ast.dump(x), x)
+                                position[id(x)] = (id(block), i)
+        # 每组：(原文首句, 原文末句, 新语句列表)；无对应原文的语句单独成组，首末句为 None
+        groups: List[Tuple[Optional[ast.stmt], Optional[ast.stmt], List[ast.stmt]]] = []
+        for stmt in stmts:
+            orig = originals.get(ast.dump(stmt))
+            if orig is not None and groups and groups[-1][1] is not None:
+                first, last, members = groups[-1]
+                block, i = position[id(last)]
+                if position[id(orig)] == (block, i + 1):
+                    groups[-1] = (first, orig, members + [stmt])
+                    continue
+            groups.append((orig, orig, [stmt]))
+        out = []
+        for first, last, members in groups:
+            if first is not None:
+                try:
+                    out.append(self._copy(first, last, indent))
+                    continue
+                except _NoSpan:
+                    pass
+            out.append(self._unparse(members, indent))
+        return b"".join(out)
+
+    @staticmethod
+    def _unparse(stmts: List[ast.stmt], indent: bytes) -> bytes:
+        lines = [line for s in stmts for line in ast.unparse(s).splitlines()]
+        return b"".join((indent + line.encode("utf-8") if line.strip() else b"") + b"\n" for line in lines)
+
+    def _replace(self, old: ast.AST, new: ast.AST) -> None:
+        if isinstance(old, ast.stmt):
+            start, end, indent = self._lines(old, old)
+            self.edits.append((start, end, self._stmts_text([new], indent)))
+            return
+        start, end = self._span(old)
+        text = ast.unparse(new)
+        if "\n" in text:
+            raise _NoSpan
+        self.edits.append((start, end, text.encode("utf-8")))
+
+    def _delete_returns(self, returns: ast.expr) -> None:
+        start, end = self._span(returns)
+        arrow = self.src.rfind(b"->", 0, start)
+        if arrow < 0:
+            raise _NoSpan
+        while arrow > 0 and self.src[arrow - 1:arrow] in (b" ", b"\t"):
+            arrow -= 1
+        self.edits.append((arrow, end, b""))
+
+    def _delete_annotation(self, arg: ast.arg) -> None:
+        """删除参数注解；有默认值时 `x: int = 1` 按 PEP 8 收紧为 `x=1`。"""
+        start, _ = self._span(arg)
+        _, end = self._span(arg.annotation)
+        default = re.match(rb"\s*=\s*", self.src[end:])
+        if default:
+            self.edits.append((start + len(arg.arg.encode("utf-8")), end + default.end(), b"="))
+        else:
+            self.edits.append((start + len(arg.arg.encode("utf-8")), end, b""))
+
+    def _delete_clause(self, block: List[ast.stmt], keyword: bytes) -> None:
+        """子句内语句全部被删除：连同 else / elif / finally 所在行整体删除。"""
+        start, _ = self._span(block[0])
+        if not self.src.startswith(b"elif", start):
+            start = self.src.rfind(keyword, 0, start)
+        line_start = self.line_starts[bisect.bisect_right(self.line_starts, start) - 1]
+        if start < 0 or self.src[line_start:start].strip():
+            raise _NoSpan
+        _, end, _ = self._lines(block[-1], block[-1])
+        self.edits.append((line_start, end, b""))
+
+    def diff(self, old: ast.AST, new: ast.AST) -> None:
+        if ast.dump(old) == ast.dump(new):
+            return
+        mark = len(self.edits)
+        try:
+            if type(old) is not type(new):
+                raise _NoSpan
+            for field in old._fields:
+                a, b = getattr(old, field, None), getattr(new, field, None)
+                if isinstance(a, list) and isinstance(b, list):
+                    if a and not b and field in ("orelse", "finalbody"):
+                        self._delete_clause(a, b"else" if field == "orelse" else b"finally")
+                    elif any(isinstance(x, ast.stmt) for x in a + b):
+                        self._diff_stmts(a, b)
+                    elif len(a) != len(b):
+                        raise _NoSpan
+                    else:
+                        for x, y in zip(a, b):
+                            if isinstance(x, ast.AST) and isinstance(y, ast.AST):
+                                self.diff(x, y)
+                            elif isinstance(x, ast.AST) or isinstance(y, ast.AST) or x != y:
+                                raise _NoSpan
+                elif isinstance(a, ast.AST) and isinstance(b, ast.AST):
+                    self.diff(a, b)
+                elif field == "returns" and a is not None and b is None:
+                    self._delete_returns(a)
+                elif field == "annotation" and isinstance(old, ast.arg) and a is not None and b is None:
+                    self._delete_annotation(old)
+                elif isinstance(a, ast.AST) or isinstance(b, ast.AST) or a != b:
+                    raise _NoSpan
+        except _NoSpan:
+            del self.edits[mark:]
+            self._replace(old, new)
+
+    def _diff_stmts(self, old: List[ast.stmt], new: List[ast.stmt], key: Callable[[ast.stmt], str] = ast.dump) -> None:
+        matcher = difflib.SequenceMatcher(None, [key(s) for s in old], [key(s) for s in new], autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal" and key is ast.dump:
+                continue
+            if i2 - i1 == j2 - j1:
+                for a, b in zip(old[i1:i2], new[j1:j2]):
+                    self.diff(a, b)
+                continue
+            if key is ast.dump and i1 != i2 and j1 != j2:
+                # 块内再按语句种类 / 名称对齐（如删除常量定义的同时改写了其后的函数）
+                self._diff_stmts(old[i1:i2], new[j1:j2], key=_stmt_key)
+                continue
+            if i1 == i2:
+                raise _NoSpan  # 纯插入：内置注入器不会产生
+            start, end, indent = self._lines(old[i1], old[i2 - 1])
+            text = self._stmts_text(new[j1:j2], indent, old[i1:i2])
+            if not text:
+                end = self._merge_blank_lines(start, end)
+            self.edits.append((start, end, text))
+
+    def apply(self) -> Optional[str]:
+        out = self.src
+        bound = len(out)
+        for start, end, text in sorted(self.edits, reverse=True):
+            if end > bound:
+                return None  # 编辑区间重叠
+            out = out[:start] + text + out[end:]
+            bound = start
+        return out.decode("utf-8")
+
+
+# 注入器注册表：id -> (defect_tag, transformer 工厂)
+INJECTORS: Dict[str, Tuple[str, Callable[[], ast.NodeTransformer]]] = {
+    "remove_try_except": ("缺少异常处理", _RemoveTryExcept),
+    "remove_validation": ("缺少输入校验", _RemoveValidation),
+    "magic_numbers": ("魔法数字", _InlineConstants),
+    "quadratic_lookup": ("低效算法（O(n²)）", _QuadraticLookup),
+    "strip_asserts": ("缺少测试断言", _StripAsserts),
+    "strip_type_hints": ("缺少类型注解", _StripTypeHints),
+}
+
+
+def inject_defect(code: str, injector_id: str) -> Optional[str]:
+    """对代码应用单个注入器；不可解析、变换无效果或无法在原文上精确拼接时返回 None。
+
+    只改写变化的语句 / 表达式，其余源码（注释与格式）保持原样；拼接结果回解析后须与变换后的 AST 一致。
+    """
+    try:
+        original = ast.parse(code)
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    _, factory = INJECTORS[injector_id]
+    tree = ast.fix_missing_locations(factory().visit(tree))
+    expected = ast.dump(tree)
+    if expected == ast.dump(original):
+        return None
+    splicer = _Splicer(code, original)
+    try:
+        splicer.diff(original, tree)
+    except _NoSpan:
+        return None
+    out = splicer.apply()
+    try:
+        if out is None or ast.dump(ast.parse(out)) != expected:
+            return None
+    except SyntaxError:
+        return None
+    return out
+
+
+def applicable_injectors(code: str, injector_ids: Optional[Iterable[str]] = None) -> List[str]:
+    """返回对该代码有实际效果的注入器 id 列表。"""
+    ids = list(injector_ids) if injector_ids is not None else list(INJECTORS)
+    return [i for i in ids if inject_defect(code, i) is not None]
+
+
+def synthesize_bad_codes(
+    good_code: str,
+    *,
+    per_task: int = 3,
+    max_defects: int = 1,
+    injector_ids: Optional[Iterable[str]] = None,
+    seed: int = 0,
+) -> List[Tuple[str, List[str], List[str]]]:
+    """从 good_code 合成最多 per_task 个坏例。
+
+    每个坏例叠加 1~max_defects 个注入器。返回 (code, defect_tags, injector_ids) 列表；
+    good_code 不可解析时返回空列表。
+    """
+    usable = applicable_injectors(good_code, injector_ids)
+    if not usable:
+        return []
+    rng = random.Random(seed)
+    combos: List[Tuple[str, ...]] = []
+    for k in range(1, max(1, max_defects) + 1):
+        combos.extend(itertools.combinations(usable, k))
+    rng.shuffle(combos)
+
+    out: List[Tuple[str, List[str], List[str]]] = []
+    seen_codes = {good_code}
+    for combo in combos:
+        if len(out) >= per_task:
+            break
+        code: Optional[str] = good_code
+        for inj in combo:
+            code = inject_defect(code, inj)
+            if code is None:
+                break
+        if code is None or code in seen_codes:
+            continue
+        seen_codes.add(code)
+        out.append((code, [INJECTORS[i][0] for i in combo], list(combo)))
+    return out
+
+
+def _stable_seed(task_id: str, seed: int) -> int:
+    digest = hashlib.md5(f"{seed}:{task_id}".encode("utf-8")).hexdigest()
+    return int(digest[:8], 16)
+
+
+def synthesize_record(
+    rec: dict,
+    idx: int,
+    *,
+    per_task: int = 3,
+    max_defects: int = 1,
+    injector_ids: Optional[List[str]] = None,
+    keep_original: bool = True,
+    seed: int = 0,
+) -> Optional[dict]:
+    """为单条原始 JSONL 记录追加合成坏例，返回新记录。
+
+    task_id 缺失时按 read_tasks_jsonl 的规则固化为 T{idx:04d}，保证回读后 ID 不变。
+    无法合成（非 Python / good_code 语法错误）时：keep_original 为真则原样返回，否则返回 None。
+    """
+    good_list = _as_list_str(rec.get("good_code"))
+    bad_list = _as_list_str(rec.get("bad_code"))
+    task_id = str(rec.get("task_id") or f"T{idx:04d}")
+    language = str(rec.get("language") or "python")
+    tags = [list(t) for t in (rec.get("defect_tags") or [])]
+    tags += [[] for _ in range(len(bad_list) - len(tags))]
+
+    synthesized: List[Tuple[str, List[str], List[str]]] = []
+    if good_list and language.lower() == "python":
+        synthesized = synthesize_bad_codes(
+            good_list[0],
+            per_task=per_task,
+            max_defects=max_defects,
+            injector_ids=injector_ids,
+            seed=_stable_seed(task_id, seed),
+        )
+    if not synthesized and not keep_original:
+        return None
+
+    out = dict(rec)
+    out["task_id"] = task_id
+    out["language"] = language
+    base_bads = bad_list if keep_original else []
+    base_tags = tags[: len(bad_list)] if keep_original else []
+    out["bad_code"] = base_bads + [code for code, _, _ in synthesized]
+    out["defect_tags"] = base_tags + [t for _, t, _ in synthesized]
+    out["defect_injectors"] = [[] for _ in base_bads] + [inj for _, _, inj in synthesized]
+    return out
+
+
+def _synthesize_batch(batch: List[Tuple[int, dict]], **kwargs) -> List[dict]:
+    out = []
+    for idx, rec in batch:
+        new = synthesize_record(rec, idx, **kwargs)
+        if new is not None:
+            out.append(new)
+    return out
+
+
+def _iter_batches(path: str, batch_size: int) -> Iterator[List[Tuple[int, dict]]]:
+    batch: List[Tuple[int, dict]] = []
+    idx = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            idx += 1
+            batch.append((idx, json.loads(line)))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def synthesize_hard_negatives_jsonl(
+    in_path: str,
+    out_path: str,
+    *,
+    per_task: int = 3,
+    max_defects: int = 1,
+    injector_ids: Optional[List[str]] = None,
+    keep_original: bool = True,
+    seed: int = 0,
+    max_workers: Optional[int] = None,
+    batch_size: int = 256,
+) -> Dict[str, int]:
+    """以进程池批量合成 Hard Negative，流式写出 JSONL。
+
+    输入按 batch_size 分批提交，同时在途的批次数不超过 2×max_workers，内存与语料规模无关。
+    返回统计：records（写出记录数）与每个 defect_tag 的合成次数。
+    """
+    if injector_ids is not None:
+        unknown = [i for i in injector_ids if i not in INJECTORS]
+        if unknown:
+            raise ValueError(f"未知的注入器: {unknown}")
+    worker = partial(
+        _synthesize_batch,
+        per_task=per_task,
+        max_defects=max_defects,
+        injector_ids=injector_ids,
+        keep_original=keep_original,
+        seed=seed,
+    )
+    workers = max_workers or os.cpu_count() or 1
+    stats: Dict[str, int] = {"records": 0}
+    ensure_dir(os.path.dirname(out_path) or ".")
+
+    with open(out_path, "w", encoding="utf-8") as f, ProcessPoolExecutor(max_workers=workers) as executor:
+        batches = _iter_batches(in_path, batch_size)
+        pending = []
+        for batch in itertools.islice(batches, 2 * workers):
+            pending.append(executor.submit(worker, batch))
+        # 按提交顺序消费，保持输出顺序与输入一致
+        while pending:
+            records = pending.pop(0).result()
+            nxt = next(batches, None)
+            if nxt is not None:
+                pending.append(executor.submit(worker, nxt))
+            for rec in records:
+                for tags, injs in zip(rec["defect_tags"], rec["defect_injectors"]):
+                    if injs:
+                        for tag in tags:
+                            stats[tag] = stats.get(tag, 0) + 1
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                stats["records"] += 1
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="基于 AST 变换为 good_code 合成 Hard Negative")
+    parser.add_argument("input", help="原始任务 JSONL")
+    parser.add_argument("output", help="输出 JSONL（可直接被 read_tasks_jsonl 读取）")
+    parser.add_argument("--per-task", type=int, default=3, help="每个任务最多合成的坏例数")
+    parser.add_argument("--max-defects", type=int, default=1, help="每个坏例叠加的最大缺陷数（1~3）")
+    parser.add_argument("--injectors", default="", help=f"逗号分隔的注入器 id，可选: {','.join(INJECTORS)}")
+    parser.add_argument("--only-synthetic", action="store_true", help="仅保留合成坏例，丢弃原始 bad_code")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+    parser.add_argument("--batch-size", type=int, default=256, help="每个进程批次的记录数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+
+    injector_ids = [s.strip() for s in args.injectors.split(",") if s.strip()] or None
+    stats = synthesize_hard_negatives_jsonl(
+        args.input,
+        args.output,
+        per_task=args.per_task,
+        max_defects=args.max_defects,
+        injector_ids=injector_ids,
+        keep_original=not args.only_synthetic,
+        seed=args.seed,
+        max_workers=args.workers,
+        batch_size=args.batch_size,
+    )
+    print(f"✓ 写出 {stats.pop('records')} 条记录: {args.output}")
+    for tag, n in sorted(stats.items(), key=lambda kv: -kv[1]):
+        print(f"  - {tag}: {n}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,487 @@
+"""基于 SQLite 的持久化任务队列：多个 worker 进程（可在不同主机上）共同处理同一批任务。
+
+一个 run_pipeline 进程独占整个 INPUT_JSONL 时，增加第二台驱动机只能手工拆分文件。本模块把任务
+按批写入一个 SQLite 文件，任意数量的 worker 认领批次、写结果分片、释放租约，最后合并为 per_task.jsonl：
+
+- 入队（JobQueue.enqueue_jsonl）：读取输入并固定 task_id，按优先级（TaskInput.priority）从高到低
+  切成批次；任务数据存入数据库，worker 不需要访问输入文件；
+- 认领（claim）：在 BEGIN IMMEDIATE 事务中取优先级最高的待处理批次，或租约已过期的批次（回收崩溃 /
+  失联 worker 的批次），写入租约持有者与到期时间；超过 max_attempts 次认领仍未完成的批次标记为 failed；
+- 心跳（heartbeat）：处理期间后台线程定期延长租约；租约已被他人回收时返回 False；
+- 完成（complete）：结果先写入分片文件 {shard_dir}/batch-<id>-<worker>.jsonl（临时文件 + 原子改名），
+  只有仍持有租约时才记为 done；同一批次被回收后重复完成时，只保留先完成的一份分片；
+- 合并（merge_shards）：按批次顺序拼接各 done 批次的分片，生成最终的 per_task.jsonl。
+
+租约到期时间使用各主机的 time.time()，主机间时钟需同步（NTP），偏差应远小于租约时长。
+跨主机使用时数据库与分片目录须位于共享存储上，且该文件系统需支持 POSIX 文件锁（SQLite 的锁依赖于此）。
+
+命令行：
+  python -m analyze.job_queue init --db jobs.sqlite --input data/tasks.jsonl --batch-size 32
+  python -m analyze.job_queue worker --db jobs.sqlite        # 每台驱动机各运行一个或多个
+  python -m analyze.job_queue status --db jobs.sqlite
+  python -m analyze.job_queue merge --db jobs.sqlite -o outputs/per_task.jsonl
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from .io_utils import ensure_dir, read_tasks_jsonl, write_jsonl
+from .schemas import BadCode, ModelOutput, TaskInput
+
+# 默认租约时长（秒）；心跳间隔为其 1/3
+DEFAULT_LEASE_S = 600.0
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_ATTEMPTS = 3
+# 队列中尚有他人持有的租约时，等待其完成或过期的轮询间隔（秒）
+_POLL_S = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    priority INTEGER NOT NULL DEFAULT 0,
+    n_tasks INTEGER NOT NULL,
+    tasks TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    shard TEXT,
+    ok INTEGER,
+    failed INTEGER,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS idx_batches_claim ON batches (state, priority DESC, id);
+"""
+
+STATES = ("pending", "leased", "done", "failed")
+
+
+def default_worker_id() -> str:
+    """主机名 + 进程号，在共享同一队列的所有 worker 中唯一。"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _task_to_dict(task: TaskInput) -> dict:
+    return asdict(task)
+
+
+def _task_from_dict(data: dict) -> TaskInput:
+    data = dict(data)
+    data["bad_codes"] = [BadCode(**b) for b in data.get("bad_codes", [])]
+    return TaskInput(**data)
+
+
+class Batch:
+    """worker 认领到的一批任务。"""
+
+    __slots__ = ("id", "tasks", "attempt")
+
+    def __init__(self, batch_id: int, tasks: List[TaskInput], attempt: int):
+        self.id = batch_id
+        self.tasks = tasks
+        self.attempt = attempt
+
+    def __repr__(self) -> str:
+        return f"Batch(id={self.id}, tasks={len(self.tasks)}, attempt={self.attempt})"
+
+
+class JobQueue:
+    """SQLite 文件上的任务批次队列（每次操作使用独立连接，可在多线程 / 多进程中共享）。
+
+    Args:
+        db_path: SQLite 文件路径；不存在时创建
+        max_attempts: 单个批次最多被认领的次数（worker 崩溃或处理异常都会消耗一次）
+        shard_dir: 结果分片目录；首次创建队列时写入数据库，之后各 worker 沿用（默认数据库同目录下的 shards/）
+    """
+
+    def __init__(self, db_path: str, *, max_attempts: int = DEFAULT_MAX_ATTEMPTS, shard_dir: Optional[str] = None):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        ensure_dir(os.path.dirname(os.path.abspath(db_path)))
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            if shard_dir:
+                conn.execute(
+                    "INSERT OR IGNORE INTO meta (key, value) VALUES ('shard_dir', ?)", (os.path.abspath(shard_dir),)
+                )
+        stored = self._meta("shard_dir")
+        self.shard_dir = stored or os.path.join(os.path.dirname(os.path.abspath(db_path)), "shards")
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # isolation_level=None：事务由 BEGIN IMMEDIATE 显式控制；timeout 等待其他进程释放写锁
+        conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _meta(self, key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # ---- 入队 -------------------------------------------------------------
+
+    def enqueue(self, tasks: List[TaskInput], batch_size: int = DEFAULT_BATCH_SIZE, *, if_empty: bool = False) -> int:
+        """按优先级从高到低（同优先级保持输入顺序）切成批次并入队，返回新增批次数。
+
+        if_empty=True 时仅在队列为空时入队（检查与写入在同一事务中，多个驱动进程同时启动也只入队一次）。
+        """
+        ordered = sorted(tasks, key=lambda t: -(t.priority or 0))
+        batch_size = max(1, batch_size)
+        rows = []
+        for start in range(0, len(ordered), batch_size):
+            chunk = ordered[start:start + batch_size]
+            rows.append((
+                max(t.priority or 0 for t in chunk),
+                len(chunk),
+                json.dumps([_task_to_dict(t) for t in chunk], ensure_ascii=False),
+                time.time(),
+            ))
+        with self._transaction() as conn:
+            if if_empty and conn.execute("SELECT 1 FROM batches LIMIT 1").fetchone() is not None:
+                return 0
+            conn.executemany(
+                "INSERT INTO batches (priority, n_tasks, tasks, updated) VALUES (?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def enqueue_jsonl(self, input_jsonl: str, batch_size: int = DEFAULT_BATCH_SIZE, *, if_empty: bool = False) -> int:
+        """读取输入 JSONL（task_id 在此固定）并入队，返回新增批次数（参数见 enqueue）。"""
+        tasks = read_tasks_jsonl(input_jsonl)
+        n = self.enqueue(tasks, batch_size, if_empty=if_empty)
+        if not n:
+            return 0
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('input', ?)", (os.path.abspath(input_jsonl),)
+            )
+        return n
+
+    # ---- 租约 -------------------------------------------------------------
+
+    def claim(self, worker_id: str, lease_s: float = DEFAULT_LEASE_S) -> Optional[Batch]:
+        """认领一个待处理或租约已过期的批次（优先级高者优先）；没有可认领的批次时返回 None。"""
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT id, tasks, attempts, state, owner FROM batches"
+                    " WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)"
+                    " ORDER BY priority DESC, id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    return None
+                batch_id, payload, attempts, state, owner = row
+                if attempts >= self.max_attempts:
+                    conn.execute(
+                        "UPDATE batches SET state = 'failed', owner = NULL, lease_expires = NULL, updated = ?"
+                        " WHERE id = ?",
+                        (now, batch_id),
+                    )
+                    print(f"[警告] 批次 {batch_id} 已认领 {attempts} 次仍未完成，标记为 failed")
+                    continue
+                conn.execute(
+                    "UPDATE batches SET state = 'leased', owner = ?, lease_expires = ?,"
+                    " attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (worker_id, now + lease_s, now, batch_id),
+                )
+                break
+        if state == "leased":
+            print(f"[提示] 回收批次 {batch_id} 的过期租约（原持有者 {owner}）")
+        return Batch(batch_id, [_task_from_dict(d) for d in json.loads(payload)], attempts + 1)
+
+    def heartbeat(self, batch_id: int, worker_id: str, lease_s: float = DEFAULT_LEASE_S) -> bool:
+        """延长租约；租约已不属于 worker_id（过期后被回收）时返回 False。"""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE batches SET lease_expires = ?, updated = ?"
+                " WHERE id = ? AND owner = ? AND state = 'leased'",
+                (now + lease_s, now, batch_id, worker_id),
+            )
+        return cur.rowcount == 1
+
+    def complete(self, batch_id: int, worker_id: str, shard: str, ok: int, failed: int) -> bool:
+        """记录批次完成（shard 为相对 shard_dir 的分片文件名）；已失去租约时返回 False。"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE batches SET state = 'done', shard = ?, ok = ?, failed = ?, owner = NULL,"
+                " lease_expires = NULL, updated = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                (shard, ok, failed, time.time(), batch_id, worker_id),
+            )
+        return cur.rowcount == 1
+
+    def release(self, batch_id: int, worker_id: str) -> bool:
+        """放弃租约，批次回到 pending（已消耗的认领次数保留）。"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE batches SET state = 'pending', owner = NULL, lease_expires = NULL, updated = ?"
+                " WHERE id = ? AND owner = ? AND state = 'leased'",
+                (time.time(), batch_id, worker_id),
+            )
+        return cur.rowcount == 1
+
+    # ---- 状态与合并 --------------------------------------------------------
+
+    def status(self) -> Dict[str, int]:
+        """各状态的批次数（pending / leased / done / failed）与任务数（tasks_<状态>），
+        另含 analyzed_ok / analyzed_failed：已完成批次中成功 / 失败的任务数（多个模型池时按 任务 × 模型池 计）。"""
+        counts = {s: 0 for s in STATES}
+        counts.update({f"tasks_{s}": 0 for s in STATES})
+        with self._connect() as conn:
+            for state, n, n_tasks in conn.execute(
+                "SELECT state, COUNT(*), SUM(n_tasks) FROM batches GROUP BY state"
+            ):
+                counts[state] = n
+                counts[f"tasks_{state}"] = n_tasks or 0
+            ok, failed = conn.execute(
+                "SELECT COALESCE(SUM(ok), 0), COALESCE(SUM(failed), 0) FROM batches WHERE state = 'done'"
+            ).fetchone()
+        counts["analyzed_ok"] = ok
+        counts["analyzed_failed"] = failed
+        return counts
+
+    def is_empty(self) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM batches LIMIT 1").fetchone() is None
+
+    def is_finished(self) -> bool:
+        """所有批次均已 done 或 failed。"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM batches WHERE state IN ('pending', 'leased') LIMIT 1").fetchone()
+        return row is None
+
+    def shard_paths(self) -> List[str]:
+        """已完成批次的分片路径（按批次顺序）。"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT shard FROM batches WHERE state = 'done' ORDER BY id").fetchall()
+        return [os.path.join(self.shard_dir, shard) for (shard,) in rows]
+
+    def merge_shards(self, out_path: str, *, allow_partial: bool = False) -> int:
+        """按批次顺序拼接分片为 per_task.jsonl，返回写出的结果条数。
+
+        仍有未完成批次（pending / leased）时抛出 RuntimeError，allow_partial=True 时只合并已完成部分。
+        """
+        counts = self.status()
+        unfinished = counts["pending"] + counts["leased"]
+        if unfinished and not allow_partial:
+            raise RuntimeError(f"仍有 {unfinished} 个批次未完成，无法合并（allow_partial=True 可合并已完成部分）")
+        if counts["failed"]:
+            print(f"[警告] {counts['failed']} 个批次（{counts['tasks_failed']} 个任务）多次认领仍失败，结果中不包含")
+        ensure_dir(os.path.dirname(os.path.abspath(out_path)))
+        n = 0
+        tmp_path = f"{out_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for path in self.shard_paths():
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            out.write(line if line.endswith("\n") else line + "\n")
+                            n += 1
+        os.replace(tmp_path, out_path)
+        return n
+
+
+class _Heartbeat:
+    """处理批次期间在后台线程中定期续租。"""
+
+    def __init__(self, queue: JobQueue, batch_id: int, worker_id: str, lease_s: float):
+        self.queue = queue
+        self.batch_id = batch_id
+        self.worker_id = worker_id
+        self.lease_s = lease_s
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{batch_id}", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.lease_s / 3):
+            try:
+                alive = self.queue.heartbeat(self.batch_id, self.worker_id, self.lease_s)
+            except sqlite3.Error as e:  # 暂时性的锁超时等，下次心跳重试
+                print(f"[警告] 批次 {self.batch_id} 续租失败: {e}")
+                continue
+            if not alive:
+                self.lost = True
+                print(f"[警告] 批次 {self.batch_id} 的租约已被回收，本次结果将被丢弃")
+                return
+
+    def __enter__(self) -> "_Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def _count_outcomes(tasks: List[TaskInput], results: List[ModelOutput], pools: Optional[list] = None) -> Tuple[int, int]:
+    """按 (task_id, 模型池) 统计成功与失败数：多个模型池时每个任务在其路由到的每个池各计一次。"""
+    if pools:
+        expected = {(t.task_id, p.name) for p in pools for t in tasks if p.accepts(t.task_id)}
+    else:
+        expected = {(t.task_id, None) for t in tasks}
+    got = {(str(r.get("task_id")), r.get("model") if pools else None) for r in results if isinstance(r, dict)}
+    ok = len(expected & got)
+    return ok, len(expected) - ok
+
+
+def run_worker(
+    queue: JobQueue,
+    analyze: Callable[[List[TaskInput]], List[ModelOutput]],
+    *,
+    pools: Optional[list] = None,
+    worker_id: Optional[str] = None,
+    lease_s: float = DEFAULT_LEASE_S,
+    max_batches: Optional[int] = None,
+    poll_s: float = _POLL_S,
+) -> Dict[str, int]:
+    """循环认领批次、分析、写分片并完成，直到队列中所有批次都已 done / failed。
+
+    队列中暂无可认领批次、但仍有他人持有的租约时继续等待：租约过期后由本 worker 回收。
+
+    Args:
+        queue: 任务队列
+        analyze: 分析一批任务的函数（如 partial(analyze_tasks, model=client, show_progress=False)）
+        pools: analyze 使用的 ModelPool 列表（analyze_tasks_routed），用于按 (任务, 模型池) 统计失败数
+        worker_id: 租约持有者标识（默认主机名 + 进程号）
+        lease_s: 租约时长（秒），需明显长于处理一个批次的时间；心跳每 lease_s / 3 续租一次
+        max_batches: 最多处理的批次数（None 表示不限）
+        poll_s: 等待他人租约时的轮询间隔
+
+    Returns:
+        本 worker 的统计：batches / analyzed_ok / analyzed_failed / lost（失去租约被丢弃的批次数）
+    """
+    worker_id = worker_id or default_worker_id()
+    stats = {"batches": 0, "analyzed_ok": 0, "analyzed_failed": 0, "lost": 0}
+    ensure_dir(queue.shard_dir)
+    while max_batches is None or stats["batches"] + stats["lost"] < max_batches:
+        batch = queue.claim(worker_id, lease_s)
+        if batch is None:
+            if queue.is_finished():
+                break
+            time.sleep(poll_s)
+            continue
+
+        print(f"[worker {worker_id}] 批次 {batch.id}: {len(batch.tasks)} 个任务（第 {batch.attempt} 次认领）")
+        try:
+            with _Heartbeat(queue, batch.id, worker_id, lease_s) as beat:
+                results = analyze(batch.tasks)
+        except KeyboardInterrupt:
+            queue.release(batch.id, worker_id)
+            raise
+        except Exception as e:
+            print(f"[错误] 批次 {batch.id} 处理异常: {e}")
+            queue.release(batch.id, worker_id)
+            continue
+
+        shard = f"batch-{batch.id:06d}-{worker_id}.jsonl"
+        shard_path = os.path.join(queue.shard_dir, shard)
+        tmp_path = f"{shard_path}.tmp"
+        write_jsonl(tmp_path, results)
+        os.replace(tmp_path, shard_path)
+        ok, failed = _count_outcomes(batch.tasks, results, pools)
+        if beat.lost or not queue.complete(batch.id, worker_id, shard, ok, failed):
+            # 批次已被他人回收：结果以对方为准，丢弃本分片
+            os.remove(shard_path)
+            stats["lost"] += 1
+            continue
+        stats["batches"] += 1
+        stats["analyzed_ok"] += ok
+        stats["analyzed_failed"] += failed
+    return stats
+
+
+def _format_status(counts: Dict[str, int]) -> str:
+    return ", ".join(f"{s} {counts[s]} 批（{counts[f'tasks_{s}']} 任务）" for s in STATES)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="多 worker 共享的 SQLite 任务队列")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_init = sub.add_parser("init", help="读取输入 JSONL 并入队")
+    p_init.add_argument("--db", required=True, help="SQLite 文件路径")
+    p_init.add_argument("--input", required=True, help="输入任务 JSONL")
+    p_init.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每批任务数")
+    p_init.add_argument("--shard-dir", default="", help="结果分片目录（默认数据库同目录下的 shards/）")
+
+    p_worker = sub.add_parser("worker", help="认领并处理批次，直到队列完成")
+    p_worker.add_argument("--db", required=True)
+    p_worker.add_argument("--lease", type=float, default=DEFAULT_LEASE_S, help="租约时长（秒）")
+    p_worker.add_argument("--max-workers", type=int, default=int(os.environ.get("MAX_WORKERS", "4")))
+    p_worker.add_argument("--worker-id", default="", help="租约持有者标识（默认主机名-进程号）")
+
+    p_status = sub.add_parser("status", help="打印各状态的批次数")
+    p_status.add_argument("--db", required=True)
+
+    p_merge = sub.add_parser("merge", help="合并已完成批次的分片为 per_task.jsonl")
+    p_merge.add_argument("--db", required=True)
+    p_merge.add_argument("-o", "--output", default="outputs/per_task.jsonl")
+    p_merge.add_argument("--allow-partial", action="store_true", help="允许在仍有未完成批次时合并")
+    args = parser.parse_args(argv)
+
+    if args.command == "init":
+        queue = JobQueue(args.db, shard_dir=args.shard_dir or None)
+        n = queue.enqueue_jsonl(args.input, args.batch_size)
+        print(f"✓ 入队 {n} 个批次: {args.db}")
+        print(f"✓ 分片目录: {queue.shard_dir}")
+        return 0
+
+    queue = JobQueue(args.db)
+    if args.command == "status":
+        print(_format_status(queue.status()))
+        return 0
+    if args.command == "merge":
+        n = queue.merge_shards(args.output, allow_partial=args.allow_partial)
+        print(f"✓ 合并 {n} 条结果: {args.output}")
+        return 0
+
+    # worker：模型池 / vLLM 实例沿用 pipeline 的环境变量（MODEL_POOLS、VLLM_URLS / VLLM_PORTS）
+    from functools import partial
+
+    from .multi_vllm import MultiVLLMClient, get_model_pools_from_env, get_vllm_urls_from_env
+    from .per_task import analyze_tasks, analyze_tasks_routed
+
+    model_pools = get_model_pools_from_env()
+    if model_pools:
+        analyze = partial(analyze_tasks_routed, pools=model_pools, max_workers=args.max_workers, show_progress=False)
+    else:
+        client = MultiVLLMClient(get_vllm_urls_from_env())
+        analyze = partial(analyze_tasks, model=client, max_workers=args.max_workers, show_progress=False)
+    stats = run_worker(queue, analyze, pools=model_pools, worker_id=args.worker_id or None, lease_s=args.lease)
+    print(f"✓ 本 worker 完成 {stats['batches']} 个批次（成功 {stats['analyzed_ok']}，失败 {stats['analyzed_failed']}）")
+    print(f"  队列状态: {_format_status(queue.status())}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
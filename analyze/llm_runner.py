@@ -6,16 +6,144 @@
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import Any, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
 import json
+import re
+import threading
 import time
 
-from .schemas import ModelOutput, TaskInput, to_json_compatible
-from .prompting import build_1vN_prompt
+from .schemas import ModelOutput, TaskInput
+from .telemetry import backend_of, get_telemetry, in_flight, record_attempt
 
 
-def call_model(prompt: str, model = None, temperature: float = 0.8, max_tokens: Optional[int] = None, max_retries: int = 3) -> Optional[str]:
-    """使用给定 Prompt 调用 LLM 并返回原始文本。
+MODEL_PATH = "/var/shared/models/Qwen3-30B-A3B-Instruct-2507"
+
+
+_DECODER = json.JSONDecoder()
+# 查找 JSON 块时只需关注的字符：字符串外的括号与引号；字符串体用“展开循环”正则一次跳过
+_STRUCTURAL_RE = re.compile(r'[{}"]')
+_STRING_BODY_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+
+# call_model（兼容接口）已解析的结果（原始文本 -> 对象），由 parse_model_response 取走一次，避免二次解析
+_PARSED_CACHE: "OrderedDict[str, object]" = OrderedDict()
+_PARSED_CACHE_SIZE = 256
+_PARSED_CACHE_LOCK = threading.Lock()
+_MISSING = object()
+
+
+def _remember_parsed(raw: str, data) -> None:
+    with _PARSED_CACHE_LOCK:
+        _PARSED_CACHE[raw] = data
+        _PARSED_CACHE.move_to_end(raw)
+        while len(_PARSED_CACHE) > _PARSED_CACHE_SIZE:
+            _PARSED_CACHE.popitem(last=False)
+
+
+def _take_parsed(raw: str):
+    with _PARSED_CACHE_LOCK:
+        return _PARSED_CACHE.pop(raw, _MISSING)
+
+
+@dataclass
+class LLMResponse:
+    """一次成功调用的结果：已校验解析的对象、原始文本与调用元数据。"""
+
+    raw: str
+    data: Any
+    outcome: str  # ok（整体为 JSON）/ json_block（从前后缀中提取）
+    attempts: int = 1
+    latency_s: float = 0.0  # 成功那次尝试的耗时
+    elapsed_s: float = 0.0  # 含重试与等待的总耗时
+    backend: str = ""
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None  # n>1 请求为整个请求的用量
+
+
+def decode_response(raw: Optional[str]) -> Tuple[Any, str]:
+    """将响应文本解码为对象，返回 (对象, 解析结果)。
+
+    整体为 JSON 时结果为 "ok"，从前后缀中提取出 JSON 块时为 "json_block"；
+    调用层的校验与 parse_model_response 共用这一步，无法得到合法 JSON 时抛出 ValueError。
+    """
+    if raw is None:
+        raise ValueError("响应为空")
+    try:
+        return json.loads(raw), "ok"
+    except json.JSONDecodeError:
+        pass
+    start, end, data = _json_block_span(raw)
+    if data is _MISSING:
+        # 括号匹配但内容不是合法 JSON：抛出 JSONDecodeError（ValueError 子类）
+        data = json.loads(raw[start:end])
+    return data, "json_block"
+
+
+def _served_model(client) -> str:
+    """请求使用的模型名：客户端标记了所服务的模型（如 ModelPool 的 MultiVLLMClient）时用它，否则为 MODEL_PATH。"""
+    return getattr(client, "model_name", None) or MODEL_PATH
+
+
+def _in_flight(model):
+    """在途请求计数；MultiVLLMClient 自行按实例计数，这里不重复。"""
+    if getattr(model, "tracks_backend", False):
+        return nullcontext()
+    return in_flight(backend_of(model))
+
+
+def _create_streaming(client, t0: float, **kwargs):
+    """以流式请求发送，返回 (文本, usage, 首 token 时间)；usage 需服务端支持 include_usage。"""
+    stream = client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+    parts: List[str] = []
+    usage = None
+    ttfb = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        for choice in getattr(chunk, "choices", None) or []:
+            delta = getattr(choice.delta, "content", None)
+            if delta:
+                if ttfb is None:
+                    ttfb = time.perf_counter() - t0
+                parts.append(delta)
+    return "".join(parts), usage, ttfb
+
+
+def _decode_or_invalid(content: Optional[str]) -> Tuple[Any, str]:
+    try:
+        return decode_response(content)
+    except ValueError:
+        return None, "invalid_json"
+
+
+def _llm_response(content: str, data, outcome: str, rec: dict, attempt: int, first_t0: float) -> LLMResponse:
+    return LLMResponse(
+        raw=content,
+        data=data,
+        outcome=outcome,
+        attempts=attempt + 1,
+        latency_s=rec["latency_s"],
+        elapsed_s=time.perf_counter() - first_t0,
+        backend=rec["backend"],
+        prompt_tokens=rec["prompt_tokens"],
+        completion_tokens=rec["completion_tokens"],
+    )
+
+
+def call_model_result(
+    prompt: str,
+    model=None,
+    temperature: float = 0.8,
+    max_tokens: Optional[int] = None,
+    max_retries: int = 3,
+) -> Optional[LLMResponse]:
+    """使用给定 Prompt 调用 LLM，返回已校验解析的结果（每个响应只解码一次）。
+
+    每次尝试都会向 analyze.telemetry 提交一条记录（backend、延迟、token、重试次数、解析结果）；
+    遥测开启 measure_ttfb 时改用流式请求以测量首 token 时间。
 
     Args:
         prompt: 要发送给模型的提示文本
@@ -23,49 +151,40 @@ def call_model(prompt: str, model = None, temperature: float = 0.8, max_tokens:
         temperature: 采样温度
         max_tokens: 最大生成 token 数
         max_retries: 如果响应无法解析为 JSON，最多重试次数
-    
+
     Returns:
-        模型返回的原始文本，如果所有重试都失败则返回 None
+        LLMResponse（data 为解析后的对象），如果所有重试都失败则返回 None
     """
     if model is None:
         raise ValueError("必须提供 model (OpenAI client) 参数")
+    telemetry = get_telemetry()
+    first_t0 = time.perf_counter()
     
     for attempt in range(max_retries):
+        started = time.time()
+        t0 = time.perf_counter()
         try:
             # 调用 OpenAI 兼容的 API (vLLM)
-            response = model.chat.completions.create(
-                model="/var/shared/models/Qwen3-30B-A3B-Instruct-2507",
+            request = dict(
+                model=_served_model(model),
                 messages=[
                     {"role": "user", "content": prompt}
                 ],
                 temperature=temperature,
                 max_tokens=max_tokens
             )
-            
-            content = response.choices[0].message.content
-            
-            # 验证响应是否可以解析为 JSON
-            try:
-                json.loads(content)
-                # 成功解析，返回内容
-                return content
-            except json.JSONDecodeError:
-                # 尝试提取 JSON 块
-                try:
-                    extract_json_block(content)
-                    # 能提取到 JSON 块，返回原始内容
-                    return content
-                except ValueError:
-                    # 无法提取 JSON
-                    if attempt < max_retries - 1:
-                        print(f"[警告] 第 {attempt + 1} 次尝试失败，响应无法解析为 JSON，正在重试...")
-                        time.sleep(1)  # 等待 1 秒后重试
-                        continue
-                    else:
-                        print(f"[错误] 已重试 {max_retries} 次，仍无法获得有效 JSON 响应，跳过此任务")
-                        return None
-        
+            with _in_flight(model):
+                if telemetry.measure_ttfb:
+                    content, usage, ttfb = _create_streaming(model, t0, **request)
+                else:
+                    response = model.chat.completions.create(**request)
+                    content = response.choices[0].message.content
+                    usage, ttfb = getattr(response, "usage", None), None
         except Exception as e:
+            record_attempt(
+                model, attempt=attempt, started=started, latency_s=time.perf_counter() - t0,
+                outcome="error", error=f"{type(e).__name__}: {e}",
+            )
             if attempt < max_retries - 1:
                 print(f"[警告] 第 {attempt + 1} 次调用出错: {e}，正在重试...")
                 time.sleep(1)
@@ -73,15 +192,134 @@ def call_model(prompt: str, model = None, temperature: float = 0.8, max_tokens:
             else:
                 print(f"[错误] 已重试 {max_retries} 次，仍然失败: {e}，跳过此任务")
                 return None
+
+        # 解码即校验（整体或提取 JSON 块均可），解析结果随响应返回
+        data, outcome = _decode_or_invalid(content)
+        rec = record_attempt(
+            model, attempt=attempt, started=started, latency_s=time.perf_counter() - t0,
+            outcome=outcome, ttfb_s=ttfb, usage=usage,
+        )
+        if outcome != "invalid_json":
+            return _llm_response(content, data, outcome, rec, attempt, first_t0)
+        # 无法提取 JSON
+        if attempt < max_retries - 1:
+            print(f"[警告] 第 {attempt + 1} 次尝试失败，响应无法解析为 JSON，正在重试...")
+            time.sleep(1)  # 等待 1 秒后重试
+        else:
+            print(f"[错误] 已重试 {max_retries} 次，仍无法获得有效 JSON 响应，跳过此任务")
+            return None
     
     return None
 
 
-def extract_json_block(raw: str) -> str:
-    """从原始响应中提取 JSON 片段。
+def call_model(prompt: str, model = None, temperature: float = 0.8, max_tokens: Optional[int] = None, max_retries: int = 3) -> Optional[str]:
+    """使用给定 Prompt 调用 LLM 并返回原始文本（call_model_result 的兼容封装）。
 
-    实现：从“输入：”标记之后查找第一个 '{'，
-    做括号匹配提取完整 JSON 对象字符串。
+    解析结果会留给随后的 parse_model_response 直接取用，不会重复解析。
+
+    Returns:
+        模型返回的原始文本，如果所有重试都失败则返回 None
+    """
+    result = call_model_result(prompt, model=model, temperature=temperature, max_tokens=max_tokens, max_retries=max_retries)
+    if result is None:
+        return None
+    _remember_parsed(result.raw, result.data)
+    return result.raw
+
+
+def call_model_samples_result(
+    prompt: str,
+    model=None,
+    n: int = 2,
+    temperature: float = 0.8,
+    max_tokens: Optional[int] = None,
+    max_retries: int = 3,
+    fan_out: bool = False,
+) -> List[LLMResponse]:
+    """对同一 Prompt 采样 n 次，返回已校验解析的结果列表。
+
+    Args:
+        fan_out: False 时发送一次 n=n 的请求（由 vLLM 在同一批次内并行采样）；
+            True 时并发发送 n 次独立请求，配合 MultiVLLMClient 可分散到不同实例。
+
+    Returns:
+        有效响应列表（可能少于 n 条；全部失败时为空列表）
+    """
+    if model is None:
+        raise ValueError("必须提供 model (OpenAI client) 参数")
+    if n <= 1 or fan_out:
+        if n <= 1:
+            result = call_model_result(prompt, model=model, temperature=temperature, max_tokens=max_tokens, max_retries=max_retries)
+            return [result] if result is not None else []
+        with ThreadPoolExecutor(max_workers=n) as executor:
+            results = list(executor.map(
+                lambda _: call_model_result(prompt, model=model, temperature=temperature, max_tokens=max_tokens, max_retries=max_retries),
+                range(n),
+            ))
+        return [r for r in results if r is not None]
+
+    first_t0 = time.perf_counter()
+    for attempt in range(max_retries):
+        started = time.time()
+        t0 = time.perf_counter()
+        try:
+            with _in_flight(model):
+                response = model.chat.completions.create(
+                    model=_served_model(model),
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    n=n,
+                )
+            decoded = [(c.message.content, *_decode_or_invalid(c.message.content)) for c in response.choices]
+            valid = [d for d in decoded if d[2] != "invalid_json"]
+            rec = record_attempt(
+                model, attempt=attempt, started=started, latency_s=time.perf_counter() - t0,
+                outcome="ok" if valid else "invalid_json", response=response,
+            )
+            if valid:
+                return [_llm_response(content, data, outcome, rec, attempt, first_t0) for content, data, outcome in valid]
+            if attempt < max_retries - 1:
+                print(f"[警告] 第 {attempt + 1} 次多采样请求无有效 JSON 响应，正在重试...")
+                time.sleep(1)
+        except Exception as e:
+            record_attempt(
+                model, attempt=attempt, started=started, latency_s=time.perf_counter() - t0,
+                outcome="error", error=f"{type(e).__name__}: {e}",
+            )
+            if attempt < max_retries - 1:
+                print(f"[警告] 第 {attempt + 1} 次多采样调用出错: {e}，正在重试...")
+                time.sleep(1)
+            else:
+                print(f"[错误] 已重试 {max_retries} 次，多采样仍然失败: {e}")
+    return []
+
+
+def call_model_samples(
+    prompt: str,
+    model=None,
+    n: int = 2,
+    temperature: float = 0.8,
+    max_tokens: Optional[int] = None,
+    max_retries: int = 3,
+    fan_out: bool = False,
+) -> List[str]:
+    """对同一 Prompt 采样 n 次，返回可解析为 JSON 的原始文本列表（call_model_samples_result 的兼容封装）。"""
+    results = call_model_samples_result(
+        prompt, model=model, n=n, temperature=temperature, max_tokens=max_tokens, max_retries=max_retries, fan_out=fan_out,
+    )
+    for r in results:
+        _remember_parsed(r.raw, r.data)
+    return [r.raw for r in results]
+
+
+def _json_block_span(raw: str):
+    """定位 JSON 块，返回 (起点, 终点, 已解码对象或 _MISSING)。
+
+    先从起始 '{' 用 JSONDecoder.raw_decode 一次解码（C 实现，顺带得到对象）；
+    不是合法 JSON 时退回括号匹配：正则在引号与括号之间跳转，字符串体整段跳过。
     """
     anchor = "输入："
     start = raw.find(anchor)
@@ -91,42 +329,55 @@ def extract_json_block(raw: str) -> str:
         i = raw.find("{")
         if i == -1:
             raise ValueError("未找到 JSON 起始位置")
+    try:
+        data, end = _DECODER.raw_decode(raw, i)
+        return i, end, data
+    except json.JSONDecodeError:
+        pass
     # 简单双引号忽略的括号匹配
     depth = 0
-    in_str = False
-    esc = False
-    for j in range(i, len(raw)):
-        ch = raw[j]
-        if in_str:
-            if esc:
-                esc = False
-            elif ch == "\\":
-                esc = True
-            elif ch == '"':
-                in_str = False
+    pos = i
+    while True:
+        m = _STRUCTURAL_RE.search(raw, pos)
+        if m is None:
+            break
+        ch = m.group()
+        pos = m.end()
+        if ch == '"':
+            body = _STRING_BODY_RE.match(raw, pos)
+            if body is None:
+                break
+            pos = body.end()
+        elif ch == "{":
+            depth += 1
         else:
-            if ch == '"':
-                in_str = True
-            elif ch == '{':
-                depth += 1
-            elif ch == '}':
-                depth -= 1
-                if depth == 0:
-                    return raw[i : j + 1]
+            depth -= 1
+            if depth == 0:
+                return i, pos, _MISSING
     raise ValueError("未找到完整的 JSON 块")
 
 
+def extract_json_block(raw: str) -> str:
+    """从原始响应中提取 JSON 片段。
+
+    实现：从“输入：”标记之后查找第一个 '{'，
+    做括号匹配提取完整 JSON 对象字符串。
+    """
+    start, end, _ = _json_block_span(raw)
+    return raw[start:end]
+
+
 def parse_model_response(raw: str) -> ModelOutput:
     """将原始模型输出解析为目标结构。
 
     默认解析为 JSON dict 并直接返回原始 dict（或可扩展为严格校验）。
     这里我们将其保持为轻量：返回 ModelOutput 的 dict 形式。
+    call_model 已解析过的响应直接取其结果；新代码应使用 call_model_result 的 data 字段。
     """
-    try:
-        data = json.loads(raw)
-    except Exception:
-        # 若返回文本包含前后缀，尝试提取 JSON 片段
-        data = json.loads(extract_json_block(raw))
+    data = _take_parsed(raw)
+    if data is _MISSING:
+        # 若返回文本包含前后缀，decode_response 会提取 JSON 片段
+        data, _ = decode_response(raw)
     # 可在此加入严格的 schema 校验或 dataclass 转换。
     # 目前返回原始 dict 以便上游直接写入 JSONL。
     return data  # type: ignore[return-value]
@@ -1,15 +1,22 @@
 """多 vLLM 实例并发调用管理器。
 
 支持将任务分发到多个 vLLM 实例上并发执行，提高推理吞吐量。
+ModelPool 把一组实例标记为同一个模型部署；多个模型池可同时评测同一批任务（A/B 评测，
+见 analyze.per_task.analyze_tasks_routed）。
 """
 
 from __future__ import annotations
 
 import os
-from typing import List, Optional
+import zlib
+from typing import TYPE_CHECKING, List, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
-from openai import OpenAI
+
+from .telemetry import in_flight, note_backend
+
+if TYPE_CHECKING:  # openai 仅在创建客户端时导入
+    from openai import OpenAI
 
 
 class MultiVLLMClient:
@@ -17,8 +24,17 @@ class MultiVLLMClient:
     
     支持负载均衡和故障转移。
     """
+
+    # 由本客户端按实际实例上报遥测的 backend 与在途请求数（llm_runner 不再按 base_url 重复计数）
+    tracks_backend = True
     
-    def __init__(self, base_urls: List[str], api_key: str = "EMPTY", max_workers: Optional[int] = None):
+    def __init__(
+        self,
+        base_urls: List[str],
+        api_key: str = "EMPTY",
+        max_workers: Optional[int] = None,
+        model: Optional[str] = None,
+    ):
         """初始化多实例客户端。
         
         Args:
@@ -26,23 +42,45 @@ class MultiVLLMClient:
                 ["http://localhost:8001/v1", "http://localhost:8002/v1", ...]
             api_key: API 密钥（vLLM 默认不验证，使用 "EMPTY"）
             max_workers: 最大并发工作线程数，默认为实例数量
+            model: 这些实例提供的模型（vLLM 的 --model 路径），设置后请求一律使用该模型名
         """
+        from openai import OpenAI
+
+        self.model_name = model
+        self.base_urls = list(base_urls)
         self.clients = [OpenAI(base_url=url, api_key=api_key) for url in base_urls]
         self.num_clients = len(self.clients)
         self.max_workers = max_workers or self.num_clients
         self.current_index = 0
+        self.busy = [0] * self.num_clients  # 各实例的在途请求数
         self.lock = Lock()
         
-        print(f"[MultiVLLM] 初始化 {self.num_clients} 个 vLLM 实例")
+        print(f"[MultiVLLM] 初始化 {self.num_clients} 个 vLLM 实例" + (f"（模型 {model}）" if model else ""))
         for i, url in enumerate(base_urls):
             print(f"  - 实例 {i}: {url}")
     
     def get_next_client(self) -> OpenAI:
         """轮询获取下一个客户端（负载均衡）。"""
+        return self.clients[self._next_index()]
+
+    def _next_index(self) -> int:
         with self.lock:
-            client = self.clients[self.current_index]
+            index = self.current_index
             self.current_index = (self.current_index + 1) % self.num_clients
-            return client
+            return index
+
+    def _idlest_index(self) -> int:
+        """在途请求最少的实例（并列时按轮询位置）。"""
+        with self.lock:
+            start = self.current_index
+            return min(
+                range(self.num_clients),
+                key=lambda i: (self.busy[i], (i - start) % self.num_clients),
+            )
+
+    def idle_view(self) -> "_IdleBackendView":
+        """请求总是发往在途请求最少的实例的视图（供推测执行的副本使用，见 analyze/scheduling.py）。"""
+        return _IdleBackendView(self)
     
     def chat_completions_create(
         self,
@@ -54,16 +92,28 @@ class MultiVLLMClient:
     ):
         """模拟 OpenAI client 的 chat.completions.create 接口。
         
-        自动选择一个可用的 vLLM 实例进行调用。
+        自动选择一个可用的 vLLM 实例进行调用，并把实例 URL 报告给遥测（按 backend 统计延迟）。
         """
-        client = self.get_next_client()
-        return client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            **kwargs
-        )
+        return self._create(self._next_index(), model, messages, temperature, max_tokens, **kwargs)
+
+    def _create(self, index: int, model: str, messages: List[dict], temperature: float, max_tokens, **kwargs):
+        url = self.base_urls[index]
+        note_backend(url)
+        client = self.clients[index]
+        with self.lock:
+            self.busy[index] += 1
+        try:
+            with in_flight(url):
+                return client.chat.completions.create(
+                    model=self.model_name or model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **kwargs
+                )
+        finally:
+            with self.lock:
+                self.busy[index] -= 1
     
     @property
     def chat(self):
@@ -86,6 +136,29 @@ class MultiVLLMClient:
         return ChatProxy(self)
 
 
+class _IdleBackendView:
+    """MultiVLLMClient 的视图：每个请求发往当时在途请求最少的实例。"""
+
+    tracks_backend = True
+
+    def __init__(self, parent: MultiVLLMClient):
+        self.parent = parent
+        self.model_name = parent.model_name
+
+    def chat_completions_create(
+        self,
+        model: str,
+        messages: List[dict],
+        temperature: float = 0.8,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ):
+        parent = self.parent
+        return parent._create(parent._idlest_index(), model, messages, temperature, max_tokens, **kwargs)
+
+    chat = MultiVLLMClient.chat
+
+
 def create_multi_vllm_client(
     ports: List[int] = [8001, 8002, 8003, 8004],
     host: str = "localhost",
@@ -105,6 +178,79 @@ def create_multi_vllm_client(
     return MultiVLLMClient(base_urls, api_key)
 
 
+class ModelPool:
+    """提供同一模型的一组 vLLM 实例。
+
+    name 写入结果的 model 字段（per_task.jsonl），用于区分不同评审模型；
+    fraction < 1 时只评测按 task_id 稳定抽样的那部分任务（重跑时抽中的任务不变）。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_urls: List[str],
+        model: Optional[str] = None,
+        *,
+        fraction: float = 1.0,
+        api_key: str = "EMPTY",
+    ):
+        from .llm_runner import MODEL_PATH
+
+        if not 0.0 < fraction <= 1.0:
+            raise ValueError(f"模型池 {name} 的 fraction 需在 (0, 1] 内: {fraction}")
+        self.name = name
+        self.model = model or MODEL_PATH
+        self.fraction = fraction
+        self.client = MultiVLLMClient(base_urls, api_key, model=self.model)
+
+    def accepts(self, task_id: str) -> bool:
+        """该任务是否路由到本模型池。"""
+        if self.fraction >= 1.0:
+            return True
+        return zlib.crc32(f"{self.name}:{task_id}".encode("utf-8")) < self.fraction * 2 ** 32
+
+    def __repr__(self) -> str:
+        return f"ModelPool({self.name!r}, model={self.model!r}, backends={len(self.client.base_urls)}, fraction={self.fraction})"
+
+
+def parse_model_pools(spec: str, api_key: str = "EMPTY") -> List[ModelPool]:
+    """解析模型池配置：多个池以 ";" 分隔，每个池为 name=模型路径@url1,url2[#抽样比例]。
+
+    例如:
+        qwen30b=/var/shared/models/Qwen3-30B-A3B-Instruct-2507@http://localhost:8001/v1,http://localhost:8002/v1;
+        qwen7b=/var/shared/models/Qwen2.5-7B-Instruct@http://localhost:8003/v1#0.2
+    """
+    pools: List[ModelPool] = []
+    for part in spec.split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, rest = part.partition("=")
+        model, sep2, urls = rest.partition("@")
+        if not sep or not sep2 or not name.strip():
+            raise ValueError(f"无法解析模型池配置: {part}（格式 name=模型路径@url1,url2[#比例]）")
+        urls, _, fraction = urls.partition("#")
+        pools.append(
+            ModelPool(
+                name.strip(),
+                [u.strip() for u in urls.split(",") if u.strip()],
+                model.strip() or None,
+                fraction=float(fraction) if fraction.strip() else 1.0,
+                api_key=api_key,
+            )
+        )
+    names = [p.name for p in pools]
+    if len(set(names)) != len(names):
+        raise ValueError(f"模型池名称重复: {names}")
+    return pools
+
+
+def get_model_pools_from_env() -> List[ModelPool]:
+    """从环境变量 MODEL_POOLS 读取模型池（格式见 parse_model_pools）；未设置时返回空列表。"""
+    spec = os.environ.get("MODEL_POOLS", "").strip()
+    return parse_model_pools(spec) if spec else []
+
+
 def get_vllm_urls_from_env() -> List[str]:
     """从环境变量读取 vLLM URL 列表。
     
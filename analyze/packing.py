@@ -0,0 +1,172 @@
+"""请求尺寸调整：小任务打包、超长任务拆分。
+
+打包：每个请求都携带约 1.5k token 的固定说明；短任务单独发送时这部分开销占比很高。
+打包模式按估算 token 数做装箱（First-Fit Decreasing），单个请求的
+（说明 + 所有任务数据 + 预计输出）不超过预算；响应按 task_id 拆回各任务的结果，
+校验失败的任务由调用方回退为单任务请求。
+
+拆分：good_code 与多个 bad_code 都很长时，单个请求会超出 vLLM 的上下文
+（start_vllm.sh 中 --max-model-len 8192）。此时按 bad_code 拆成多个子请求，
+各自只含一个 bad，结果再合并为一个任务级输出。
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from .llm_runner import parse_model_response
+from .prompting import _INSTRUCTION, _OUTPUT_SCHEMA, _format_task_input, estimate_tokens
+from .schemas import TaskInput
+
+
+# 每个 bad 的预计输出 token 数（9 维评分 + 关键词 + 模式），用于为响应预留上下文
+OUTPUT_TOKENS_PER_BAD = 600
+
+# vLLM 上下文长度（与 start_vllm.sh 的 --max-model-len 一致）
+MAX_CONTEXT_TOKENS = 8192
+
+_OVERHEAD_TOKENS = estimate_tokens(_INSTRUCTION) + estimate_tokens(_OUTPUT_SCHEMA)
+
+
+def estimate_task_cost(task: TaskInput, output_tokens_per_bad: int = OUTPUT_TOKENS_PER_BAD) -> int:
+    """估算单个任务在请求中占用的 token 数（不含固定说明）：输入数据 + 预计输出。"""
+    return estimate_tokens(_format_task_input(task)) + max(1, len(task.bad_codes)) * output_tokens_per_bad
+
+
+def pack_tasks(
+    tasks: List[TaskInput],
+    budget_tokens: int,
+    *,
+    max_tasks_per_pack: int = 8,
+    output_tokens_per_bad: int = OUTPUT_TOKENS_PER_BAD,
+) -> List[List[TaskInput]]:
+    """按 token 预算将任务装箱，返回任务分组（单元素分组即单任务请求）。
+
+    采用 First-Fit Decreasing：按代价降序依次放入第一个装得下的箱子。
+    单个任务即超出预算时独立成组（由单任务路径处理）。分组内保持任务的输入顺序。
+    """
+    capacity = budget_tokens - _OVERHEAD_TOKENS
+    order = {id(t): i for i, t in enumerate(tasks)}
+    costed = sorted(((estimate_task_cost(t, output_tokens_per_bad), t) for t in tasks), key=lambda ct: -ct[0])
+
+    bins: List[List[TaskInput]] = []
+    loads: List[int] = []
+    for cost, task in costed:
+        if cost > capacity:
+            bins.append([task])
+            loads.append(capacity)
+            continue
+        for i, load in enumerate(loads):
+            if load + cost <= capacity and len(bins[i]) < max_tasks_per_pack:
+                bins[i].append(task)
+                loads[i] += cost
+                break
+        else:
+            bins.append([task])
+            loads.append(cost)
+
+    for b in bins:
+        b.sort(key=lambda t: order[id(t)])
+    bins.sort(key=lambda b: order[id(b[0])])
+    return bins
+
+
+def is_valid_task_output(out: object, task: TaskInput) -> bool:
+    """校验单任务结果：task_id 一致，且 per_bad_comparisons 覆盖该任务的全部 bad_id。"""
+    if not isinstance(out, dict) or str(out.get("task_id", "")) != str(task.task_id):
+        return False
+    cmps = out.get("per_bad_comparisons")
+    if not isinstance(cmps, list):
+        return False
+    got = {str(c.get("bad_id", "")) for c in cmps if isinstance(c, dict)}
+    return {b.bad_id for b in task.bad_codes} <= got
+
+
+def demux_packed_response(raw: str, tasks: List[TaskInput]) -> Dict[str, Optional[dict]]:
+    """将打包响应拆回各任务结果：task_id -> 结果 dict（缺失或校验失败为 None）。"""
+    try:
+        data = parse_model_response(raw)
+    except Exception:
+        return {t.task_id: None for t in tasks}
+    return demux_packed_data(data, tasks)
+
+
+def demux_packed_data(data: object, tasks: List[TaskInput]) -> Dict[str, Optional[dict]]:
+    """同 demux_packed_response，输入为已解析的响应对象（call_model_result 的 data）。"""
+    out: Dict[str, Optional[dict]] = {t.task_id: None for t in tasks}
+    results = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(results, list):
+        return out
+    by_id = {str(r.get("task_id", "")): r for r in results if isinstance(r, dict)}
+    for t in tasks:
+        r = by_id.get(str(t.task_id))
+        if r is not None and is_valid_task_output(r, t):
+            out[t.task_id] = r
+    return out
+
+
+def needs_split(
+    task: TaskInput,
+    context_tokens: int = MAX_CONTEXT_TOKENS,
+    output_tokens_per_bad: int = OUTPUT_TOKENS_PER_BAD,
+) -> bool:
+    """任务的单请求估算（说明 + 数据 + 预计输出）超出上下文且含多个 bad 时需要拆分。"""
+    if len(task.bad_codes) <= 1:
+        return False
+    return _OVERHEAD_TOKENS + estimate_task_cost(task, output_tokens_per_bad) > context_tokens
+
+
+def split_task(task: TaskInput) -> List[TaskInput]:
+    """按 bad_code 拆分为多个子任务（沿用原 task_id，每个子任务只含一个 bad）。"""
+    return [
+        TaskInput(
+            task_id=task.task_id,
+            language=task.language,
+            prompt=task.prompt,
+            good_code=task.good_code,
+            bad_codes=[b],
+            priority=task.priority,
+        )
+        for b in task.bad_codes
+    ]
+
+
+def _merge_uncertainty(parts: List[dict]) -> dict:
+    dims = parts[0].get("dimension_variance", {}).keys()
+
+    def _mean(key: str, dim: str) -> float:
+        return round(sum(p.get(key, {}).get(dim, 0.0) for p in parts) / len(parts), 6)
+
+    return {
+        "samples": min(int(p.get("samples", 0)) for p in parts),
+        "dimension_variance": {d: _mean("dimension_variance", d) for d in dims},
+        "dimension_entropy": {d: _mean("dimension_entropy", d) for d in dims},
+        "score": round(sum(float(p.get("score", 0.0)) for p in parts) / len(parts), 6),
+    }
+
+
+def merge_split_outputs(task: TaskInput, outputs: List[Optional[dict]]) -> Optional[dict]:
+    """合并各子请求结果（与 task.bad_codes 顺序对齐，失败的子请求为 None）。
+
+    - per_bad_comparisons 按 bad 顺序拼接；
+    - positive_patterns 去重合并（保持首次出现顺序）；
+    - prompt_brief 取首个成功子结果；
+    - 子结果带 uncertainty 时取各维度均值。
+    全部失败时返回 None。
+    """
+    ok = [o for o in outputs if isinstance(o, dict)]
+    if not ok:
+        return None
+    merged = dict(ok[0])
+    merged["task_id"] = task.task_id
+    merged["per_bad_comparisons"] = [c for o in ok for c in (o.get("per_bad_comparisons") or [])]
+    patterns: List[str] = []
+    for o in ok:
+        for pat in o.get("positive_patterns") or []:
+            if pat not in patterns:
+                patterns.append(pat)
+    merged["positive_patterns"] = patterns
+    uncs = [o["uncertainty"] for o in ok if o.get("uncertainty")]
+    if uncs:
+        merged["uncertainty"] = _merge_uncertainty(uncs)
+    return merged
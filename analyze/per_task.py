@@ -2,46 +2,175 @@
 
 from __future__ import annotations
 
-from typing import Iterable, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Iterable, List
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import time
 
 from .schemas import ModelOutput, TaskInput
-from .prompting import build_1vN_prompt
-from .llm_runner import call_model, parse_model_response
+from .prompting import PACKED_TEMPLATE, SINGLE_TEMPLATE, PromptTemplate, build_1vN_prompt, build_packed_prompt
+from .llm_runner import call_model_result, call_model_samples_result
+from .packing import (
+    MAX_CONTEXT_TOKENS,
+    demux_packed_data,
+    merge_split_outputs,
+    needs_split,
+    pack_tasks,
+    split_task,
+)
+from .scheduling import TaskScheduler
+from .telemetry import get_telemetry, set_queue_wait
+from .uncertainty import samples_agree, score_uncertainty
 
-try:
-    from tqdm import tqdm
-    HAS_TQDM = True
-except ImportError:
-    HAS_TQDM = False
-    print("[提示] 未安装 tqdm，将不显示进度条。安装命令: pip install tqdm")
+if TYPE_CHECKING:
+    from .multi_vllm import ModelPool
 
+_TQDM = None
 
-def analyze_task(task: TaskInput, model) -> ModelOutput | None:
+
+def _load_tqdm():
+    """首次显示进度时才导入 tqdm；未安装时提示一次并返回 None。"""
+    global _TQDM
+    if _TQDM is None:
+        try:
+            from tqdm import tqdm
+            _TQDM = tqdm
+        except ImportError:
+            _TQDM = False
+            print("[提示] 未安装 tqdm，将不显示进度条。安装命令: pip install tqdm")
+    return _TQDM or None
+
+
+def analyze_task(
+    task: TaskInput,
+    model,
+    *,
+    num_samples: int = 1,
+    sample_fan_out: bool = False,
+    agree_tol: float = 1.0,
+    context_tokens: int | None = MAX_CONTEXT_TOKENS,
+) -> ModelOutput | None:
     """对单个任务执行一次性 1vN 分析（通过 LLM）。
 
     步骤：
     - 由 TaskInput 构造 Prompt；
     - 调用模型一次；
     - 解析响应为 ModelOutput。
+
+    num_samples > 1 时启用多次采样的不确定性模式：先采样 2 次，若各 (bad, 维度) 的
+    Δ 极差均不超过 agree_tol 则提前停止，否则补足到 num_samples 次；结果为首个有效
+    采样，并附带 uncertainty 字段（见 analyze/uncertainty.py）。
+    sample_fan_out 为 True 时每次采样独立请求（可分散到多个 vLLM 实例），否则使用 n=k 请求。
+
+    若估算的请求长度超出 context_tokens（None 表示不检查），则按 bad_code 拆成多个子请求
+    并发调用（MultiVLLMClient 会将其轮询到不同实例），再合并为一个结果。
+
+    结果附带输入任务的 language 字段，供按语言分组聚合；prompt_template 字段记录生成该结果的
+    Prompt 模板版本（见 analyze/prompting.py 的 PromptTemplate.version）。
     
     Returns:
         ModelOutput 或 None（如果调用失败或无法解析）
 
     """
+    if context_tokens and needs_split(task, context_tokens):
+        merged = _analyze_task_split(
+            task,
+            model,
+            partial(analyze_task, num_samples=num_samples, sample_fan_out=sample_fan_out, agree_tol=agree_tol, context_tokens=None),
+        )
+        return _attach_language(merged, task)
     prompt = build_1vN_prompt(task)
-    raw = call_model(prompt, model=model)
+    if num_samples > 1:
+        out = _analyze_task_sampled(task, prompt, model, num_samples, sample_fan_out, agree_tol)
+        return _tag_template(_attach_language(out, task), SINGLE_TEMPLATE)
+    result = call_model_result(prompt, model=model)
     
     # 如果调用失败（返回 None），直接返回 None
-    if raw is None:
+    if result is None:
         print(f"[跳过] 任务 {getattr(task, 'task_id', 'unknown')} - 无法获得有效响应")
         return None
     
-    try:
-        return parse_model_response(raw)
-    except Exception as e:
-        print(f"[错误] 任务 {getattr(task, 'task_id', 'unknown')} - 解析响应失败: {e}")
+    # 调用层已完成校验与解析，直接使用解析结果
+    return _tag_template(_attach_language(result.data, task), SINGLE_TEMPLATE)
+
+
+def _attach_language(out: ModelOutput | None, task: TaskInput) -> ModelOutput | None:
+    """将输入任务的语言写入结果（模型输出不含该字段），供按语言分组聚合。"""
+    if isinstance(out, dict) and getattr(task, "language", None):
+        out["language"] = task.language
+    return out
+
+
+def _tag_template(out: ModelOutput | None, template: PromptTemplate) -> ModelOutput | None:
+    """记录生成结果的 Prompt 模板版本，换模板后的结果可与旧结果区分。"""
+    if isinstance(out, dict):
+        out["prompt_template"] = template.version
+    return out
+
+
+def _analyze_task_split(task: TaskInput, model, sub_fn) -> ModelOutput | None:
+    """超长任务：每个 bad 一个子请求并发执行，合并结果。"""
+    subtasks = split_task(task)
+    print(f"[提示] 任务 {task.task_id} 超出上下文预算，拆分为 {len(subtasks)} 个子请求")
+    with ThreadPoolExecutor(max_workers=len(subtasks)) as executor:
+        outputs = list(executor.map(lambda t: sub_fn(t, model=model), subtasks))
+    failed = [t.bad_codes[0].bad_id for t, o in zip(subtasks, outputs) if o is None]
+    merged = merge_split_outputs(task, outputs)
+    if merged is None:
+        print(f"[跳过] 任务 {task.task_id} - 所有子请求均失败")
+    elif failed:
+        print(f"[警告] 任务 {task.task_id} - 子请求 {failed} 失败，结果仅包含其余 bad")
+    return merged
+
+
+def _analyze_task_sampled(
+    task: TaskInput,
+    prompt: str,
+    model,
+    num_samples: int,
+    fan_out: bool,
+    agree_tol: float,
+) -> ModelOutput | None:
+    """多次采样分析单个任务，自适应提前停止，并附加不确定性统计。"""
+    task_id = getattr(task, 'task_id', 'unknown')
+
+    def _draw(n: int) -> List[dict]:
+        return [r.data for r in call_model_samples_result(prompt, model=model, n=n, fan_out=fan_out)]
+
+    outputs = _draw(min(2, num_samples))
+    if len(outputs) < num_samples and not (len(outputs) >= 2 and samples_agree(outputs, tol=agree_tol)):
+        outputs += _draw(num_samples - len(outputs))
+
+    if not outputs:
+        print(f"[跳过] 任务 {task_id} - 无法获得有效响应")
         return None
+    result = outputs[0]
+    result["uncertainty"] = score_uncertainty(outputs)
+    return result
+
+
+def analyze_pack(tasks: List[TaskInput], model, task_fn=analyze_task) -> List[ModelOutput | None]:
+    """以一次打包请求分析多个小任务，返回与 tasks 对齐的结果列表。
+
+    打包响应按 task_id 拆回各任务；缺失或未通过校验的任务回退为单任务请求（task_fn）。
+    """
+    if len(tasks) == 1:
+        return [task_fn(tasks[0], model=model)]
+
+    ids = ", ".join(t.task_id for t in tasks)
+    result = call_model_result(build_packed_prompt(tasks), model=model)
+    by_id = demux_packed_data(result.data, tasks) if result is not None else {}
+    results: List[ModelOutput | None] = []
+    fallback = 0
+    for t in tasks:
+        r = _tag_template(_attach_language(by_id.get(t.task_id), t), PACKED_TEMPLATE)
+        if r is None:
+            fallback += 1
+            r = task_fn(t, model=model)
+        results.append(r)
+    if fallback:
+        print(f"[提示] 打包请求 [{ids}] 中 {fallback}/{len(tasks)} 个任务未通过校验，已回退为单任务请求")
+    return results
 
 
 def analyze_tasks(
@@ -49,7 +178,13 @@ def analyze_tasks(
     model: str = "vllm", 
     show_progress: bool = True,
     use_concurrent: bool = True,
-    max_workers: int = 4
+    max_workers: int = 4,
+    num_samples: int = 1,
+    sample_fan_out: bool = False,
+    pack_budget_tokens: int | None = None,
+    context_tokens: int | None = MAX_CONTEXT_TOKENS,
+    order: str = "sjf",
+    speculate_quantile: float | None = None,
 ) -> List[ModelOutput]:
     """批量分析任务，将 TaskInput 序列映射为 ModelOutput 列表。
     
@@ -61,6 +196,15 @@ def analyze_tasks(
         show_progress: 是否显示进度条（需要安装 tqdm）
         use_concurrent: 是否使用并发处理（多线程）
         max_workers: 最大并发线程数（建议与 vLLM 实例数相同）
+        num_samples: 每个任务的最大采样次数（>1 时启用不确定性模式，见 analyze_task）
+        sample_fan_out: 多次采样时是否拆分为独立请求分散到多个实例
+        pack_budget_tokens: 设置后启用打包模式，将小任务按该 token 预算装箱到同一请求
+            （仅在 num_samples == 1 时生效，见 analyze/packing.py）
+        context_tokens: 模型上下文长度；超出的多 bad 任务按 bad 拆分为并发子请求（None 关闭）
+        order: 并发模式的派发顺序：优先级（TaskInput.priority）高的先派发，同优先级内
+            sjf 短任务优先（默认）/ lpt 长任务优先 / fifo 输入顺序（见 analyze/scheduling.py）
+        speculate_quantile: 推测执行的阈值分位数；并发模式下耗时明显超过预计（按已完成任务拟合）、
+            且决定总耗时的慢请求再派发一份副本到空闲实例，先完成的生效（默认 None 关闭：副本会重复占用后端且无法取消）
     
     Returns:
         成功分析的任务结果列表
@@ -68,49 +212,133 @@ def analyze_tasks(
     # 转换为列表以获取总数
     tasks_list = list(tasks)
     total = len(tasks_list)
+    task_fn = partial(
+        analyze_task,
+        num_samples=num_samples,
+        sample_fan_out=sample_fan_out,
+        context_tokens=context_tokens,
+    )
+
+    units = tasks_list
+    if pack_budget_tokens and num_samples <= 1:
+        units = pack_tasks(tasks_list, pack_budget_tokens)
+        print(f"打包模式: {total} 个任务装入 {len(units)} 个请求（预算 {pack_budget_tokens} tokens）")
+        task_fn = partial(analyze_pack, task_fn=task_fn)
     
     if use_concurrent:
-        return _analyze_tasks_concurrent(tasks_list, model, show_progress, max_workers)
+        return _analyze_tasks_concurrent(
+            units,
+            model,
+            show_progress,
+            max_workers,
+            task_fn=task_fn,
+            order=order,
+            speculate_quantile=speculate_quantile,
+        )
     else:
-        return _analyze_tasks_sequential(tasks_list, model, show_progress)
+        return _analyze_tasks_sequential(units, model, show_progress, task_fn=task_fn)
+
+
+def analyze_tasks_routed(
+    tasks: Iterable[TaskInput],
+    pools: List["ModelPool"],
+    *,
+    show_progress: bool = True,
+    use_concurrent: bool = True,
+    max_workers: int = 4,
+    **kwargs,
+) -> List[ModelOutput]:
+    """把同一批任务路由到一个或多个模型池（A/B 评测），结果带 model 字段（模型池名称）。
+
+    任务只读取一次；各模型池同时运行，每个池各用 max_workers 个线程（见 analyze_tasks），
+    池内按 ModelPool.accepts 选择任务。其余参数同 analyze_tasks。
+
+    Returns:
+        各模型池成功分析的结果，按模型池顺序拼接
+    """
+    tasks_list = list(tasks)
+
+    def _run(pool) -> List[ModelOutput]:
+        selected = [t for t in tasks_list if pool.accepts(t.task_id)]
+        print(f"模型池 {pool.name}（{pool.model}）: {len(selected)}/{len(tasks_list)} 个任务")
+        outs = analyze_tasks(
+            selected,
+            model=pool.client,
+            # 多个进度条并行刷新会互相覆盖，只在单模型池时显示
+            show_progress=show_progress and len(pools) == 1,
+            use_concurrent=use_concurrent,
+            max_workers=max_workers,
+            **kwargs,
+        )
+        for out in outs:
+            if isinstance(out, dict):
+                out["model"] = pool.name
+        return outs
+
+    if len(pools) == 1:
+        return _run(pools[0])
+    with ThreadPoolExecutor(max_workers=len(pools)) as executor:
+        per_pool = list(executor.map(_run, pools))
+    return [out for outs in per_pool for out in outs]
+
+
+def _unit_size(unit) -> int:
+    """工作单元包含的任务数（打包模式下单元为任务列表）。"""
+    return len(unit) if isinstance(unit, list) else 1
+
+
+def _unit_ids(unit) -> str:
+    if isinstance(unit, list):
+        return ", ".join(getattr(t, 'task_id', 'unknown') for t in unit)
+    return getattr(unit, 'task_id', 'unknown')
 
 
 def _analyze_tasks_sequential(
     tasks_list: List[TaskInput],
     model,
-    show_progress: bool
+    show_progress: bool,
+    task_fn=analyze_task,
 ) -> List[ModelOutput]:
     """串行处理任务（原实现）。"""
-    total = len(tasks_list)
+    total = sum(_unit_size(u) for u in tasks_list)
     results = []
     success_count = 0
     failed_count = 0
+    tqdm = _load_tqdm()
+    has_tqdm = tqdm is not None
     
     # 创建进度条（如果可用）
-    if HAS_TQDM and show_progress:
-        iterator = tqdm(tasks_list, desc="分析任务 [串行]", unit="任务", ncols=100)
+    if has_tqdm and show_progress:
+        pbar = tqdm(total=total, desc="分析任务 [串行]", unit="任务", ncols=100)
     else:
-        iterator = tasks_list
         print(f"开始串行分析 {total} 个任务...")
     
-    for i, t in enumerate(iterator, 1):
-        result = analyze_task(t, model=model)
+    for t in tasks_list:
+        result = task_fn(t, model=model)
+        outs = result if isinstance(result, list) else [result]
         
-        if result is not None:
-            results.append(result)
-            success_count += 1
-        else:
-            failed_count += 1
+        for r in outs:
+            if r is not None:
+                results.append(r)
+                success_count += 1
+            else:
+                failed_count += 1
+        _count_tasks(outs)
         
         # 更新进度条描述
-        if HAS_TQDM and show_progress:
-            iterator.set_postfix({
+        completed = success_count + failed_count
+        if has_tqdm and show_progress:
+            pbar.update(len(outs))
+            pbar.set_postfix({
                 '成功': success_count,
                 '失败': failed_count
             })
-        elif not HAS_TQDM and i % 10 == 0:
+        elif not has_tqdm and completed // 10 > (completed - len(outs)) // 10:
             # 没有 tqdm 时，每 10 个任务打印一次进度
-            print(f"进度: {i}/{total} ({i*100//total}%) - 成功: {success_count}, 失败: {failed_count}")
+            print(f"进度: {completed}/{total} ({completed*100//total}%) - 成功: {success_count}, 失败: {failed_count}")
+    
+    if has_tqdm and show_progress:
+        pbar.close()
     
     # 最终统计
     print(f"\n任务分析完成！总计: {total}, 成功: {success_count}, 失败: {failed_count}")
@@ -118,69 +346,90 @@ def _analyze_tasks_sequential(
     return results
 
 
+def _count_tasks(outs) -> None:
+    """任务完成 / 失败计数（供 /metrics 端点）。"""
+    ok = sum(1 for r in outs if r is not None)
+    registry = get_telemetry().registry
+    if ok:
+        registry.inc("pipeline_tasks_total", ok, status="ok")
+    if len(outs) - ok:
+        registry.inc("pipeline_tasks_total", len(outs) - ok, status="failed")
+
+
+def _run_queued(task_fn, submitted_at: float, task, model):
+    set_queue_wait(time.perf_counter() - submitted_at)
+    try:
+        return task_fn(task, model)
+    finally:
+        set_queue_wait(None)
+
+
 def _analyze_tasks_concurrent(
     tasks_list: List[TaskInput],
     model,
     show_progress: bool,
-    max_workers: int
+    max_workers: int,
+    task_fn=analyze_task,
+    order: str = "sjf",
+    speculate_quantile: float | None = None,
 ) -> List[ModelOutput]:
     """并发处理任务（使用线程池）。
     
-    真正的并发：同时向多个 vLLM 实例发送请求。
+    真正的并发：同时向多个 vLLM 实例发送请求。派发顺序与慢请求的推测执行由
+    TaskScheduler 负责（见 analyze/scheduling.py）。
     """
-    total = len(tasks_list)
+    total = sum(_unit_size(u) for u in tasks_list)
     results = []
     success_count = 0
     failed_count = 0
+    tqdm = _load_tqdm()
+    has_tqdm = tqdm is not None
     
     print(f"开始并发分析 {total} 个任务（并发数: {max_workers}）...")
     
-    # 使用线程池并发处理
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有任务
-        future_to_task = {
-            executor.submit(analyze_task, task, model): task
-            for task in tasks_list
-        }
-        
-        # 创建进度条
-        if HAS_TQDM and show_progress:
-            pbar = tqdm(total=total, desc="分析任务 [并发]", unit="任务", ncols=100)
-        
-        # 按完成顺序收集结果
-        for future in as_completed(future_to_task):
-            task = future_to_task[future]
+    scheduler = TaskScheduler(max_workers, order=order, speculate_quantile=speculate_quantile)
+    # 创建进度条
+    if has_tqdm and show_progress:
+        pbar = tqdm(total=total, desc="分析任务 [并发]", unit="任务", ncols=100)
+    
+    # 按完成顺序收集结果（调度开始时刻随任务传入，工作线程开始执行时记录排队时间）
+    for task, future in scheduler.run(tasks_list, model, partial(_run_queued, task_fn)):
+        size = _unit_size(task)
+        try:
+            result = future.result()
+            outs = result if isinstance(result, list) else [result]
             
-            try:
-                result = future.result()
-                
-                if result is not None:
-                    results.append(result)
+            for r in outs:
+                if r is not None:
+                    results.append(r)
                     success_count += 1
                 else:
                     failed_count += 1
-                
-            except Exception as e:
-                task_id = getattr(task, 'task_id', 'unknown')
-                print(f"\n[错误] 任务 {task_id} 处理异常: {e}")
-                failed_count += 1
+            _count_tasks(outs)
             
-            # 更新进度条
-            if HAS_TQDM and show_progress:
-                pbar.update(1)
-                pbar.set_postfix({
-                    '成功': success_count,
-                    '失败': failed_count
-                })
-            elif not HAS_TQDM and (success_count + failed_count) % 10 == 0:
-                completed = success_count + failed_count
-                print(f"进度: {completed}/{total} ({completed*100//total}%) - 成功: {success_count}, 失败: {failed_count}")
+        except Exception as e:
+            print(f"\n[错误] 任务 {_unit_ids(task)} 处理异常: {e}")
+            failed_count += size
+            _count_tasks([None] * size)
         
-        if HAS_TQDM and show_progress:
-            pbar.close()
+        # 更新进度条
+        completed = success_count + failed_count
+        if has_tqdm and show_progress:
+            pbar.update(size)
+            pbar.set_postfix({
+                '成功': success_count,
+                '失败': failed_count
+            })
+        elif not has_tqdm and completed // 10 > (completed - size) // 10:
+            print(f"进度: {completed}/{total} ({completed*100//total}%) - 成功: {success_count}, 失败: {failed_count}")
+    
+    if has_tqdm and show_progress:
+        pbar.close()
     
     # 最终统计
     print(f"\n任务分析完成！总计: {total}, 成功: {success_count}, 失败: {failed_count}")
     print(f"并发性能: 使用 {max_workers} 个线程并发处理")
+    if scheduler.speculated:
+        print(f"推测执行: 派发 {scheduler.speculated} 个副本，其中 {scheduler.speculative_wins} 个先于原请求完成")
     
     return results
@@ -0,0 +1,308 @@
+"""关键词 / 模式短语的规范化与近义合并。
+
+模型输出的短语存在大量写法差异，例如 "异常处理（try-except）" 与 "异常处理(try/except)"，
+按原文聚合会把同一概念拆成多行。本模块提供：
+- canonical_key：全角/半角折叠（NFKC）、大小写折叠、去标点与空白，并抽取括号内的英文别名；
+- PhraseCanonicalizer：在规范化键之上按字符 n-gram 的 Jaccard 相似度聚类。
+  括号别名不同（"集合（list）" 与 "集合（set）"）或仅差否定前缀（"未校验输入" 与 "校验输入"）的短语不合并；
+  候选对由倒排索引 + 前缀过滤（prefix filtering）产生，不做 O(n²) 两两比较；
+  合并表可缓存到 JSON 文件，下次运行只需为新出现的短语找簇，已有簇的代表短语保持不变。
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Set, Tuple
+import json
+import math
+import os
+import unicodedata
+
+
+# 成对括号（NFKC 后全角括号已折叠为半角）
+_BRACKETS = {"(": ")", "[": "]", "{": "}", "【": "】", "〔": "〕", "「": "」", "『": "』", "《": "》", "<": ">"}
+_CLOSERS = set(_BRACKETS.values())
+
+# 否定前缀：仅差一个否定前缀的两个短语含义相反，不能合并（长的在前，优先匹配）
+_NEGATION_PREFIXES = (
+    "没有", "缺少", "缺乏", "未", "不", "没", "无", "非",
+    "missing", "lackof", "non", "not", "no",
+)
+
+# 别名合并的最短长度（过短的英文缩写如 "io" 容易误合并）
+_MIN_ALIAS_LEN = 3
+
+_CACHE_VERSION = 2
+
+
+def _strip_punct(s: str) -> str:
+    """仅保留字母、数字与汉字（Unicode 意义上的 alnum），去掉标点、符号与空白。"""
+    return "".join(ch for ch in s if ch.isalnum())
+
+
+def _split_brackets(s: str) -> Tuple[str, List[str]]:
+    """拆出最外层括号：内容为纯 ASCII 的作为别名（可含嵌套括号，如 "O(n^2)"），其余保留在主体中。"""
+    main: List[str] = []
+    aliases: List[str] = []
+    i = 0
+    while i < len(s):
+        ch = s[i]
+        if ch not in _BRACKETS:
+            main.append(ch)
+            i += 1
+            continue
+        depth, j = 0, i
+        while j < len(s):
+            if s[j] in _BRACKETS:
+                depth += 1
+            elif s[j] in _CLOSERS:
+                depth -= 1
+                if depth == 0:
+                    break
+            j += 1
+        if j >= len(s):  # 括号不配对，按普通字符处理
+            main.append(ch)
+            i += 1
+            continue
+        inner = s[i + 1:j]
+        if inner.isascii():
+            alias = _strip_punct(inner)
+            if alias:
+                aliases.append(alias)
+            main.append(" ")
+        else:
+            main.append(s[i:j + 1])
+        i = j + 1
+    return "".join(main), aliases
+
+
+def canonical_key(phrase: str) -> Tuple[str, List[str]]:
+    """计算短语的规范化键与英文别名。
+
+    - NFKC 折叠全角/半角，英文转小写；
+    - 最外层括号内为纯 ASCII 的内容视为英文别名，以 "主体(别名)" 的形式保留在键中，
+      别名不同的短语（如 "日志（print）" 与 "日志（logging）"）键也不同；其余括号内容保留在主体中；
+    - 去掉标点与空白。
+    例如 "异常处理（Try-Except）" -> ("异常处理(tryexcept)", ["tryexcept"])。
+    主体为空（整个短语就是括号内容）时以第一个别名作为主体。
+    """
+    s = unicodedata.normalize("NFKC", phrase or "").lower()
+    main, aliases = _split_brackets(s)
+    main = _strip_punct(main)
+    if not main:
+        main = aliases.pop(0) if aliases else _strip_punct(s)
+    if aliases:
+        return f"{main}({'/'.join(aliases)})", aliases
+    return main, aliases
+
+
+def _key_main(key: str) -> str:
+    """规范化键的主体部分（去掉别名后缀；主体已去标点，不含括号）。"""
+    return key.split("(", 1)[0]
+
+
+def _is_negated(main: str) -> bool:
+    return main.startswith(_NEGATION_PREFIXES)
+
+
+def _ngrams(key: str, n: int) -> Set[str]:
+    if len(key) <= n:
+        return {key}
+    return {key[i:i + n] for i in range(len(key) - n + 1)}
+
+
+class PhraseCanonicalizer:
+    """短语近义合并：fit 收集短语并聚类，canonical 返回短语所属簇的代表写法。
+
+    Args:
+        threshold: 字符 n-gram Jaccard 相似度阈值（≥ 阈值的两个键合并为一簇）
+        ngram: n-gram 长度（中文短语用 2 较合适）
+        cache_path: 合并表缓存文件；参数不一致时忽略旧缓存
+    """
+
+    def __init__(self, threshold: float = 0.8, ngram: int = 2, cache_path: Optional[str] = None):
+        self.threshold = threshold
+        self.ngram = ngram
+        self.cache_path = cache_path
+        # 规范化键 -> 簇代表键
+        self.rep: Dict[str, str] = {}
+        # 规范化键 -> 展示用写法（出现次数最多的原文）
+        self.surface: Dict[str, str] = {}
+        # 规范化键 -> 累计出现次数（选择代表键用）
+        self.counts: Dict[str, float] = {}
+        self.aliases: Dict[str, List[str]] = {}
+        if cache_path:
+            self._load(cache_path)
+
+    # ----------------------------------------------------------------- 缓存
+    def _load(self, path: str) -> None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (
+            data.get("version") != _CACHE_VERSION
+            or data.get("threshold") != self.threshold
+            or data.get("ngram") != self.ngram
+        ):
+            print(f"[提示] 短语合并缓存参数不一致，将重新聚类: {path}")
+            return
+        self.rep = data.get("rep", {})
+        self.surface = data.get("surface", {})
+        self.counts = data.get("counts", {})
+        self.aliases = data.get("aliases", {})
+
+    def save(self, path: Optional[str] = None) -> Optional[str]:
+        """写出合并表缓存（原子替换），返回路径；未指定路径时不写。"""
+        path = path or self.cache_path
+        if not path:
+            return None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data = {
+            "version": _CACHE_VERSION,
+            "threshold": self.threshold,
+            "ngram": self.ngram,
+            "rep": self.rep,
+            "surface": self.surface,
+            "counts": self.counts,
+            "aliases": self.aliases,
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
+
+    # ----------------------------------------------------------------- 聚类
+    def fit(self, phrase_counts: Dict[str, float]) -> "PhraseCanonicalizer":
+        """加入一批短语（原文 -> 出现次数/权重）并更新合并表。
+
+        只有新出现的规范化键需要找候选：候选来自倒排索引（前缀过滤），已缓存键之间不再比较。
+        """
+        surface_votes: Dict[str, Dict[str, float]] = {}
+        for raw, cnt in phrase_counts.items():
+            raw = str(raw).strip()
+            if not raw:
+                continue
+            key, aliases = canonical_key(raw)
+            if not key:
+                continue
+            self.counts[key] = self.counts.get(key, 0.0) + float(cnt)
+            votes = surface_votes.setdefault(key, {})
+            votes[raw] = votes.get(raw, 0.0) + float(cnt)
+            if aliases:
+                self.aliases[key] = aliases
+
+        for key, votes in surface_votes.items():
+            if key not in self.surface:
+                self.surface[key] = max(votes.items(), key=lambda kv: (kv[1], -len(kv[0])))[0]
+
+        new_keys = [k for k in surface_votes if k not in self.rep]
+        if not new_keys:
+            return self
+
+        parent: Dict[str, str] = {}
+
+        def _find(x: str) -> str:
+            root = x
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while parent.get(x, x) != root:
+                parent[x], x = root, parent[x]
+            return root
+
+        # 簇根 -> (是否否定, 别名)；簇内别名一致或为空，否定与否一致，保证合并不会经由无别名的短语传递
+        traits: Dict[str, Tuple[bool, Tuple[str, ...]]] = {}
+
+        def _traits(key: str) -> Tuple[bool, Tuple[str, ...]]:
+            return _is_negated(_key_main(key)), tuple(self.aliases.get(key, ()))
+
+        def _union(a: str, b: str, check: bool = True) -> None:
+            ra, rb = _find(a), _find(b)
+            if ra == rb:
+                return
+            neg_a, alias_a = traits.get(ra) or _traits(ra)
+            neg_b, alias_b = traits.get(rb) or _traits(rb)
+            if check and (neg_a != neg_b or (alias_a and alias_b and alias_a != alias_b)):
+                return
+            parent[rb] = ra
+            traits[ra] = (neg_a, alias_a or alias_b)
+
+        # 已缓存的簇作为初始并查集
+        for key, rep in self.rep.items():
+            if key != rep:
+                _union(rep, key, check=False)
+        all_keys = list(self.rep.keys() | set(new_keys))
+        new_set = set(new_keys)
+
+        # 1) 别名：某个键恰好等于另一个短语的英文别名时合并（别名唯一对应一个键时才合并）
+        alias_owner: Dict[str, Set[str]] = {}
+        for key in all_keys:
+            for alias in self.aliases.get(key, []):
+                if len(alias) >= _MIN_ALIAS_LEN:
+                    alias_owner.setdefault(alias, set()).add(key)
+        for alias, owners in alias_owner.items():
+            if len(owners) == 1 and alias in self.counts:
+                (owner,) = owners
+                if alias in new_set or owner in new_set:
+                    _union(owner, alias)
+
+        # 2) n-gram Jaccard：全局 token 频率升序排序后，只索引每个键的前缀 token
+        # 只比较主体；别名与否定前缀由 _union 把关
+        grams = {k: _ngrams(_key_main(k), self.ngram) for k in all_keys}
+        df: Dict[str, int] = {}
+        for gs in grams.values():
+            for g in gs:
+                df[g] = df.get(g, 0) + 1
+        t = self.threshold
+
+        def _prefix(gs: Set[str]) -> List[str]:
+            ordered = sorted(gs, key=lambda g: (df[g], g))
+            p = len(ordered) - int(math.ceil(t * len(ordered))) + 1
+            return ordered[:max(1, p)]
+
+        index: Dict[str, List[str]] = {}
+        for key in all_keys:
+            for g in _prefix(grams[key]):
+                index.setdefault(g, []).append(key)
+
+        for x in new_keys:
+            gx = grams[x]
+            seen: Set[str] = set()
+            for g in _prefix(gx):
+                for y in index.get(g, ()):
+                    if y == x or y in seen:
+                        continue
+                    seen.add(y)
+                    gy = grams[y]
+                    # 长度过滤：|gy| 必须在 [t|gx|, |gx|/t] 内
+                    if len(gy) < t * len(gx) or len(gx) < t * len(gy):
+                        continue
+                    inter = len(gx & gy)
+                    if inter / (len(gx) + len(gy) - inter) >= t:
+                        _union(x, y)
+
+        # 3) 选择代表：簇内已有代表时沿用（多个则取次数最多者），否则取次数最多、较短的键
+        clusters: Dict[str, List[str]] = {}
+        for key in all_keys:
+            clusters.setdefault(_find(key), []).append(key)
+        for members in clusters.values():
+            old_reps = {self.rep[k] for k in members if k in self.rep}
+            pool = old_reps or set(members)
+            rep = min(pool, key=lambda k: (-self.counts.get(k, 0.0), len(k), k))
+            for k in members:
+                self.rep[k] = rep
+        return self
+
+    def canonical(self, phrase: str) -> str:
+        """返回短语所属簇代表的展示写法；未 fit 过的短语原样返回（去首尾空白）。"""
+        raw = str(phrase).strip()
+        key, _ = canonical_key(raw)
+        rep = self.rep.get(key)
+        if rep is None:
+            return raw
+        return self.surface.get(rep, raw)
+
+    def merge_map(self) -> Dict[str, str]:
+        """规范化键 -> 代表写法（仅含被合并到他人的键），便于人工检查。"""
+        return {k: self.surface.get(r, r) for k, r in self.rep.items() if k != r}
@@ -17,13 +17,18 @@
 from __future__ import annotations
 
 import os
+from functools import partial
 from typing import List
 
 from .io_utils import read_tasks_jsonl, write_jsonl, ensure_dir
-from .per_task import analyze_tasks
-from .aggregate import export_aggregates
+from .per_task import analyze_tasks, analyze_tasks_routed
+from .aggregate import _iter_jsonl, export_aggregates, export_grouped_aggregates
 from .visualize import plot_global_radar, plot_global_heatmaps, plot_pattern_wordcloud
-from .report import build_report_markdown
+from .report import build_report_markdown, build_report_html
+from .uncertainty import select_for_reannotation
+from .telemetry import configure_telemetry, start_metrics_server
+from .profiling import StageTimer
+from .compare import compare_runs
 
 
 def run_pipeline(
@@ -32,7 +37,30 @@ def run_pipeline(
     client = None,
     show_progress: bool = True,
     use_concurrent: bool = True,
-    max_workers: int = 4
+    max_workers: int = 4,
+    num_samples: int = 1,
+    sample_fan_out: bool = False,
+    reannotate_top_fraction: float = 0.05,
+    pack_budget_tokens: int | None = None,
+    context_tokens: int | None = 8192,
+    wordcloud_preview: bool = False,
+    report_format: str = "markdown",
+    grouped_aggregates: bool = False,
+    merge_phrases: bool = False,
+    phrase_merge_cache: str | None = None,
+    sketch_capacity: int | None = None,
+    bootstrap_resamples: int = 2000,
+    llm_metrics: bool = True,
+    measure_ttfb: bool = False,
+    metrics_port: int | None = None,
+    profile: str | None = None,
+    profile_stages: List[str] | None = None,
+    model_pools: list | None = None,
+    schedule_order: str = "sjf",
+    speculate_quantile: float | None = None,
+    job_queue: str | None = None,
+    job_batch_size: int = 32,
+    job_lease_s: float = 600.0,
 ) -> dict:
     """运行完整的 1vN 代码质量分析 Pipeline。
     
@@ -43,87 +71,250 @@ def run_pipeline(
         show_progress: 是否显示进度条
         use_concurrent: 是否使用并发处理（建议多实例时启用）
         max_workers: 最大并发线程数（建议与 vLLM 实例数相同）
+        num_samples: 每任务最大采样次数（>1 时启用不确定性模式并导出 reannotate.jsonl）
+        sample_fan_out: 多次采样时是否拆分为独立请求分散到多个实例
+        reannotate_top_fraction: 送去再标注的高不确定性任务比例
+        pack_budget_tokens: 设置后将小任务按该 token 预算打包进同一请求
+        context_tokens: 模型上下文长度（--max-model-len）；超长任务按 bad 拆分
+        wordcloud_preview: 词云使用低分辨率预览模式（报告草稿迭代用）
+        report_format: 报告格式 markdown / html / both；仅 html 时跳过 PNG 图表渲染
+        grouped_aggregates: 额外导出按语言 / 任务 ID 前缀分组的聚合（outputs/grouped/，分区 CSV + 可选 Parquet）
+        merge_phrases: 聚合关键词与模式时合并写法差异 / 近义短语（默认关闭，开启后关键词列为簇代表写法）
+        phrase_merge_cache: 短语合并表缓存路径（默认 {output_dir}/phrase_merge_cache.json）
+        sketch_capacity: 设置后关键词 / 模式改用近似计数（每类最多保留该数量的条目，附误差列）；None 为精确模式
+        bootstrap_resamples: 维度统计的 Bootstrap 重采样次数（置信区间与配对检验列），0 为关闭
+        llm_metrics: 记录每次 LLM 尝试的遥测到 {output_dir}/llm_metrics.jsonl，并打印各 backend 的延迟分位数与吞吐
+        measure_ttfb: 使用流式请求测量首 token 时间（需服务端支持 stream_options.include_usage）
+        metrics_port: 设置后在 127.0.0.1:{metrics_port}/metrics 提供 Prometheus 抓取端点（运行期间有效）
+        profile: 按阶段剖析（"cprofile" / "pyinstrument"），结果写入 {output_dir}/profiles/
+        profile_stages: 只剖析这些阶段（为空表示全部）；各阶段耗时总会写入 timings.json
+        model_pools: ModelPool 列表（见 analyze/multi_vllm.py），设置后忽略 client，同一批任务交给各模型池评测，
+            结果带 model 字段；多个池时各模型结果与聚合写入 {output_dir}/models/<名称>/，
+            评审一致性对比写入 {output_dir}/models/compare/，全局聚合、图表与报告基于第一个（主）模型池
+        schedule_order: 并发模式的派发顺序（优先级高的先派发，同优先级内 sjf（默认）/ lpt / fifo，见 analyze/scheduling.py）
+        speculate_quantile: 慢请求推测执行的阈值分位数（默认 None 关闭；如 0.5 开启）
+        job_queue: SQLite 任务队列路径（见 analyze/job_queue.py）。设置后输入按 job_batch_size 入队（队列已有
+            批次时沿用，不再读取输入），本进程作为 worker 与其他主机上的 worker 共同处理，
+            结果分片写入 {output_dir}/shards/，全部批次完成后合并为 per_task.jsonl 再继续后续步骤
+        job_batch_size: 入队时每批任务数
+        job_lease_s: 批次租约时长（秒），需明显长于处理一个批次的时间
     
     Returns:
         包含各输出文件路径的字典
     """
+    if report_format not in ("markdown", "html", "both"):
+        raise ValueError(f"未知的报告格式: {report_format}")
+
     print("=" * 60)
     print("🚀 开始运行 1vN 代码质量分析 Pipeline")
     print("=" * 60)
-    
-    # 1) 读取任务
-    print("\n📖 [步骤 1/6] 读取任务数据...")
-    tasks = read_tasks_jsonl(input_jsonl)
-    print(f"   ✓ 成功读取 {len(tasks)} 个任务")
-
-    # 2) 调用 LLM 分析每任务
-    print("\n🤖 [步骤 2/6] 调用 LLM 分析任务...")
-    if use_concurrent:
-        print(f"   使用并发模式（{max_workers} 个线程）")
-    results = analyze_tasks(
-        tasks, 
-        model=client, 
-        show_progress=show_progress,
-        use_concurrent=use_concurrent,
-        max_workers=max_workers
+
+    metrics_path = ""
+    if llm_metrics:
+        ensure_dir(output_dir)
+        metrics_path = os.path.join(output_dir, "llm_metrics.jsonl")
+        if os.path.exists(metrics_path):
+            os.remove(metrics_path)
+    telemetry = configure_telemetry(metrics_path or None, measure_ttfb=measure_ttfb)
+    metrics_server = start_metrics_server(metrics_port) if metrics_port else None
+    if metrics_server is not None:
+        print(f"📡 指标端点: {metrics_server.url}")
+    stages = StageTimer(
+        telemetry.registry,
+        profile=profile,
+        profile_dir=os.path.join(output_dir, "profiles"),
+        profile_stages=profile_stages,
     )
-    print(f"   ✓ 成功分析 {len(results)} 个任务")
-
-    # 3) 写 per_task.jsonl
-    print("\n💾 [步骤 3/6] 保存任务分析结果...")
-    ensure_dir(output_dir)
-    per_task_path = os.path.join(output_dir, "per_task.jsonl")
-    write_jsonl(per_task_path, results)
-    print(f"   ✓ 已保存到: {per_task_path}")
-
-    # 4) 聚合导出 CSV
-    print("\n📊 [步骤 4/6] 聚合统计数据...")
-    dim_csv = os.path.join(output_dir, "agg_dimension.csv")
-    kw_csv = os.path.join(output_dir, "agg_keywords.csv")
-    dim_csv, kw_csv, pos_patterns_csv, anti_patterns_csv = export_aggregates(per_task_path, dim_csv, kw_csv)
-    print(f"   ✓ 维度统计: {dim_csv}")
-    print(f"   ✓ 关键词统计: {kw_csv}")
-    print(f"   ✓ 好代码模式: {pos_patterns_csv}")
-    print(f"   ✓ 坏代码模式: {anti_patterns_csv}")
-
-    # 5) 生成全局图表
-    print("\n📈 [步骤 5/6] 生成可视化图表...")
-    figs_dir = os.path.join(output_dir, "figs")
-    ensure_dir(figs_dir)
-    
-    radar_path = os.path.join(figs_dir, "global_radar.png")
-    plot_global_radar(dim_csv, radar_path)
-    print(f"   ✓ 雷达图: {radar_path}")
-    
-    heatmap_path = plot_global_heatmaps(dim_csv, figs_dir)
-    print(f"   ✓ 热力图: {heatmap_path}")
-    
-    # 读取 FONT_PATH 环境变量以支持中文字体
-    font_path = os.environ.get("FONT_PATH")
-    positive_wc_path = ""
-    anti_wc_path = ""
     try:
-        positive_wc_path = os.path.join(figs_dir, "global_positive_patterns_wordcloud.png")
-        plot_pattern_wordcloud(pos_patterns_csv, positive_wc_path, font_path=font_path)
-        print(f"   ✓ 正向模式词云: {positive_wc_path}")
-
-        anti_wc_path = os.path.join(figs_dir, "global_anti_patterns_wordcloud.png")
-        plot_pattern_wordcloud(anti_patterns_csv, anti_wc_path, font_path=font_path)
-        print(f"   ✓ 反向模式词云: {anti_wc_path}")
-    except ImportError as e:
-        print(f"   ⚠ 跳过词云生成: 缺少依赖库 wordcloud")
-        print(f"     安装命令: pip install wordcloud pillow")
-        positive_wc_path = anti_wc_path = ""
-    except Exception as e:
-        print(f"   ⚠ 跳过词云生成: {e}")
-        print(f"     提示: 如果是字体错误，可忽略或设置 FONT_PATH 环境变量")
+        # 1) 读取任务
+        stages.start("read_tasks")
+        print("\n📖 [步骤 1/6] 读取任务数据...")
+        queue = None
+        if job_queue:
+            from .job_queue import JobQueue
+
+            queue = JobQueue(job_queue, shard_dir=os.path.join(output_dir, "shards"))
+            n_batches = queue.enqueue_jsonl(input_jsonl, job_batch_size, if_empty=True) if queue.is_empty() else 0
+            if n_batches:
+                print(f"   ✓ 任务已入队: {n_batches} 个批次 → {job_queue}")
+            else:
+                status = queue.status()
+                print(f"   ✓ 沿用已有任务队列 {job_queue}: 待处理 {status['pending']}、处理中 {status['leased']}、"
+                      f"已完成 {status['done']} 个批次")
+        else:
+            tasks = read_tasks_jsonl(input_jsonl)
+            print(f"   ✓ 成功读取 {len(tasks)} 个任务")
+
+        # 2) 调用 LLM 分析每任务
+        stages.start("llm_analyze")
+        print("\n🤖 [步骤 2/6] 调用 LLM 分析任务...")
+        if use_concurrent:
+            print(f"   使用并发模式（{max_workers} 个线程）")
+        analyze_kwargs = dict(
+            show_progress=show_progress,
+            use_concurrent=use_concurrent,
+            max_workers=max_workers,
+            num_samples=num_samples,
+            sample_fan_out=sample_fan_out,
+            pack_budget_tokens=pack_budget_tokens,
+            context_tokens=context_tokens,
+            order=schedule_order,
+            speculate_quantile=speculate_quantile,
+        )
+        if model_pools:
+            print(f"   多模型评测: {', '.join(p.name for p in model_pools)}")
+            analyze = partial(analyze_tasks_routed, pools=model_pools, **analyze_kwargs)
+        else:
+            analyze = partial(analyze_tasks, model=client, **analyze_kwargs)
+        if queue is not None:
+            from .job_queue import run_worker
+
+            worker_stats = run_worker(queue, analyze, pools=model_pools, lease_s=job_lease_s)
+            print(f"   ✓ 本进程处理 {worker_stats['batches']} 个批次，成功分析 {worker_stats['analyzed_ok']} 个任务")
+        else:
+            results = analyze(tasks)
+            print(f"   ✓ 成功分析 {len(results)} 个任务")
+        telemetry.print_summary()
+        if metrics_path:
+            print(f"   ✓ LLM 调用明细: {metrics_path}")
+
+        # 3) 写 per_task.jsonl
+        stages.start("write_results")
+        print("\n💾 [步骤 3/6] 保存任务分析结果...")
+        ensure_dir(output_dir)
+        per_task_path = os.path.join(output_dir, "per_task.jsonl")
+        if queue is not None:
+            # 合并所有 worker 的分片；后续拆分模型池与再标注需要完整结果
+            n_results = queue.merge_shards(per_task_path)
+            results = list(_iter_jsonl(per_task_path))
+            print(f"   ✓ 合并 {n_results} 条结果（分片目录 {queue.shard_dir}）")
+        else:
+            write_jsonl(per_task_path, results)
+        print(f"   ✓ 已保存到: {per_task_path}")
+        # 多个模型池：按 model 字段拆分，后续聚合 / 图表 / 报告基于主模型池，避免混合不同评审模型
+        agg_source = per_task_path
+        primary_results = results
+        model_paths: dict = {}
+        if model_pools and len(model_pools) > 1:
+            for pool in model_pools:
+                pool_results = [r for r in results if isinstance(r, dict) and r.get("model") == pool.name]
+                model_paths[pool.name] = os.path.join(output_dir, "models", pool.name, "per_task.jsonl")
+                write_jsonl(model_paths[pool.name], pool_results)
+                print(f"   ✓ 模型 {pool.name}: {len(pool_results)} 个任务 → {model_paths[pool.name]}")
+            agg_source = model_paths[model_pools[0].name]
+            primary_results = [r for r in results if isinstance(r, dict) and r.get("model") == model_pools[0].name]
+        reannotate_path = ""
+        if num_samples > 1:
+            reannotate_path = os.path.join(output_dir, "reannotate.jsonl")
+            selected = select_for_reannotation(primary_results, top_fraction=reannotate_top_fraction)
+            write_jsonl(reannotate_path, selected)
+            print(f"   ✓ 待再标注任务 {len(selected)} 个: {reannotate_path}")
+
+        # 4) 聚合导出 CSV
+        stages.start("aggregate")
+        print("\n📊 [步骤 4/6] 聚合统计数据...")
+        dim_csv = os.path.join(output_dir, "agg_dimension.csv")
+        kw_csv = os.path.join(output_dir, "agg_keywords.csv")
+        merge_cache = phrase_merge_cache or os.path.join(output_dir, "phrase_merge_cache.json")
+        dim_csv, kw_csv, pos_patterns_csv, anti_patterns_csv = export_aggregates(
+            agg_source, dim_csv, kw_csv, merge_phrases=merge_phrases, merge_cache=merge_cache,
+            approx_capacity=sketch_capacity, bootstrap_resamples=bootstrap_resamples,
+        )
+        print(f"   ✓ 维度统计: {dim_csv}")
+        print(f"   ✓ 关键词统计: {kw_csv}")
+        print(f"   ✓ 好代码模式: {pos_patterns_csv}")
+        print(f"   ✓ 坏代码模式: {anti_patterns_csv}")
+        grouped_dir = ""
+        if grouped_aggregates:
+            grouped_dir = os.path.join(output_dir, "grouped")
+            export_grouped_aggregates(
+                agg_source, grouped_dir, merge_phrases=merge_phrases, merge_cache=merge_cache,
+                approx_capacity=sketch_capacity,
+            )
+            print(f"   ✓ 分组聚合（语言 × 任务前缀）: {grouped_dir}")
+        models_compare_dir = ""
+        if model_paths:
+            for name, path in list(model_paths.items())[1:]:
+                model_dir = os.path.dirname(path)
+                export_aggregates(
+                    path, os.path.join(model_dir, "agg_dimension.csv"), os.path.join(model_dir, "agg_keywords.csv"),
+                    merge_phrases=merge_phrases, merge_cache=merge_cache,
+                    approx_capacity=sketch_capacity, bootstrap_resamples=bootstrap_resamples,
+                )
+                print(f"   ✓ 模型 {name} 的聚合: {model_dir}")
+            models_compare_dir = os.path.join(output_dir, "models", "compare")
+            compare_runs(list(model_paths.values()), models_compare_dir, labels=list(model_paths))
+            print(f"   ✓ 评审模型一致性对比: {models_compare_dir}")
+
+        # 5) 生成全局图表（各图表分别计时：figures_radar / figures_heatmap / figures_wordcloud）
+        print("\n📈 [步骤 5/6] 生成可视化图表...")
+        figs_dir = os.path.join(output_dir, "figs")
+        ensure_dir(figs_dir)
+        radar_path = heatmap_path = ""
         positive_wc_path = anti_wc_path = ""
+        if report_format == "html":
+            print("   ✓ 跳过 PNG 渲染（HTML 报告在浏览器端绘制图表）")
+        else:
+            stages.start("figures_radar")
+            radar_path = os.path.join(figs_dir, "global_radar.png")
+            plot_global_radar(dim_csv, radar_path)
+            print(f"   ✓ 雷达图: {radar_path}")
+
+            stages.start("figures_heatmap")
+            heatmap_path = plot_global_heatmaps(dim_csv, figs_dir)
+            print(f"   ✓ 热力图: {heatmap_path}")
+
+            stages.start("figures_wordcloud")
+            # 读取 FONT_PATH 环境变量以支持中文字体
+            font_path = os.environ.get("FONT_PATH")
+            try:
+                positive_wc_path = os.path.join(figs_dir, "global_positive_patterns_wordcloud.png")
+                plot_pattern_wordcloud(pos_patterns_csv, positive_wc_path, font_path=font_path, preview=wordcloud_preview)
+                print(f"   ✓ 正向模式词云: {positive_wc_path}")
 
-    # 6) 生成报告
-    print("\n📝 [步骤 6/6] 生成分析报告...")
-    report_md = os.path.join(output_dir, "report.md")
-    build_report_markdown(dim_csv, kw_csv, figs_dir, report_md)
-    print(f"   ✓ 报告: {report_md}")
+                anti_wc_path = os.path.join(figs_dir, "global_anti_patterns_wordcloud.png")
+                plot_pattern_wordcloud(anti_patterns_csv, anti_wc_path, font_path=font_path, preview=wordcloud_preview)
+                print(f"   ✓ 反向模式词云: {anti_wc_path}")
+            except ImportError as e:
+                print(f"   ⚠ 跳过词云生成: 缺少依赖库 wordcloud")
+                print(f"     安装命令: pip install wordcloud pillow")
+                positive_wc_path = anti_wc_path = ""
+            except Exception as e:
+                print(f"   ⚠ 跳过词云生成: {e}")
+                print(f"     提示: 如果是字体错误，可忽略或设置 FONT_PATH 环境变量")
+                positive_wc_path = anti_wc_path = ""
+
+        # 6) 生成报告
+        stages.start("report")
+        print("\n📝 [步骤 6/6] 生成分析报告...")
+        report_md = ""
+        report_html = ""
+        if report_format in ("markdown", "both"):
+            report_md = os.path.join(output_dir, "report.md")
+            build_report_markdown(dim_csv, kw_csv, figs_dir, report_md)
+            print(f"   ✓ 报告: {report_md}")
+        if report_format in ("html", "both"):
+            report_html = os.path.join(output_dir, "report.html")
+            build_report_html(
+                dim_csv,
+                kw_csv,
+                report_html,
+                agg_source,
+                positive_patterns_csv=pos_patterns_csv,
+                anti_patterns_csv=anti_patterns_csv,
+            )
+            print(f"   ✓ 交互式报告: {report_html}")
+
+        timings_path = stages.write(os.path.join(output_dir, "timings.json"))
+        print("\n⏱  各阶段耗时:")
+        stages.print_summary()
+        print(f"   ✓ 阶段耗时: {timings_path}")
+    finally:
+        # 任一阶段出错也要刷新遥测并停止指标端点线程
+        stages.stop()
+        telemetry.close()
+        if metrics_server is not None:
+            metrics_server.stop()
 
     print("\n" + "=" * 60)
     print("✅ Pipeline 执行完成！")
@@ -131,13 +322,20 @@ def run_pipeline(
 
     return {
         "per_task": per_task_path,
+        "models": os.path.join(output_dir, "models") if model_paths else "",
+        "models_compare": models_compare_dir,
+        "llm_metrics": metrics_path,
+        "timings": timings_path,
+        "reannotate": reannotate_path,
         "agg_dimension": dim_csv,
         "agg_keywords": kw_csv,
         "agg_positive_patterns": pos_patterns_csv,
         "agg_anti_patterns": anti_patterns_csv,
+        "grouped": grouped_dir,
         "radar": radar_path,
         "heatmap": heatmap_path,
         "report": report_md,
+        "report_html": report_html,
         "wordcloud_positive_patterns": positive_wc_path,
         "wordcloud_anti_patterns": anti_wc_path,
     }
@@ -147,14 +345,59 @@ def main() -> int:
     input_jsonl = os.environ.get("INPUT_JSONL", "/home/liangjunbiao/data/processed_data.jsonl")
     output_dir = os.environ.get("OUTPUT_DIR", "outputs")
     
+    # 多模型评测（A/B）：MODEL_POOLS="name=模型路径@url1,url2[#比例];..."，设置后优先于下方的单模型配置
+    from .multi_vllm import get_model_pools_from_env
+
+    model_pools = get_model_pools_from_env()
     # 支持多 vLLM 实例并发
     use_multi_vllm = os.environ.get("USE_MULTI_VLLM", "true").lower() in ("true", "1", "yes")
     # 是否启用真正的并发处理（线程池）
     use_concurrent = os.environ.get("USE_CONCURRENT", "true").lower() in ("true", "1", "yes")
     # 并发线程数
     max_workers = int(os.environ.get("MAX_WORKERS", "4"))
+    # 多次采样（不确定性挖掘）：每任务最大采样次数、是否拆分到多实例、再标注比例
+    num_samples = int(os.environ.get("NUM_SAMPLES", "1"))
+    sample_fan_out = os.environ.get("SAMPLE_FAN_OUT", "false").lower() in ("true", "1", "yes")
+    reannotate_top = float(os.environ.get("REANNOTATE_TOP", "0.05"))
+    # 打包模式：小任务装箱到同一请求的 token 预算（需小于 vLLM 的 --max-model-len），0 表示关闭
+    pack_budget_tokens = int(os.environ.get("PACK_BUDGET_TOKENS", "0")) or None
+    # 与 start_vllm.sh 的 --max-model-len 保持一致；超长任务按 bad 拆分，0 表示不拆分
+    context_tokens = int(os.environ.get("MAX_MODEL_LEN", "8192")) or None
+    # 词云预览模式（小画布、少词数），用于快速迭代报告
+    wordcloud_preview = os.environ.get("WORDCLOUD_PREVIEW", "false").lower() in ("true", "1", "yes")
+    # 报告格式：markdown（默认）/ html（单文件交互式，跳过 PNG 渲染）/ both
+    report_format = os.environ.get("REPORT_FORMAT", "markdown").lower()
+    # 按语言 / 任务 ID 前缀分组聚合
+    grouped_aggregates = os.environ.get("GROUPED_AGG", "false").lower() in ("true", "1", "yes")
+    # 短语规范化与近义合并（合并表缓存跨运行复用）
+    merge_phrases = os.environ.get("PHRASE_MERGE", "false").lower() in ("true", "1", "yes")
+    phrase_merge_cache = os.environ.get("PHRASE_MERGE_CACHE") or None
+    # 关键词 / 模式近似计数的容量（Top-K 草图），0 表示精确模式
+    sketch_capacity = int(os.environ.get("KEYWORD_SKETCH_CAPACITY", "0")) or None
+    # 维度差的 Bootstrap 置信区间与配对检验（重采样次数），0 表示关闭
+    bootstrap_resamples = int(os.environ.get("BOOTSTRAP_RESAMPLES", "2000"))
+    # LLM 调用遥测（llm_metrics.jsonl + 各 backend 延迟分位数）；LLM_STREAM 开启流式以测量首 token 时间
+    llm_metrics = os.environ.get("LLM_METRICS", "true").lower() in ("true", "1", "yes")
+    measure_ttfb = os.environ.get("LLM_STREAM", "false").lower() in ("true", "1", "yes")
+    # Prometheus 指标端点端口（Grafana 抓取），0 表示不启动
+    metrics_port = int(os.environ.get("METRICS_PORT", "0")) or None
+    # 按阶段剖析：cprofile / pyinstrument，可用 PIPELINE_PROFILE_STAGES 限定阶段（逗号分隔）
+    profile = os.environ.get("PIPELINE_PROFILE") or None
+    profile_stages = [s.strip() for s in os.environ.get("PIPELINE_PROFILE_STAGES", "").split(",") if s.strip()]
+    # 并发派发顺序：sjf 短任务优先（默认）/ lpt 长任务优先 / fifo；推测执行阈值分位数，0 表示关闭（默认）
+    schedule_order = os.environ.get("SCHEDULE_ORDER", "sjf").lower()
+    speculate_quantile = float(os.environ.get("SPECULATE_QUANTILE", "0")) or None
+    # 多 worker 共享的 SQLite 任务队列（可在多台驱动机上以相同配置运行），空为关闭
+    job_queue = os.environ.get("JOB_QUEUE") or None
+    job_batch_size = int(os.environ.get("JOB_BATCH_SIZE", "32"))
+    job_lease_s = float(os.environ.get("JOB_LEASE_S", "600"))
     
-    if use_multi_vllm:
+    client = None
+    if model_pools:
+        print(f"🚀 启用多模型评测模式: {len(model_pools)} 个模型池")
+        for pool in model_pools:
+            print(f"   {pool}")
+    elif use_multi_vllm:
         print("🚀 启用多 vLLM 实例并发模式")
         from .multi_vllm import create_multi_vllm_client, get_vllm_urls_from_env
         
@@ -185,7 +428,30 @@ def main() -> int:
         output_dir=output_dir, 
         client=client,
         use_concurrent=use_concurrent,
-        max_workers=max_workers
+        max_workers=max_workers,
+        num_samples=num_samples,
+        sample_fan_out=sample_fan_out,
+        reannotate_top_fraction=reannotate_top,
+        pack_budget_tokens=pack_budget_tokens,
+        context_tokens=context_tokens,
+        wordcloud_preview=wordcloud_preview,
+        report_format=report_format,
+        grouped_aggregates=grouped_aggregates,
+        merge_phrases=merge_phrases,
+        phrase_merge_cache=phrase_merge_cache,
+        sketch_capacity=sketch_capacity,
+        bootstrap_resamples=bootstrap_resamples,
+        llm_metrics=llm_metrics,
+        measure_ttfb=measure_ttfb,
+        metrics_port=metrics_port,
+        profile=profile,
+        profile_stages=profile_stages or None,
+        model_pools=model_pools or None,
+        schedule_order=schedule_order,
+        speculate_quantile=speculate_quantile,
+        job_queue=job_queue,
+        job_batch_size=job_batch_size,
+        job_lease_s=job_lease_s,
     )
     
     print("\n" + "=" * 60)
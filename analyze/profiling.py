@@ -0,0 +1,192 @@
+"""Pipeline 阶段计时与性能剖析。
+
+StageTimer 为 run_pipeline 的每个阶段记录墙钟时间、CPU 时间与峰值 RSS，
+同时把耗时写入遥测注册表（/metrics 的 pipeline_stage_* 指标），结束时输出 timings.json。
+可选按阶段挂 cProfile 或 pyinstrument（PIPELINE_PROFILE 环境变量），
+用于定位聚合、热力图、词云等后处理阶段随数据增长出现的回归。
+
+注意：剖析器只采样主线程；LLM 阶段的工作线程耗时请看 llm_metrics.jsonl。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+_STATUS_PATH = "/proc/self/status"
+_CLEAR_REFS_PATH = "/proc/self/clear_refs"
+
+
+def _peak_rss_mb() -> float:
+    """当前进程峰值 RSS（MB）；Linux 读取 VmHWM（可按阶段重置），其余平台用 ru_maxrss。"""
+    try:
+        with open(_STATUS_PATH, encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _reset_peak_rss() -> bool:
+    """把 VmHWM 重置为当前 RSS（Linux ≥ 4.0），使峰值按阶段统计；不支持时返回 False。"""
+    try:
+        with open(_CLEAR_REFS_PATH, "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class _Profiler:
+    """单个阶段的剖析器：cProfile 输出 .prof（可用 snakeviz 查看），pyinstrument 输出 .html。"""
+
+    def __init__(self, kind: str, out_dir: str, stage: str):
+        self.kind = kind
+        self.path = os.path.join(out_dir, f"{stage}.{'prof' if kind == 'cprofile' else 'html'}")
+        if kind == "cprofile":
+            import cProfile
+
+            self._impl = cProfile.Profile()
+            self._impl.enable()
+        else:
+            from pyinstrument import Profiler
+
+            self._impl = Profiler()
+            self._impl.start()
+
+    def finish(self) -> str:
+        if self.kind == "cprofile":
+            self._impl.disable()
+            self._impl.dump_stats(self.path)
+        else:
+            self._impl.stop()
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(self._impl.output_html())
+        return self.path
+
+
+class StageTimer:
+    """按阶段记录墙钟 / CPU 时间与峰值 RSS。
+
+    start(name) 结束上一阶段并开始新阶段，stop() 结束当前阶段；
+    write(path) 输出 timings.json。
+
+    Args:
+        registry: 遥测 MetricsRegistry，为 None 时不上报指标
+        profile: None / "cprofile" / "pyinstrument"，按阶段剖析
+        profile_dir: 剖析结果目录
+        profile_stages: 只剖析这些阶段（为空表示全部）
+    """
+
+    def __init__(
+        self,
+        registry=None,
+        *,
+        profile: Optional[str] = None,
+        profile_dir: str = "",
+        profile_stages: Optional[List[str]] = None,
+    ):
+        self.registry = registry
+        self.profile = self._check_profiler(profile)
+        self.profile_dir = profile_dir
+        self.profile_stages = set(profile_stages or [])
+        self.stages: List[Dict] = []
+        self.current = ""
+        self._wall0 = 0.0
+        self._cpu0 = 0.0
+        self._rss0 = 0.0
+        self._per_stage_peak = False
+        self._profiler: Optional[_Profiler] = None
+        self._started_at = time.time()
+
+    @staticmethod
+    def _check_profiler(profile: Optional[str]) -> Optional[str]:
+        if not profile:
+            return None
+        profile = profile.lower()
+        if profile not in PROFILERS:
+            print(f"[警告] 未知的剖析器: {profile}（可选 {', '.join(PROFILERS)}），已关闭剖析")
+            return None
+        if profile == "pyinstrument":
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                print("[提示] 未安装 pyinstrument，改用 cProfile（pip install pyinstrument）")
+                return "cprofile"
+        return profile
+
+    def start(self, name: str) -> None:
+        self.stop()
+        self.current = name
+        self._per_stage_peak = _reset_peak_rss()
+        self._rss0 = _peak_rss_mb()
+        if self.registry is not None:
+            self.registry.set_gauge("pipeline_stage_running", 1, stage=name)
+        if self.profile and (not self.profile_stages or name in self.profile_stages):
+            os.makedirs(self.profile_dir, exist_ok=True)
+            self._profiler = _Profiler(self.profile, self.profile_dir, name)
+        self._cpu0 = time.process_time()
+        self._wall0 = time.perf_counter()
+
+    def stop(self) -> None:
+        if not self.current:
+            return
+        wall = time.perf_counter() - self._wall0
+        cpu = time.process_time() - self._cpu0
+        name = self.current
+        self.current = ""
+        # 峰值 RSS：能按阶段重置时为本阶段峰值，否则为进程至今峰值
+        peak = _peak_rss_mb()
+        entry = {
+            "stage": name,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_rss_mb": round(peak, 1),
+            "rss_growth_mb": round(max(0.0, peak - self._rss0), 1),
+        }
+        if self._profiler is not None:
+            entry["profile"] = self._profiler.finish()
+            self._profiler = None
+        self.stages.append(entry)
+        if self.registry is not None:
+            self.registry.set_gauge("pipeline_stage_seconds", wall, stage=name)
+            self.registry.set_gauge("pipeline_stage_running", 0, stage=name)
+
+    def summary(self) -> Dict:
+        return {
+            "started_at": self._started_at,
+            "total_wall_s": round(sum(s["wall_s"] for s in self.stages), 6),
+            "total_cpu_s": round(sum(s["cpu_s"] for s in self.stages), 6),
+            "peak_rss_mb": max((s["peak_rss_mb"] for s in self.stages), default=0.0),
+            "per_stage_peak": self._per_stage_peak,
+            "profiler": self.profile,
+            "stages": self.stages,
+        }
+
+    def write(self, path: str) -> str:
+        self.stop()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def print_summary(self) -> None:
+        if not self.stages:
+            return
+        total = sum(s["wall_s"] for s in self.stages) or 1.0
+        print(f"   {'阶段':<18}{'墙钟(s)':>10}{'CPU(s)':>10}{'占比':>8}{'峰值RSS(MB)':>14}")
+        for s in self.stages:
+            print(
+                f"   {s['stage']:<18}{s['wall_s']:>10.3f}{s['cpu_s']:>10.3f}"
+                f"{s['wall_s'] / total:>8.1%}{s['peak_rss_mb']:>14.1f}"
+            )
@@ -2,36 +2,23 @@
 
 本模块提供与 task.md 规范一致的构造器：
 - 一次响应同时产出 1vN 对照与任务级聚合结果；
-- 在 Prompt 中内置中文说明模板。
+- 在 Prompt 中内置中文说明模板；
+- 打包模式：把多个小任务放进同一请求，分摊固定的说明开销。
 """
 
 from __future__ import annotations
 
 from typing import List
+import hashlib
+import json
+import math
+import re
 
 from .schemas import TaskInput, BadCode
 
 
-def _format_bad_codes(bads: List[BadCode]) -> str:
-    parts = []
-    for b in bads:
-        parts.append(f"{{\n  \"bad_id\": \"{b.bad_id}\",\n  \"code\": \"" + str(b.code).replace("\\", "\\\\").replace("\"", "\\\"") + "\"\n}}")
-    return "[\n" + ",\n".join(parts) + "\n]"
-
-
-def build_1vN_prompt(task: TaskInput) -> str:
-    """构造单次调用的 1vN Prompt 字符串。
-
-    说明：将任务说明和数据序列化为近似 JSON 文本嵌入，以提示模型输出结构化结果。
-    当前实现保持简洁，格式化细节可后续再优化。
-    """
-    bads = _format_bad_codes(task.bad_codes)
-    # 对 JSON 片段做最小转义，避免引号与反斜杠冲突
-    prompt_text = task.prompt.replace("\\", "\\\\").replace("\"", "\\\"")
-    good_text = task.good_code.replace("\\", "\\\\").replace("\"", "\\\"")
-
-    instruction = f"""
-你是一名资深代码质量分析师。
+# 说明部分（与任务数据无关，所有 Prompt 共享）
+_INSTRUCTION = """你是一名资深代码质量分析师。
 我将提供 同一任务 的：任务说明（prompt）、一份 good_code，以及多份 bad_code。
 你的目标是：
 
@@ -47,40 +34,133 @@ def build_1vN_prompt(task: TaskInput) -> str:
 3. 除了在任务级别提供一次 positive_patterns 列表外，不要做任何其他任务级聚合统计；仅返回逐个 good 与 bad 的详细比较结果，让后续程序自行汇总。
 4. 仅输出严格符合 JSON Schema 的结构化结果，不要额外文本。
 
+"""
 
-输入：
-{{
-  "task_id": "{task.task_id}",
-  "prompt": "{prompt_text}",
-  "good_code": "{good_text}",
-  "bad_codes": {bads}
-}}
-
-输出 JSON Schema：请与如下字段对齐：
-{{
+# 单任务输出结构
+_OUTPUT_SCHEMA = """{
   "task_id": "...",
   "prompt_brief": "...",
   "per_bad_comparisons": [
-    {{
+    {
       "bad_id": "...",
-      "dimension_scores": {{
-        "correctness": {{"good": 0-5, "bad": 0-5,  "evidence": "?"}},
-        "robustness":  {{"good": 0-5, "bad": 0-5,  "evidence": "?"}},
-        "readability": {{"good": 0-5, "bad": 0-5,  "evidence": "?"}},
-        "maintainability": {{"good": 0-5, "bad": 0-5,  "evidence": "?"}},
-        "complexity": {{"good": 0-5, "bad": 0-5,  "evidence": "?"}},
-        "performance": {{"good": 0-5, "bad": 0-5,  "evidence": "?"}},
-        "testing": {{"good": 0-5, "bad": 0-5,  "evidence": "?"}},
-        "security_dependency": {{"good": 0-5, "bad": 0-5,  "evidence": "?"}},
-        "style_consistency": {{"good": 0-5, "bad": 0-5,  "evidence": "?"}}
-      }},
-      "discriminative_keywords": [{{"phrase": "...", "dimension": "...", "weight": 0.0}}],
+      "dimension_scores": {
+        "correctness": {"good": 0-5, "bad": 0-5,  "evidence": "?"},
+        "robustness":  {"good": 0-5, "bad": 0-5,  "evidence": "?"},
+        "readability": {"good": 0-5, "bad": 0-5,  "evidence": "?"},
+        "maintainability": {"good": 0-5, "bad": 0-5,  "evidence": "?"},
+        "complexity": {"good": 0-5, "bad": 0-5,  "evidence": "?"},
+        "performance": {"good": 0-5, "bad": 0-5,  "evidence": "?"},
+        "testing": {"good": 0-5, "bad": 0-5,  "evidence": "?"},
+        "security_dependency": {"good": 0-5, "bad": 0-5,  "evidence": "?"},
+        "style_consistency": {"good": 0-5, "bad": 0-5,  "evidence": "?"}
+      },
+      "discriminative_keywords": [{"phrase": "...", "dimension": "...", "weight": 0.0}],
       "anti_patterns": ["..."],
       "actionable_rules_local": ["..."]
-    }}
+    }
   ],
   "positive_patterns": ["..."],
   "task_level_agg": null  // 保持字段占位即可，后续程序会忽略
-}}
+}
+"""
+
+_PACKED_NOTE = """
+5. 本次输入包含多个相互独立的任务（tasks 数组）。请对每个任务分别、独立地完成上述分析，不要在任务之间互相参考；
+   输出为 {"results": [...]}，results 中每个元素对应一个任务（保留其 task_id），顺序与输入一致，每个元素的结构与下述单任务 Schema 相同。
 """
-    return instruction.strip()
+
+_CJK_RE = re.compile(r"[\u2e80-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的 token 数（无需加载分词器）。
+
+    中日韩字符按每字 1 token 计，其余字符按每 3.5 字符 1 token 计；用于打包/拆分决策，偏保守即可。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 3.5)
+
+
+# 输入数据布局的版本：修改 _format_task_input / 打包外壳的结构时递增，会改变模板版本哈希
+_LAYOUT_VERSION = "json-v1"
+
+def _json_str(s: str) -> str:
+    """JSON 字符串字面量：转义引号、反斜杠与全部控制字符，保留中文原样。"""
+    return json.dumps(s, ensure_ascii=False)
+
+
+class PromptTemplate:
+    """预编译的 Prompt 模板：说明与 Schema 等静态片段只拼接一次，渲染时只插入任务数据。
+
+    version 为模板名、数据布局版本与静态片段的 SHA-256 前 12 位，
+    写入结果（prompt_template 字段）与缓存键，用于追溯结果由哪个模板生成。
+    """
+
+    __slots__ = ("name", "prefix", "suffix", "version")
+
+    def __init__(self, name: str, prefix: str, suffix: str):
+        self.name = name
+        self.prefix = prefix
+        self.suffix = suffix
+        digest = hashlib.sha256("\0".join((name, _LAYOUT_VERSION, prefix, suffix)).encode("utf-8"))
+        self.version = digest.hexdigest()[:12]
+
+    def render(self, data: str) -> str:
+        return self.prefix + data + self.suffix
+
+    def __repr__(self) -> str:
+        return f"PromptTemplate({self.name!r}, version={self.version!r})"
+
+
+def _format_bad_codes(bads: List[BadCode]) -> str:
+    if not bads:
+        return "[]"
+    items = ",\n".join(
+        '    {"bad_id": ' + _json_str(str(b.bad_id)) + ', "code": ' + _json_str(b.code) + "}" for b in bads
+    )
+    return "[\n" + items + "\n  ]"
+
+
+def _format_task_input(task: TaskInput) -> str:
+    """将任务数据序列化为合法 JSON 文本（字段逐个用 JSON 编码器转义，布局固定便于阅读）。"""
+    return (
+        '{\n  "task_id": ' + _json_str(str(task.task_id))
+        + ',\n  "prompt": ' + _json_str(task.prompt)
+        + ',\n  "good_code": ' + _json_str(task.good_code)
+        + ',\n  "bad_codes": ' + _format_bad_codes(task.bad_codes)
+        + "\n}"
+    )
+
+
+def _indent(text: str, prefix: str = "    ") -> str:
+    return "\n".join(prefix + line for line in text.splitlines())
+
+
+SINGLE_TEMPLATE = PromptTemplate(
+    "1vN",
+    prefix=(_INSTRUCTION + "\n输入：\n").lstrip(),
+    suffix=("\n\n输出 JSON Schema：请与如下字段对齐：\n" + _OUTPUT_SCHEMA).rstrip(),
+)
+
+# 代码已作为 JSON 字符串转义，外壳与任务数据可以正常缩进
+PACKED_TEMPLATE = PromptTemplate(
+    "1vN-packed",
+    prefix=(_INSTRUCTION.rstrip("\n") + "\n" + _PACKED_NOTE + "\n输入：\n{\n  \"tasks\": [\n").lstrip(),
+    suffix=(
+        "\n  ]\n}"
+        + "\n\n输出 JSON Schema：请与如下字段对齐：\n{\n  \"results\": [\n" + _indent(_OUTPUT_SCHEMA.rstrip("\n")) + "\n  ]\n}\n"
+    ).rstrip(),
+)
+
+
+def build_1vN_prompt(task: TaskInput) -> str:
+    """构造单次调用的 1vN Prompt 字符串（SINGLE_TEMPLATE，任务数据为合法 JSON）。"""
+    return SINGLE_TEMPLATE.render(_format_task_input(task))
+
+
+def build_packed_prompt(tasks: List[TaskInput]) -> str:
+    """构造多任务打包的 Prompt：共享一份说明，输入为 {"tasks": [...]}，输出为 {"results": [...]}。"""
+    # 任务 JSON 中的换行只出现在结构处（代码里的换行已转义），直接替换即可整体缩进
+    return PACKED_TEMPLATE.render(",\n".join("    " + _format_task_input(t).replace("\n", "\n    ") for t in tasks))
@@ -1,12 +1,19 @@
-"""报告生成：根据聚合 CSV 生成 Markdown 概览。"""
+"""报告生成：根据聚合 CSV 生成 Markdown 概览，或生成自包含的交互式 HTML 报告。"""
 
 from __future__ import annotations
 
 
 import csv
 import datetime as _dt
+import heapq
+import json
 import os
 
+from .aggregate import _iter_jsonl, _score_pairs
+from .schemas import Dimension
+from .stats import significance_marker
+from .visualize import DIM_CN
+
 
 def _read_csv_rows(path: str):
     with open(path, "r", encoding="utf-8") as f:
@@ -39,8 +46,14 @@ def build_report_markdown(agg_dimension_csv: str, agg_keywords_csv: str, figs_di
         # 排序：按平均(均值差) 降序
         rows_sorted = sorted(rows, key=lambda r: float(r.get("avg_of_means", 0.0)), reverse=True)
         for r in rows_sorted:
+            mean_cell = f"{float(r.get('avg_of_means',0.0)):.3f}"
+            if r.get("avg_of_means_ci_low") and r.get("avg_of_means_ci_high"):
+                mean_cell += (
+                    f" [{float(r['avg_of_means_ci_low']):.3f}, {float(r['avg_of_means_ci_high']):.3f}]"
+                    f"{significance_marker(r.get('p_value'))}"
+                )
             lines.append(
-                f"| {r.get('dimension','')} | {r.get('tasks','0')} | {float(r.get('avg_of_means',0.0)):.3f} | "
+                f"| {r.get('dimension','')} | {r.get('tasks','0')} | {mean_cell} | "
                 f"{float(r.get('avg_of_medians',0.0)):.3f} | {float(r.get('avg_of_mins',0.0)):.3f} | "
                 f"{float(r.get('avg_of_maxes',0.0)):.3f} | {float(r.get('avg_consistency',0.0)):.3f} | "
                 f"{float(r.get('avg_good_score',0.0)):.3f} | {float(r.get('avg_bad_score',0.0)):.3f} |"
@@ -61,6 +74,8 @@ def build_report_markdown(agg_dimension_csv: str, agg_keywords_csv: str, figs_di
     md.append("## 维度差概览\n")
     md.append(_fmt_dim_table(dim_rows))
     md.append("\n> 说明：Good/Bad 得分范围 0-5，数值越高表示质量越好。")
+    if any(r.get("avg_of_means_ci_low") for r in dim_rows):
+        md.append("\n> 平均(均值差)后为 95% Bootstrap 置信区间；*/**/*** 表示配对检验 p<0.05/0.01/0.001。")
     md.append("\n\n")
     md.append("## 全局区分性关键词（Top-50）\n")
     md.append(_fmt_kw_table(kw_rows, topn=50))
@@ -94,3 +109,359 @@ def build_report_markdown(agg_dimension_csv: str, agg_keywords_csv: str, figs_di
     with open(out_md_path, "w", encoding="utf-8") as f:
         f.write("\n".join(md))
     return out_md_path
+
+
+def build_report_data(
+    agg_dimension_csv: str,
+    agg_keywords_csv: str,
+    per_task_jsonl: str | None = None,
+    *,
+    positive_patterns_csv: str | None = None,
+    anti_patterns_csv: str | None = None,
+    top_keywords: int = 20,
+    top_patterns: int = 50,
+) -> dict:
+    """汇总 HTML 报告所需的紧凑数据。
+
+    - dimensions：维度统计（来自 agg_dimension.csv）；
+    - keywords：每个维度 Top-N 关键词 [phrase, weight_sum, task_count]（流式读取，按维度保留小顶堆）；
+    - tasks：每任务一行 [task_id, bad 数, 各维度平均 Δ（缺失为 null，顺序同 dims）]；
+    - patterns：正/反向模式 Top-N [pattern, count]。
+    """
+    dims = [d.value for d in Dimension]
+
+    dim_rows = []
+    for r in _read_csv_rows(agg_dimension_csv):
+        row = {"dimension": r.get("dimension", "")}
+        for k, v in r.items():
+            if k != "dimension":
+                try:
+                    row[k] = round(float(v), 4)
+                except (TypeError, ValueError):
+                    row[k] = v
+        dim_rows.append(row)
+
+    heaps: dict = {}
+    with open(agg_keywords_csv, "r", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            try:
+                item = (float(r.get("weight_sum", 0.0)), int(float(r.get("task_count", 0))), r.get("phrase", ""))
+            except ValueError:
+                continue
+            h = heaps.setdefault(r.get("dimension", ""), [])
+            if len(h) < top_keywords:
+                heapq.heappush(h, item)
+            elif item > h[0]:
+                heapq.heapreplace(h, item)
+    keywords = {
+        dim: [[p, round(w, 4), c] for w, c, p in sorted(h, reverse=True)]
+        for dim, h in heaps.items()
+    }
+
+    tasks = []
+    if per_task_jsonl and os.path.exists(per_task_jsonl):
+        for obj in _iter_jsonl(per_task_jsonl):
+            sums: dict = {}
+            cmps = obj.get("per_bad_comparisons") or []
+            for cmp in cmps:
+                for name, (g, b) in _score_pairs(cmp).items():
+                    acc = sums.setdefault(name, [0.0, 0])
+                    acc[0] += g - b
+                    acc[1] += 1
+            deltas = [round(sums[d][0] / sums[d][1], 3) if d in sums else None for d in dims]
+            tasks.append([str(obj.get("task_id", "")), len(cmps), deltas])
+
+    def _patterns(path):
+        if not path or not os.path.exists(path):
+            return []
+        rows = _read_csv_rows(path)
+        rows.sort(key=lambda r: float(r.get("count", 0.0) or 0.0), reverse=True)
+        return [[r.get("pattern", ""), float(r.get("count", 0.0) or 0.0)] for r in rows[:top_patterns]]
+
+    return {
+        "generated_at": _dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "dims": dims,
+        "dim_cn": DIM_CN,
+        "dimensions": dim_rows,
+        "keywords": keywords,
+        "tasks": tasks,
+        "patterns": {
+            "positive": _patterns(positive_patterns_csv),
+            "anti": _patterns(anti_patterns_csv),
+        },
+    }
+
+
+def build_report_html(
+    agg_dimension_csv: str,
+    agg_keywords_csv: str,
+    out_html_path: str,
+    per_task_jsonl: str | None = None,
+    *,
+    positive_patterns_csv: str | None = None,
+    anti_patterns_csv: str | None = None,
+    top_keywords: int = 20,
+) -> str:
+    """生成单文件交互式 HTML 报告（report.html）。
+
+    数据以 JSON 内嵌在页面中，图表由浏览器端脚本以 SVG 绘制，支持按维度与任务过滤；
+    不依赖 matplotlib，也不引用外部资源，可离线打开。返回生成的 HTML 路径。
+    """
+    data = build_report_data(
+        agg_dimension_csv,
+        agg_keywords_csv,
+        per_task_jsonl,
+        positive_patterns_csv=positive_patterns_csv,
+        anti_patterns_csv=anti_patterns_csv,
+        top_keywords=top_keywords,
+    )
+    # 紧凑序列化；转义 "</" 防止提前结束 <script>
+    blob = json.dumps(data, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+    os.makedirs(os.path.dirname(out_html_path) or ".", exist_ok=True)
+    with open(out_html_path, "w", encoding="utf-8") as f:
+        f.write(_HTML_TEMPLATE.replace("__REPORT_DATA__", blob))
+    return out_html_path
+
+
+
+# HTML 报告模板：纯 HTML/CSS/JS，无外部依赖；__REPORT_DATA__ 替换为 JSON 数据
+_HTML_TEMPLATE = r"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>1vN 代码质量分析报告</title>
+<style>
+  body { font-family: -apple-system, "PingFang SC", "Microsoft YaHei", "Noto Sans CJK SC", sans-serif; margin: 24px; color: #222; }
+  h1 { margin-bottom: 4px; }
+  h2 { margin-top: 32px; border-bottom: 1px solid #ddd; padding-bottom: 4px; }
+  .muted { color: #888; font-size: 13px; }
+  .controls { position: sticky; top: 0; background: #fff; padding: 8px 0; border-bottom: 1px solid #eee; z-index: 1; }
+  .controls label { margin-right: 16px; }
+  table { border-collapse: collapse; font-size: 13px; }
+  th, td { border: 1px solid #ddd; padding: 4px 8px; }
+  th { background: #f6f6f6; cursor: pointer; }
+  td.num { text-align: right; font-variant-numeric: tabular-nums; }
+  tr.sel td { background: #fff3cd; }
+  tbody tr:hover td { background: #f0f7ff; cursor: pointer; }
+  .row { display: flex; gap: 32px; flex-wrap: wrap; }
+  svg text { font-size: 12px; }
+  .scroll { max-height: 480px; overflow: auto; }
+</style>
+</head>
+<body>
+<h1>1vN 代码质量分析报告</h1>
+<div class="muted" id="meta"></div>
+
+<div class="controls">
+  <label>维度：<select id="dim-filter"><option value="">全部维度</option></select></label>
+  <label>任务：<input id="task-filter" placeholder="按 task_id 过滤" size="28"></label>
+  <span class="muted" id="task-count"></span>
+</div>
+
+<h2>维度得分概览</h2>
+<div class="row">
+  <div id="dim-chart"></div>
+  <div id="dim-table"></div>
+</div>
+<div class="muted">说明：Good/Bad 得分范围 0-5，Δ = Good - Bad，数值越高表示区分越明显。</div>
+
+<h2>区分性关键词（每维度 Top-N）</h2>
+<div id="kw-table" class="scroll"></div>
+
+<h2>任务得分</h2>
+<div class="row">
+  <div id="hist-chart"></div>
+  <div id="task-chart"></div>
+</div>
+<div id="task-table" class="scroll"></div>
+
+<h2>代码模式</h2>
+<div class="row">
+  <div><h3>好代码模式</h3><div id="pos-table" class="scroll"></div></div>
+  <div><h3>坏代码模式</h3><div id="anti-table" class="scroll"></div></div>
+</div>
+
+<script type="application/json" id="report-data">__REPORT_DATA__</script>
+<script>
+(function () {
+  "use strict";
+  var DATA = JSON.parse(document.getElementById("report-data").textContent);
+  var DIMS = DATA.dims, CN = DATA.dim_cn || {};
+  var state = { dim: "", task: "", selected: null };
+  var SVGNS = "http://www.w3.org/2000/svg";
+
+  function cn(d) { return CN[d] || d; }
+  function fmt(v, n) { return v === null || v === undefined ? "-" : Number(v).toFixed(n === undefined ? 3 : n); }
+  function esc(s) { return String(s).replace(/[&<>"]/g, function (c) { return { "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;" }[c]; }); }
+  function el(tag, attrs, text) {
+    var e = document.createElementNS(SVGNS, tag);
+    for (var k in attrs) e.setAttribute(k, attrs[k]);
+    if (text !== undefined) e.textContent = text;
+    return e;
+  }
+  function activeDims() { return state.dim ? [state.dim] : DIMS; }
+
+  function table(headers, rows, selectedKey) {
+    var h = "<table><thead><tr>" + headers.map(function (x) { return "<th>" + esc(x) + "</th>"; }).join("") + "</tr></thead><tbody>";
+    rows.forEach(function (r, i) {
+      var cls = selectedKey !== undefined && r.key === selectedKey ? ' class="sel"' : "";
+      h += "<tr data-i=\"" + i + "\"" + cls + ">" + r.cells.map(function (c, j) {
+        return typeof c === "number" || (j > 0 && /^-?\d+(\.\d+)?$/.test(c)) ? '<td class="num">' + c + "</td>" : "<td>" + esc(c) + "</td>";
+      }).join("") + "</tr>";
+    });
+    return h + "</tbody></table>";
+  }
+
+  // 横向条形图：items = [{label, values: [v...]}]，colors 与 values 对齐
+  function barChart(target, items, colors, legend, opts) {
+    opts = opts || {};
+    var rowH = 22 * Math.max(1, colors.length), left = 110, width = 460, top = 24;
+    var all = [0];
+    items.forEach(function (it) { it.values.forEach(function (v) { if (v !== null) all.push(v); }); });
+    var lo = opts.min !== undefined ? opts.min : Math.min.apply(null, all);
+    var hi = opts.max !== undefined ? opts.max : Math.max.apply(null, all);
+    if (hi === lo) hi = lo + 1;
+    var scale = function (v) { return left + (v - lo) / (hi - lo) * (width - left - 40); };
+    var svg = el("svg", { width: width, height: top + items.length * (rowH + 6) + 24 });
+    legend.forEach(function (name, j) {
+      svg.appendChild(el("rect", { x: left + j * 90, y: 4, width: 10, height: 10, fill: colors[j] }));
+      svg.appendChild(el("text", { x: left + j * 90 + 14, y: 13 }, name));
+    });
+    svg.appendChild(el("line", { x1: scale(0), x2: scale(0), y1: top - 4, y2: top + items.length * (rowH + 6), stroke: "#999" }));
+    items.forEach(function (it, i) {
+      var y = top + i * (rowH + 6);
+      svg.appendChild(el("text", { x: left - 6, y: y + rowH / 2 + 4, "text-anchor": "end" }, it.label));
+      it.values.forEach(function (v, j) {
+        if (v === null) return;
+        var x0 = scale(Math.min(0, v)), x1 = scale(Math.max(0, v));
+        var bar = el("rect", { x: x0, y: y + j * 22, width: Math.max(1, x1 - x0), height: 18, fill: colors[j] });
+        bar.appendChild(el("title", {}, it.label + " " + legend[j] + ": " + fmt(v)));
+        svg.appendChild(bar);
+        svg.appendChild(el("text", { x: x1 + 4, y: y + j * 22 + 13, fill: "#555" }, fmt(v, 2)));
+      });
+    });
+    var box = document.getElementById(target);
+    box.innerHTML = "";
+    box.appendChild(svg);
+  }
+
+  function histogram(target, values, title) {
+    var box = document.getElementById(target);
+    box.innerHTML = "";
+    if (!values.length) { box.textContent = "无任务数据"; return; }
+    var lo = Math.min.apply(null, values), hi = Math.max.apply(null, values);
+    var bins = 20, w = 460, h = 200, pad = 30;
+    if (hi === lo) { lo -= 0.5; hi += 0.5; }
+    var counts = new Array(bins).fill(0);
+    values.forEach(function (v) { counts[Math.min(bins - 1, Math.floor((v - lo) / (hi - lo) * bins))]++; });
+    var cmax = Math.max.apply(null, counts);
+    var svg = el("svg", { width: w, height: h + 40 });
+    svg.appendChild(el("text", { x: pad, y: 14 }, title + "（" + values.length + " 个任务）"));
+    var bw = (w - 2 * pad) / bins;
+    counts.forEach(function (c, i) {
+      var bh = c / cmax * (h - 30);
+      var r = el("rect", { x: pad + i * bw, y: h - bh, width: bw - 1, height: bh, fill: "#6baed6" });
+      r.appendChild(el("title", {}, fmt(lo + i * (hi - lo) / bins, 2) + " ~ " + fmt(lo + (i + 1) * (hi - lo) / bins, 2) + ": " + c));
+      svg.appendChild(r);
+    });
+    svg.appendChild(el("text", { x: pad, y: h + 16 }, fmt(lo, 2)));
+    svg.appendChild(el("text", { x: w - pad, y: h + 16, "text-anchor": "end" }, fmt(hi, 2)));
+    box.appendChild(svg);
+  }
+
+  function taskMean(t) {
+    var idx = state.dim ? [DIMS.indexOf(state.dim)] : DIMS.map(function (_, i) { return i; });
+    var s = 0, n = 0;
+    idx.forEach(function (i) { if (t[2][i] !== null) { s += t[2][i]; n++; } });
+    return n ? s / n : null;
+  }
+
+  function filteredTasks() {
+    var q = state.task.toLowerCase();
+    return DATA.tasks.filter(function (t) { return !q || t[0].toLowerCase().indexOf(q) >= 0; });
+  }
+
+  function renderDimensions() {
+    var rows = DATA.dimensions.filter(function (r) { return !state.dim || r.dimension === state.dim; });
+    barChart("dim-chart", rows.map(function (r) {
+      return { label: cn(r.dimension), values: [r.avg_good_score, r.avg_bad_score, r.avg_of_means] };
+    }), ["#2ca02c", "#d62728", "#1f77b4"], ["Good", "Bad", "Δ 均值"]);
+    document.getElementById("dim-table").innerHTML = table(
+      ["维度", "任务数", "Δ均值", "Δ中位", "Δ最小", "Δ最大", "一致性"],
+      rows.map(function (r) {
+        return { cells: [cn(r.dimension), r.tasks, fmt(r.avg_of_means), fmt(r.avg_of_medians), fmt(r.avg_of_mins), fmt(r.avg_of_maxes), fmt(r.avg_consistency)] };
+      })
+    );
+  }
+
+  function renderKeywords() {
+    var rows = [];
+    activeDims().forEach(function (d) {
+      (DATA.keywords[d] || []).forEach(function (k, i) { rows.push({ cells: [cn(d), i + 1, k[0], fmt(k[1]), k[2]] }); });
+    });
+    document.getElementById("kw-table").innerHTML = rows.length
+      ? table(["维度", "排名", "关键词", "权重和", "任务数"], rows)
+      : '<span class="muted">无关键词数据</span>';
+  }
+
+  function renderTasks() {
+    var tasks = filteredTasks();
+    document.getElementById("task-count").textContent = "匹配任务 " + tasks.length + " / " + DATA.tasks.length;
+    var means = [];
+    tasks.forEach(function (t) { var m = taskMean(t); if (m !== null) means.push(m); });
+    histogram("hist-chart", means, (state.dim ? cn(state.dim) : "全部维度") + " 任务平均 Δ 分布");
+
+    var sorted = tasks.slice().sort(function (a, b) { return (taskMean(b) || 0) - (taskMean(a) || 0); });
+    var shown = sorted.slice(0, 500);
+    var dims = activeDims();
+    var headers = ["task_id", "bad 数", "平均 Δ"].concat(dims.map(cn));
+    var rows = shown.map(function (t) {
+      return {
+        key: t[0],
+        cells: [t[0], t[1], fmt(taskMean(t))].concat(dims.map(function (d) { return fmt(t[2][DIMS.indexOf(d)]); }))
+      };
+    });
+    var box = document.getElementById("task-table");
+    box.innerHTML = table(headers, rows, state.selected) +
+      (sorted.length > shown.length ? '<div class="muted">仅显示前 ' + shown.length + " 个任务，可用任务过滤缩小范围</div>" : "");
+    box.querySelectorAll("tbody tr").forEach(function (tr) {
+      tr.addEventListener("click", function () { state.selected = shown[+tr.dataset.i][0]; renderTasks(); });
+    });
+
+    var sel = DATA.tasks.filter(function (t) { return t[0] === state.selected; })[0];
+    if (sel) {
+      barChart("task-chart", DIMS.map(function (d, i) { return { label: cn(d), values: [sel[2][i]] }; }),
+        ["#1f77b4"], ["任务 " + sel[0] + " 各维度 Δ"]);
+    } else {
+      document.getElementById("task-chart").innerHTML = '<span class="muted">点击下方任务行查看该任务各维度 Δ</span>';
+    }
+  }
+
+  function renderPatterns() {
+    [["pos-table", DATA.patterns.positive], ["anti-table", DATA.patterns.anti]].forEach(function (p) {
+      document.getElementById(p[0]).innerHTML = p[1].length
+        ? table(["模式", "次数"], p[1].map(function (r) { return { cells: [r[0], r[1]] }; }))
+        : '<span class="muted">无模式数据</span>';
+    });
+  }
+
+  function renderAll() { renderDimensions(); renderKeywords(); renderTasks(); }
+
+  var dimSel = document.getElementById("dim-filter");
+  DIMS.forEach(function (d) {
+    var o = document.createElement("option");
+    o.value = d; o.textContent = cn(d);
+    dimSel.appendChild(o);
+  });
+  dimSel.addEventListener("change", function () { state.dim = dimSel.value; renderAll(); });
+  document.getElementById("task-filter").addEventListener("input", function (e) { state.task = e.target.value; renderTasks(); });
+
+  document.getElementById("meta").textContent =
+    "生成时间：" + DATA.generated_at + "　任务数：" + DATA.tasks.length + "　维度数：" + DIMS.length;
+  renderAll();
+  renderPatterns();
+})();
+</script>
+</body>
+</html>
+"""
@@ -0,0 +1,353 @@
+"""分层抽样：按差距 / 代码长度 / 任务类别分桶的蓄水池抽样。
+
+对应 clean/README.md §8（分布均衡）与 §13（分桶采样）：
+- 抽样单元为 (task_id, bad_id) 对；
+- 差距分桶：平均 |Δ| 大（≥2）/ 中（1–2）/ 小（<1），默认比例 4:3:1；
+- 长度分桶：bad_code 的 LOC 短（<30）/ 中（30–150）/ 长（>150），默认比例 1:1:1；
+- 可选按任务类别（per_task 记录中的 category 字段）再细分。
+
+每个分层维护一个独立蓄水池（Algorithm R），只需单次流式遍历 per_task 结果，
+蓄水池内存与样本量成正比，而与输入规模无关。LOC 查找表由原始任务 JSONL 流式构建，
+每个 (task_id, bad_id) 只保留一个整数，不保留代码文本。
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import argparse
+import csv
+import json
+import os
+import random
+
+from .aggregate import _iter_jsonl, _score_pairs
+from .adapters import _as_list_str
+from .io_utils import ensure_dir, write_jsonl
+from .schemas import TaskInput
+
+
+DELTA_BUCKETS: Tuple[str, ...] = ("large", "medium", "small")
+LENGTH_BUCKETS: Tuple[str, ...] = ("short", "medium", "long")
+
+# README §8 建议的差距分桶比例（大:中:小）
+DEFAULT_DELTA_RATIO: Tuple[float, float, float] = (4.0, 3.0, 1.0)
+DEFAULT_LENGTH_RATIO: Tuple[float, float, float] = (1.0, 1.0, 1.0)
+
+UNKNOWN_CATEGORY = "unknown"
+
+
+def count_loc(code: str) -> int:
+    """统计非空代码行数（LOC）。"""
+    return sum(1 for line in (code or "").splitlines() if line.strip())
+
+
+def delta_bucket(mean_abs_delta: float) -> str:
+    """平均 |Δ| → 差距分桶：≥2 为 large，1–2 为 medium，<1 为 small。"""
+    if mean_abs_delta >= 2.0:
+        return "large"
+    if mean_abs_delta >= 1.0:
+        return "medium"
+    return "small"
+
+
+def length_bucket(loc: int) -> str:
+    """LOC → 长度分桶：<30 为 short，30–150 为 medium，>150 为 long。"""
+    if loc < 30:
+        return "short"
+    if loc <= 150:
+        return "medium"
+    return "long"
+
+
+def build_loc_lookup(tasks: Iterable[TaskInput]) -> Dict[Tuple[str, str], int]:
+    """由 TaskInput 构造 (task_id, bad_id) -> bad_code LOC 的查找表。"""
+    lookup: Dict[Tuple[str, str], int] = {}
+    for t in tasks:
+        for b in t.bad_codes:
+            lookup[(t.task_id, b.bad_id)] = count_loc(b.code)
+    return lookup
+
+
+def stream_loc_lookup(tasks_jsonl: str) -> Dict[Tuple[str, str], int]:
+    """流式读取原始任务 JSONL，构造 (task_id, bad_id) -> bad_code LOC 的查找表。
+
+    task_id / bad_id 的生成规则与 read_tasks_jsonl 一致；逐行计算 LOC 后即丢弃代码文本。
+    """
+    lookup: Dict[Tuple[str, str], int] = {}
+    idx = 0
+    with open(tasks_jsonl, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            idx += 1
+            rec = json.loads(line)
+            task_id = str(rec.get("task_id") or f"T{idx:04d}")
+            for i, code in enumerate(_as_list_str(rec.get("bad_code"))):
+                lookup[(task_id, f"b{i+1}")] = count_loc(code)
+    return lookup
+
+
+def iter_pair_units(
+    per_task: Iterable[dict],
+    loc_lookup: Optional[Mapping[Tuple[str, str], int]] = None,
+):
+    """将 per_task 结果展开为 (task_id, bad_id) 抽样单元。
+
+    delta 与 aggregate_dimension_stats 口径一致（good - bad）；
+    未提供 LOC 的单元 loc 记为 -1，length_bucket 记为 unknown。
+    """
+    for item in per_task:
+        task_id = str(item.get("task_id", ""))
+        category = str(item.get("category") or UNKNOWN_CATEGORY)
+        for cmp in item.get("per_bad_comparisons") or []:
+            pairs = _score_pairs(cmp)
+            if not pairs:
+                continue
+            bad_id = str(cmp.get("bad_id", ""))
+            deltas = {name: g - b for name, (g, b) in pairs.items()}
+            mean_abs = sum(abs(v) for v in deltas.values()) / len(deltas)
+            loc = -1
+            if loc_lookup is not None:
+                loc = int(loc_lookup.get((task_id, bad_id), -1))
+            yield {
+                "task_id": task_id,
+                "bad_id": bad_id,
+                "category": category,
+                "mean_abs_delta": round(mean_abs, 6),
+                "loc": loc,
+                "delta_bucket": delta_bucket(mean_abs),
+                "length_bucket": length_bucket(loc) if loc >= 0 else "unknown",
+                "deltas": deltas,
+            }
+
+
+def _ratio_map(names: Sequence[str], ratio: Sequence[float]) -> Dict[str, float]:
+    if len(ratio) != len(names):
+        raise ValueError(f"比例长度应为 {len(names)}，实际为 {len(ratio)}")
+    total = float(sum(ratio))
+    if total <= 0 or any(r < 0 for r in ratio):
+        raise ValueError("比例必须为非负数且总和大于 0")
+    return {n: float(r) / total for n, r in zip(names, ratio)}
+
+
+class ReservoirSampler:
+    """固定容量的蓄水池抽样（Algorithm R）。"""
+
+    def __init__(self, capacity: int, rng: random.Random):
+        self.capacity = max(0, int(capacity))
+        self.rng = rng
+        self.seen = 0
+        self.items: List[dict] = []
+
+    def add(self, item: dict) -> None:
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+            return
+        j = self.rng.randrange(self.seen)
+        if j < self.capacity:
+            self.items[j] = item
+
+
+class StratifiedSampler:
+    """按 (差距桶, 长度桶[, 类别]) 分层的流式抽样器。
+
+    各 (差距桶, 长度桶) 分层的目标样本数 = sample_size × 差距比例 × 长度比例。
+    启用 by_category 时，每个类别拥有与所在分层同容量的蓄水池，结束时在已出现的类别间
+    均分该分层的配额（某类别不足时余量让给其他类别），内存上界为 sample_size × 类别数。
+    某个 (差距桶, 长度桶) 分层的单元不足配额时，缺口不会由其他分层补足：样本总数会小于
+    sample_size，实际比例也会偏离 4:3:1（见直方图的 target / sampled 列）。
+    未知长度（缺少 LOC）的单元只计入直方图，不参与抽样。
+    """
+
+    def __init__(
+        self,
+        sample_size: int,
+        *,
+        delta_ratio: Sequence[float] = DEFAULT_DELTA_RATIO,
+        length_ratio: Sequence[float] = DEFAULT_LENGTH_RATIO,
+        by_category: bool = False,
+        seed: int = 0,
+    ):
+        if sample_size <= 0:
+            raise ValueError("sample_size 必须为正整数")
+        self.sample_size = int(sample_size)
+        self.by_category = by_category
+        self.rng = random.Random(seed)
+        d_share = _ratio_map(DELTA_BUCKETS, delta_ratio)
+        l_share = _ratio_map(LENGTH_BUCKETS, length_ratio)
+        self.targets: Dict[Tuple[str, str], int] = _largest_remainder(
+            {(d, l): self.sample_size * d_share[d] * l_share[l] for d in DELTA_BUCKETS for l in LENGTH_BUCKETS},
+            self.sample_size,
+        )
+        self._reservoirs: Dict[Tuple[str, str, str], ReservoirSampler] = {}
+        self._seen: Dict[Tuple[str, str, str], int] = {}
+
+    def add(self, unit: dict) -> None:
+        d, l = unit["delta_bucket"], unit["length_bucket"]
+        cat = unit.get("category", UNKNOWN_CATEGORY) if self.by_category else "*"
+        key = (d, l, cat)
+        self._seen[key] = self._seen.get(key, 0) + 1
+        target = self.targets.get((d, l))
+        if not target:
+            return
+        res = self._reservoirs.get(key)
+        if res is None:
+            res = self._reservoirs[key] = ReservoirSampler(target, self.rng)
+        res.add(unit)
+
+    def _allocations(self) -> Dict[Tuple[str, str, str], int]:
+        alloc: Dict[Tuple[str, str, str], int] = {}
+        for (d, l), target in self.targets.items():
+            cells = sorted(
+                ((k, r) for k, r in self._reservoirs.items() if k[0] == d and k[1] == l),
+                key=lambda kr: len(kr[1].items),
+            )
+            remaining = target
+            # 从样本最少的类别开始分配，不足部分顺延给后续类别
+            for i, (key, res) in enumerate(cells):
+                share = remaining // (len(cells) - i)
+                take = min(share, len(res.items))
+                alloc[key] = take
+                remaining -= take
+        return alloc
+
+    def samples(self) -> List[dict]:
+        """返回最终样本（按分层顺序）。"""
+        out: List[dict] = []
+        for key, take in sorted(self._allocations().items()):
+            res = self._reservoirs[key]
+            picked = res.items if take >= len(res.items) else self.rng.sample(res.items, take)
+            out.extend(picked)
+        return out
+
+    def histogram(self) -> List[dict]:
+        """返回每个分层的直方图行：seen / target / sampled。"""
+        alloc = self._allocations()
+        keys = set(self._seen) | set(alloc)
+        rows: List[dict] = []
+        for d, l, cat in sorted(keys):
+            rows.append(
+                {
+                    "delta_bucket": d,
+                    "length_bucket": l,
+                    "category": cat,
+                    "seen": self._seen.get((d, l, cat), 0),
+                    "target": self.targets.get((d, l), 0),
+                    "sampled": alloc.get((d, l, cat), 0),
+                }
+            )
+        return rows
+
+
+def _largest_remainder(quotas: Dict[Tuple[str, str], float], total: int) -> Dict[Tuple[str, str], int]:
+    """按最大余数法将浮点配额取整，保证总和等于 total。"""
+    floors = {k: int(v) for k, v in quotas.items()}
+    rest = total - sum(floors.values())
+    for k in sorted(quotas, key=lambda k: quotas[k] - floors[k], reverse=True)[:rest]:
+        floors[k] += 1
+    return floors
+
+
+def stratified_sample(
+    per_task: Iterable[dict],
+    sample_size: int,
+    *,
+    tasks: Optional[Iterable[TaskInput]] = None,
+    delta_ratio: Sequence[float] = DEFAULT_DELTA_RATIO,
+    length_ratio: Sequence[float] = DEFAULT_LENGTH_RATIO,
+    by_category: bool = False,
+    seed: int = 0,
+) -> Tuple[List[dict], List[dict]]:
+    """对 per_task 结果做单次流式分层抽样，返回 (samples, histogram)。
+
+    tasks 用于提供 bad_code 的 LOC；未提供时所有单元长度未知，不会被抽中。
+    """
+    loc_lookup = build_loc_lookup(tasks) if tasks is not None else None
+    sampler = StratifiedSampler(
+        sample_size,
+        delta_ratio=delta_ratio,
+        length_ratio=length_ratio,
+        by_category=by_category,
+        seed=seed,
+    )
+    for unit in iter_pair_units(per_task, loc_lookup):
+        sampler.add(unit)
+    return sampler.samples(), sampler.histogram()
+
+
+def export_stratified_sample(
+    per_task_path: str,
+    tasks_jsonl: str,
+    out_dir: str,
+    sample_size: int,
+    *,
+    delta_ratio: Sequence[float] = DEFAULT_DELTA_RATIO,
+    length_ratio: Sequence[float] = DEFAULT_LENGTH_RATIO,
+    by_category: bool = False,
+    seed: int = 0,
+) -> Tuple[str, str]:
+    """读取 per_task.jsonl 与原始任务 JSONL，导出 sample.jsonl 与 sample_strata.csv。
+
+    两个文件都流式读取：原始任务只保留每个 (task_id, bad_id) 的 LOC，不载入代码。
+    配额不足的分层不会由其他分层补足（见 StratifiedSampler），样本数可能少于 sample_size。
+    返回写入的文件路径。
+    """
+    sampler = StratifiedSampler(
+        sample_size,
+        delta_ratio=delta_ratio,
+        length_ratio=length_ratio,
+        by_category=by_category,
+        seed=seed,
+    )
+    for unit in iter_pair_units(_iter_jsonl(per_task_path), stream_loc_lookup(tasks_jsonl)):
+        sampler.add(unit)
+    samples, hist = sampler.samples(), sampler.histogram()
+    ensure_dir(out_dir)
+    sample_path = os.path.join(out_dir, "sample.jsonl")
+    strata_csv = os.path.join(out_dir, "sample_strata.csv")
+    write_jsonl(sample_path, samples)
+    with open(strata_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(
+            f,
+            fieldnames=["delta_bucket", "length_bucket", "category", "seen", "target", "sampled"],
+        )
+        writer.writeheader()
+        writer.writerows(hist)
+    return sample_path, strata_csv
+
+
+def _parse_ratio(s: str) -> Tuple[float, ...]:
+    return tuple(float(x) for x in s.replace(":", ",").split(",") if x.strip())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="按差距/长度/类别分层抽样 per_task 结果")
+    parser.add_argument("per_task", help="per_task.jsonl 路径")
+    parser.add_argument("tasks", help="原始任务 JSONL 路径（用于计算 LOC）")
+    parser.add_argument("--out-dir", default="outputs/sample", help="输出目录")
+    parser.add_argument("--size", type=int, default=1000, help="目标样本总数")
+    parser.add_argument("--delta-ratio", default="4:3:1", help="差距桶比例 大:中:小")
+    parser.add_argument("--length-ratio", default="1:1:1", help="长度桶比例 短:中:长")
+    parser.add_argument("--by-category", action="store_true", help="按 category 字段进一步分层")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+
+    sample_path, strata_csv = export_stratified_sample(
+        args.per_task,
+        args.tasks,
+        args.out_dir,
+        args.size,
+        delta_ratio=_parse_ratio(args.delta_ratio),
+        length_ratio=_parse_ratio(args.length_ratio),
+        by_category=args.by_category,
+        seed=args.seed,
+    )
+    print(f"✓ 样本: {sample_path}")
+    print(f"✓ 分层直方图: {strata_csv}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,247 @@
+"""并发分析的任务调度：优先级、按估算 token 排序与慢请求的推测执行。
+
+按输入顺序一次性提交全部任务时，文件末尾的几个超大任务决定总耗时，紧急重跑的任务也要排在
+批量任务之后。TaskScheduler 替代这种提交方式（见 analyze.per_task._analyze_tasks_concurrent）：
+
+- 优先级：TaskInput.priority 越大越先派发（输入记录的 priority 字段，默认 0）；
+- 同一优先级内按估算 token（packing.estimate_task_cost）排序：
+  sjf 短任务优先（默认，单任务平均等待最短），lpt 长任务优先（大任务不会压在最后，配合推测执行），
+  fifo 保持输入顺序；
+- 推测执行：对运行时间超过阈值的请求再派发一份副本（MultiVLLMClient 时发往在途请求最少的实例），
+  先成功完成的一份生效，另一份的结果丢弃。副本只在它决定总耗时时才先于排队的单元占用空闲线程：
+  其预计耗时不短于剩余队列的预计耗时（大任务被慢实例拖住、或已到队尾）。
+  已完成任务的耗时按“固定开销 + 每 token 耗时 × 估算 token”做最小二乘拟合（累计和，O(1) 更新），
+  得到任务的预计耗时；阈值 = 预计耗时 × 最近完成任务“实际 / 预计”之比的 speculate_quantile 分位数
+  （如 0.5 取中位数）× speculate_multiplier。模型每完成 _REFIT_EVERY 个任务重拟合一次。
+
+同时在途的请求（含被放弃、仍在运行的副本）不超过 max_workers，副本不会挤占后端容量。
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .packing import estimate_task_cost
+from .telemetry import get_telemetry
+
+SCHEDULE_ORDERS = ("sjf", "lpt", "fifo")
+
+# 拟合耗时模型所需的最少已完成任务数
+_MIN_SAMPLES = 8
+# 计算“实际 / 预计”比值分位数时使用的最近完成任务数
+_RATIO_WINDOW = 512
+# 每完成这么多个任务重拟合一次耗时模型
+_REFIT_EVERY = 8
+# 推测执行阶段等待完成的最长轮询间隔（秒）
+_MAX_POLL_S = 1.0
+
+
+def _unit_tasks(unit) -> list:
+    """工作单元包含的任务（打包模式下单元为任务列表）。"""
+    return unit if isinstance(unit, list) else [unit]
+
+
+def unit_priority(unit) -> int:
+    """工作单元的优先级（打包单元取其中最高的）。"""
+    return max((getattr(t, "priority", 0) or 0 for t in _unit_tasks(unit)), default=0)
+
+
+def unit_cost(unit) -> int:
+    """工作单元的估算 token 数（输入 + 预计输出）。"""
+    return max(1, sum(estimate_task_cost(t) for t in _unit_tasks(unit)))
+
+
+def _plan(units: List, order: str) -> List[Tuple[int, object]]:
+    if order not in SCHEDULE_ORDERS:
+        raise ValueError(f"未知的调度顺序: {order}（可选 {', '.join(SCHEDULE_ORDERS)}）")
+    keyed = []
+    for i, unit in enumerate(units):
+        cost = unit_cost(unit)
+        size_key = {"sjf": cost, "lpt": -cost, "fifo": 0}[order]
+        keyed.append(((-unit_priority(unit), size_key, i), cost, unit))
+    keyed.sort(key=lambda item: item[0])
+    return [(cost, unit) for _, cost, unit in keyed]
+
+
+def order_units(units: List, order: str = "sjf") -> List:
+    """按调度顺序排列工作单元：优先级高的在前，同优先级内按 order（sjf / lpt / fifo）。"""
+    return [unit for _, unit in _plan(units, order)]
+
+
+def _succeeded(future: Future) -> bool:
+    """请求是否得到了可用结果（打包单元至少一个任务成功）。"""
+    if future.exception() is not None:
+        return False
+    result = future.result()
+    if isinstance(result, list):
+        return any(r is not None for r in result)
+    return result is not None
+
+
+class _Job:
+    __slots__ = ("unit", "cost", "futures", "started", "speculated", "done")
+
+    def __init__(self, unit, cost: int):
+        self.unit = unit
+        self.cost = cost
+        self.futures: List[Future] = []
+        self.started = 0.0
+        self.speculated = False
+        self.done = False
+
+
+class TaskScheduler:
+    """按优先级与估算 token 派发工作单元，并对慢请求做推测执行。
+
+    用法::
+
+        scheduler = TaskScheduler(max_workers=8, order="lpt", speculate_quantile=0.5)  # 开启推测执行
+        for unit, future in scheduler.run(units, client, run_fn):
+            ...  # future 已完成；推测执行时为先成功完成的一份
+
+    run_fn(queued_at, unit, model) 在工作线程中执行一个单元，queued_at 为开始调度的时刻
+    （perf_counter，用于记录排队时间）。speculate_quantile 默认 None，不做推测执行：
+    副本会向共享的后端重复发送请求，且落后的一份无法取消，需显式开启。
+    默认 sjf：不做推测执行时总耗时与平均完成时间都最短（benchmarks schedule 套件）；lpt 让大任务
+    最先派发，只在开启推测执行、慢实例拖住大任务时才有优势。
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        *,
+        order: str = "sjf",
+        speculate_quantile: Optional[float] = None,
+        speculate_multiplier: float = 1.5,
+        min_samples: int = _MIN_SAMPLES,
+    ):
+        if order not in SCHEDULE_ORDERS:
+            raise ValueError(f"未知的调度顺序: {order}（可选 {', '.join(SCHEDULE_ORDERS)}）")
+        self.max_workers = max(1, max_workers)
+        self.order = order
+        self.speculate_quantile = speculate_quantile
+        self.speculate_multiplier = speculate_multiplier
+        self.min_samples = min_samples
+        self.speculated = 0
+        self.speculative_wins = 0
+        # 已完成任务数与 (估算 token, 耗时) 的累计和 [Σc, Σd, Σc², Σcd]，供最小二乘 O(1) 更新
+        self._n = 0
+        self._sums = [0.0, 0.0, 0.0, 0.0]
+        self._recent: deque = deque(maxlen=_RATIO_WINDOW)  # 最近完成任务的 (估算 token, 耗时)
+        self._model: Optional[Tuple[int, float, float, float]] = None  # (样本数, 开销, 每 token, 比值分位数)
+
+    def _record(self, cost: int, duration: float) -> None:
+        """记录一个已完成任务的估算 token 与耗时。"""
+        self._n += 1
+        sums = self._sums
+        sums[0] += cost
+        sums[1] += duration
+        sums[2] += cost * cost
+        sums[3] += cost * duration
+        self._recent.append((cost, duration))
+
+    def _fit(self) -> Optional[Tuple[float, float, float]]:
+        """拟合耗时模型，返回 (固定开销秒数, 每 token 秒数, 实际/预计比值的分位数)；样本不足时为 None。
+
+        回归用全部样本的累计和，比值分位数取最近 _RATIO_WINDOW 个任务；距上次拟合不足
+        _REFIT_EVERY 个新样本时沿用上次结果。
+        """
+        n = self._n
+        if self.speculate_quantile is None or n < self.min_samples:
+            return None
+        if self._model is not None and n - self._model[0] < _REFIT_EVERY:
+            return self._model[1:]
+        sx, sy, sxx, sxy = self._sums
+        denom = n * sxx - sx * sx
+        slope = max(0.0, (n * sxy - sx * sy) / denom) if denom > 0 else 0.0
+        base = (sy - slope * sx) / n
+        if base < 0:  # 过原点拟合
+            base, slope = 0.0, sxy / sxx
+        ratios = sorted(d / max(base + slope * c, 1e-9) for c, d in self._recent)
+        ratio = ratios[min(len(ratios) - 1, int(self.speculate_quantile * len(ratios)))]
+        self._model = (n, base, slope, ratio)
+        return base, slope, ratio
+
+    def _deadline(self, job: "_Job", fit: Tuple[float, float, float]) -> float:
+        """job 被判定为慢请求的时刻（perf_counter）。"""
+        base, slope, ratio = fit
+        return job.started + (base + slope * job.cost) * ratio * self.speculate_multiplier
+
+    def _backlog_s(self, fit: Tuple[float, float, float], queued: int, queued_cost: int) -> float:
+        """待派发单元全部跑完的预计耗时（按 max_workers 并行）。"""
+        base, slope, _ = fit
+        return (base * queued + slope * queued_cost) / self.max_workers
+
+    def run(self, units: List, model, run_fn: Callable) -> Iterator[Tuple[object, Future]]:
+        """派发全部单元，按完成顺序产出 (unit, future)。"""
+        plan = _plan(list(units), self.order)
+        # 推测副本优先发往空闲实例（MultiVLLMClient.idle_view），普通客户端沿用原客户端
+        spec_model = model.idle_view() if hasattr(model, "idle_view") else model
+        registry = get_telemetry().registry
+        queued_at = time.perf_counter()
+        owner: dict = {}  # future -> _Job
+        running: List[_Job] = []
+        next_index = 0
+        queued_cost = sum(cost for cost, _ in plan)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        def _launch(job: _Job, target) -> None:
+            future = executor.submit(run_fn, queued_at, job.unit, target)
+            job.futures.append(future)
+            owner[future] = job
+
+        try:
+            while next_index < len(plan) or running:
+                # 1) 慢请求的副本优先占用空闲线程（先启动的优先）。只复制位于关键路径上的慢请求：
+                #    副本的预计耗时不短于剩余队列的预计耗时，否则它不决定总耗时，线程留给队列
+                timeout = None
+                fit = self._fit()
+                if fit is not None:
+                    now = time.perf_counter()
+                    backlog = self._backlog_s(fit, len(plan) - next_index, queued_cost)
+                    for job in running:
+                        if job.speculated:
+                            continue
+                        remaining = self._deadline(job, fit) - now
+                        if remaining > 0:
+                            timeout = remaining if timeout is None else min(timeout, remaining)
+                        elif len(owner) < self.max_workers and fit[0] + fit[1] * job.cost >= backlog:
+                            job.speculated = True
+                            self.speculated += 1
+                            registry.inc("scheduler_speculative_total", outcome="launched")
+                            _launch(job, spec_model)
+                    if timeout is not None:
+                        timeout = min(max(timeout, 0.01), _MAX_POLL_S)
+
+                # 2) 按计划顺序填满其余空闲线程
+                while next_index < len(plan) and len(owner) < self.max_workers:
+                    cost, unit = plan[next_index]
+                    next_index += 1
+                    queued_cost -= cost
+                    job = _Job(unit, cost)
+                    job.started = time.perf_counter()
+                    _launch(job, model)
+                    running.append(job)
+
+                # 3) 收集完成的请求；同一单元先成功的一份生效
+                done, _ = wait(list(owner), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = owner.pop(future)
+                    if job.done:
+                        continue  # 另一份已生效，丢弃落后副本的结果
+                    if not _succeeded(future) and not all(f.done() for f in job.futures):
+                        continue  # 失败，但另一份仍在运行
+                    job.done = True
+                    running.remove(job)
+                    if future is not job.futures[0]:
+                        self.speculative_wins += 1
+                        registry.inc("scheduler_speculative_total", outcome="won")
+                    self._record(job.cost, time.perf_counter() - job.started)
+                    yield job.unit, future
+        finally:
+            # 落后副本无法中断，不等待其结束；结果已丢弃
+            executor.shutdown(wait=False, cancel_futures=True)
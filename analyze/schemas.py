@@ -23,6 +23,8 @@ class Dimension(str, Enum):
 class BadCode:
     bad_id: str
     code: str
+    # 合成 Hard Negative 的缺陷标签（见 clean/README.md §10）；真实坏例为空列表
+    defect_tags: List[str] = field(default_factory=list)
 
 
 @dataclass
@@ -32,6 +34,8 @@ class TaskInput:
     prompt: str
     good_code: str
     bad_codes: List[BadCode] = field(default_factory=list)
+    # 调度优先级：越大越先派发（紧急重跑的任务设为正数，见 analyze/scheduling.py）
+    priority: int = 0
 
 
 @dataclass
@@ -87,6 +91,8 @@ class ModelOutput:
     # 新增：任务级别的正向模式，仅生成一次（对应用户需求）。
     positive_patterns: List[str] = field(default_factory=list)
     task_level_agg: Optional[TaskLevelAggregation] = None
+    # 输入任务的语言（非模型输出，由 analyze_task 附加），用于按语言分组聚合
+    language: Optional[str] = None
 
 
 # Lightweight helpers for later (placeholders, to be implemented as needed)
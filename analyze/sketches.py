@@ -0,0 +1,155 @@
+"""流式近似计数草图：Space-Saving（Top-K 重击者）、Count-Min、HyperLogLog。
+
+用于关键词 / 模式的近似聚合模式（见 aggregate.py）：不同短语可能有数百万个，
+精确模式要为每个 (phrase, dimension) 保存权重与任务 ID 集合；近似模式内存只与容量有关。
+
+误差保证（权重均为非负）：
+- SpaceSaving：对被监控的键，估计值 ≥ 真值 ≥ 估计值 - error；未被监控的键真值 ≤ 当前最小计数；
+  键的 HLL 成员数最多高估继承成员数（替换时从被替换键沿用的部分）；
+- CountMinSketch：估计值 ≥ 真值，且以概率 1 - e^-depth 有 估计值 - 真值 ≤ (e / width) · 总权重；
+- HyperLogLog：基数估计的相对标准误差约为 1.04 / sqrt(2^p)。
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+import hashlib
+import heapq
+import math
+
+
+def _hash64(s: str) -> int:
+    """稳定的 64 位哈希（跨进程一致，不受 PYTHONHASHSEED 影响）。"""
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """HyperLogLog 基数估计；p 为寄存器位数（2^p 个寄存器，每个 1 字节）。"""
+
+    __slots__ = ("p", "m", "registers")
+
+    def __init__(self, p: int = 8):
+        if not 4 <= p <= 16:
+            raise ValueError("p 需在 4..16 之间")
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value: str) -> None:
+        h = _hash64(value)
+        idx = h >> (64 - self.p)
+        rest = (h << self.p) & 0xFFFFFFFFFFFFFFFF
+        rank = (64 - self.p + 1) if rest == 0 else (65 - rest.bit_length())
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """并入另一个 HLL（求并集的基数）。"""
+        if other.p != self.p:
+            raise ValueError("HyperLogLog 精度不一致，无法合并")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        est = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if est <= 2.5 * m and zeros:
+            est = m * math.log(m / zeros)  # 小基数修正（线性计数）
+        return int(round(est))
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+
+class CountMinSketch:
+    """Count-Min 草图：depth 行 × width 列，估计值为各行计数的最小值（只会高估）。"""
+
+    def __init__(self, width: int = 1 << 16, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.total = 0.0
+        self.table = [array("d", bytes(8 * width)) for _ in range(depth)]
+
+    def _cells(self, key: str) -> Iterator[Tuple[array, int]]:
+        h = _hash64(key)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i, row in enumerate(self.table):
+            yield row, (h1 + i * h2) % self.width
+
+    def add(self, key: str, weight: float = 1.0) -> None:
+        self.total += weight
+        h = _hash64(key)
+        h1, h2, w = h & 0xFFFFFFFF, (h >> 32) | 1, self.width
+        for i, row in enumerate(self.table):
+            row[(h1 + i * h2) % w] += weight
+
+    def estimate(self, key: str) -> float:
+        return min(row[j] for row, j in self._cells(key))
+
+    @property
+    def error_bound(self) -> float:
+        """以概率 1 - e^-depth 成立的绝对误差上界。"""
+        return math.e / self.width * self.total
+
+
+class SpaceSaving:
+    """加权 Space-Saving：最多监控 capacity 个键，每个键带 (计数, 误差, HLL, 继承成员数)。
+
+    新键到来且已满时，替换当前计数最小的键：新键计数 = 最小计数 + 权重，误差 = 最小计数；
+    新键沿用被替换键的 HLL，继承成员数记为替换时该 HLL 的估计值（HLL 基数因此最多高估这么多）。
+    最小计数用惰性小顶堆维护：每个键在堆中恰有一个条目，计数增加时不更新堆；
+    弹出时若条目已过期（计数只增不减，堆中值 ≤ 实际值）则按实际计数重新入堆。
+    """
+
+    def __init__(self, capacity: int, hll_p: int = 8):
+        if capacity <= 0:
+            raise ValueError("capacity 必须为正数")
+        self.capacity = capacity
+        self.hll_p = hll_p
+        # key -> [count, error, hll, inherited]
+        self.entries: Dict[Hashable, list] = {}
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._seq = 0
+        self.total = 0.0
+
+    def _pop_min(self) -> Tuple[Hashable, list]:
+        while True:
+            count, _, key = heapq.heappop(self._heap)
+            entry = self.entries[key]
+            if entry[0] == count:
+                return key, self.entries.pop(key)
+            self._seq += 1
+            heapq.heappush(self._heap, (entry[0], self._seq, key))
+
+    def add(self, key: Hashable, weight: float = 1.0, member: Optional[str] = None) -> None:
+        """累计 key 的权重；member（如 task_id）计入该键的 HLL。"""
+        self.total += weight
+        entry = self.entries.get(key)
+        if entry is None:
+            if len(self.entries) < self.capacity:
+                entry = [0.0, 0.0, HyperLogLog(self.hll_p), 0]
+            else:
+                _, evicted = self._pop_min()
+                # 复用被替换键的 HLL（随计数一起继承，与计数同样只高估），记下继承的成员数作为误差
+                entry = [evicted[0], evicted[0], evicted[2], evicted[2].count()]
+            self.entries[key] = entry
+            self._seq += 1
+            heapq.heappush(self._heap, (entry[0] + weight, self._seq, key))
+        entry[0] += weight
+        if member is not None:
+            entry[2].add(member)
+
+    @property
+    def min_count(self) -> float:
+        """未被监控的键的真值上界。"""
+        if len(self.entries) < self.capacity:
+            return 0.0
+        return min(e[0] for e in self.entries.values())
+
+    def items(self) -> Iterator[Tuple[Hashable, float, float, HyperLogLog, int]]:
+        """(key, 估计计数, 误差上界, HLL, 继承成员数)，按估计计数降序。"""
+        for key, (count, err, hll, inherited) in sorted(self.entries.items(), key=lambda kv: -kv[1][0]):
+            yield key, count, err, hll, inherited
@@ -0,0 +1,153 @@
+"""维度差的统计推断：Bootstrap 置信区间与配对检验。
+
+agg_dimension.csv 的 avg_of_means 等列只是点估计，维度之间的小差异是否可信无从判断。
+本模块在“任务 × 维度”的逐任务 delta 矩阵上做向量化重采样（NumPy）：
+- Bootstrap 百分位置信区间：avg_of_means 与 avg_consistency；
+- 配对符号翻转置换检验：H0 为同一任务内好 / 坏代码在该维度无差异（delta 关于 0 对称），
+  输出双侧 p 值与效应量 dz = 均值 / 标准差。
+
+重采样按块进行：每块生成 (块大小 × 任务数) 的重采样计数矩阵，用一次矩阵乘法
+同时得到所有维度的重采样均值，内存与块大小成正比，10 万任务 × 2000 次重采样约数秒。
+numpy 在函数内导入，不影响 `import analyze` 的速度。
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence
+
+
+# 每块重采样矩阵的目标元素数（float64 约 32 MB）
+_CHUNK_ELEMENTS = 4_000_000
+
+STAT_FIELDS = [
+    "avg_of_means_ci_low",
+    "avg_of_means_ci_high",
+    "avg_consistency_ci_low",
+    "avg_consistency_ci_high",
+    "effect_size",
+    "p_value",
+]
+
+
+def _chunks(total: int, n: int):
+    size = max(1, min(total, _CHUNK_ELEMENTS // max(1, n)))
+    done = 0
+    while done < total:
+        c = min(size, total - done)
+        yield c
+        done += c
+
+
+def _nan_percentile_columns(samples, q: List[float]):
+    """逐列忽略 NaN 的分位数；全为 NaN 的列结果为 NaN（不触发 numpy 的警告）。"""
+    import numpy as np
+
+    out = np.full((len(q), samples.shape[1]), np.nan)
+    has = ~np.isnan(samples).all(axis=0)
+    if has.any():
+        out[:, has] = np.nanpercentile(samples[:, has], q, axis=0)
+    return out
+
+
+def bootstrap_dimension_stats(
+    task_means: Dict[str, Sequence[float]],
+    task_consistency: Dict[str, Sequence[float]],
+    *,
+    n_resamples: int = 2000,
+    confidence: float = 0.95,
+    seed: Optional[int] = 0,
+) -> Dict[str, dict]:
+    """对每个维度计算 Bootstrap 置信区间与配对检验 p 值。
+
+    Args:
+        task_means: 维度 -> 逐任务的平均 delta（good - bad），各维度按任务对齐，缺失为 NaN
+        task_consistency: 维度 -> 逐任务的一致性（|delta| ≥ 2 的比例），与 task_means 对齐
+        n_resamples: 重采样 / 置换次数
+        confidence: 置信水平
+        seed: 随机种子（None 为不固定）
+
+    Returns:
+        维度 -> {STAT_FIELDS 中各列}；某维度无有效任务时各列为 None。
+        所有维度共用同一组任务重采样（配对重采样），维度之间的区间可直接比较。
+    """
+    import numpy as np
+
+    dims = list(task_means)
+    empty = {k: None for k in STAT_FIELDS}
+    if not dims:
+        return {}
+    X = np.column_stack([np.asarray(task_means[d], dtype=np.float64) for d in dims])
+    K = np.column_stack([np.asarray(task_consistency[d], dtype=np.float64) for d in dims])
+    n, d = X.shape
+    if n == 0 or n_resamples <= 0:
+        return {name: dict(empty) for name in dims}
+
+    mask = ~np.isnan(X)
+    counts = mask.sum(axis=0).astype(np.float64)
+    X0 = np.where(mask, X, 0.0)
+    K0 = np.where(mask, np.nan_to_num(K), 0.0)
+    # [delta | consistency | mask]：一次矩阵乘法得到三者的重采样加权和
+    stacked = np.hstack([X0, K0, mask.astype(np.float64)])
+
+    total = X0.sum(axis=0)
+    rng = np.random.default_rng(seed)
+    boot_means = np.empty((n_resamples, d))
+    boot_cons = np.empty((n_resamples, d))
+    null_stats = np.empty((n_resamples, d))
+    pos = 0
+    for c in _chunks(n_resamples, n):
+        # 多项式重采样：每行 n 次有放回抽样，用 bincount 转为每个任务被抽中的次数
+        idx = rng.integers(0, n, size=(c, n), dtype=np.int64)
+        idx += (np.arange(c, dtype=np.int64) * n)[:, None]
+        weights = np.bincount(idx.ravel(), minlength=c * n).reshape(c, n).astype(np.float64)
+        sums = weights @ stacked
+        with np.errstate(invalid="ignore", divide="ignore"):
+            boot_means[pos:pos + c] = sums[:, :d] / sums[:, 2 * d:]
+            boot_cons[pos:pos + c] = sums[:, d:2 * d] / sums[:, 2 * d:]
+        # 符号翻转：H0 下每个任务的 delta 以相同概率取正负；
+        # Σ s_i·x_i = 2·Σ_{s_i=+1} x_i - Σ x_i，随机位由打包字节展开得到
+        bits = np.unpackbits(rng.integers(0, 256, size=(c, (n + 7) // 8), dtype=np.uint8), axis=1)[:, :n]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            null_stats[pos:pos + c] = (2.0 * (bits.astype(np.float64) @ X0) - total) / counts
+        pos += c
+
+    alpha = (1.0 - confidence) / 2.0
+    q = [100 * alpha, 100 * (1 - alpha)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        obs = total / counts
+        exceed = (np.abs(null_stats) >= np.abs(obs) - 1e-12).sum(axis=0)
+        p_values = (exceed + 1.0) / (n_resamples + 1.0)
+    # nanpercentile / nanstd 遇到全 NaN 列（无评分的维度）或不足 2 个有效值时会发出 RuntimeWarning，
+    # errstate 无法屏蔽，因此只对有足够有效值的列计算，其余保持 NaN
+    mean_ci = _nan_percentile_columns(boot_means, q)
+    cons_ci = _nan_percentile_columns(boot_cons, q)
+    std = np.full(d, np.nan)
+    multi = counts > 1
+    if multi.any():
+        std[multi] = np.nanstd(np.where(mask, X, np.nan)[:, multi], axis=0, ddof=1)
+
+    out: Dict[str, dict] = {}
+    for j, name in enumerate(dims):
+        if counts[j] == 0:
+            out[name] = dict(empty)
+            continue
+        effect = obs[j] / std[j] if std[j] and np.isfinite(std[j]) else None
+        out[name] = {
+            "avg_of_means_ci_low": round(float(mean_ci[0, j]), 6),
+            "avg_of_means_ci_high": round(float(mean_ci[1, j]), 6),
+            "avg_consistency_ci_low": round(float(cons_ci[0, j]), 6),
+            "avg_consistency_ci_high": round(float(cons_ci[1, j]), 6),
+            "effect_size": round(float(effect), 6) if effect is not None else None,
+            "p_value": round(float(p_values[j]), 6),
+        }
+    return out
+
+
+def significance_marker(p_value, levels: Sequence[float] = (0.001, 0.01, 0.05)) -> str:
+    """p 值 -> 星号标记（*** / ** / * / 空串），用于表格与图表标注。"""
+    try:
+        p = float(p_value)
+    except (TypeError, ValueError):
+        return ""
+    stars: List[str] = [s for s, level in zip(("***", "**", "*"), levels) if p < level]
+    return stars[0] if stars else ""
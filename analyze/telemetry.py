@@ -0,0 +1,444 @@
+"""LLM 调用遥测：逐次尝试的延迟 / token / 重试记录与进程内直方图。
+
+call_model 的每次尝试（含重试）产生一条记录：
+    backend      实际处理请求的 vLLM 实例 URL（MultiVLLMClient 选中的实例，或单客户端的 base_url）
+    queue_wait_s 任务提交到线程池至开始执行的等待时间（并发模式）
+    ttfb_s       首个 token 到达时间（仅流式请求可测，否则为 None）
+    latency_s    请求总耗时
+    prompt_tokens / completion_tokens   响应 usage 字段
+    attempt      第几次尝试（0 起）
+    outcome      ok / json_block（需从前后缀中提取 JSON）/ invalid_json / error
+
+记录写入结构化 JSONL（configure_telemetry 指定路径时），并汇总到 MetricsRegistry：
+按 backend 分组的延迟直方图与 token 计数器，用于打印 p50/p95/p99 与 tokens/s，
+据此调整 max_workers 与 vLLM 的 --max-num-seqs。
+
+同一注册表还记录任务完成 / 失败数、各 backend 在途请求数、缓存命中与阶段耗时；
+start_metrics_server 在守护线程中提供 Prometheus 文本格式的 /metrics 端点。
+抓取时只在锁内复制数值快照，格式化在锁外进行，不会阻塞工作线程。
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+import bisect
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .io_utils import ensure_dir
+
+
+# 直方图桶：1ms ~ 1h，相邻边界相差 5%（分位数相对误差 ≤ 5%）
+_BUCKET_GROWTH = 1.05
+_BUCKET_BOUNDS: Tuple[float, ...] = tuple(
+    0.001 * _BUCKET_GROWTH ** i for i in range(int(math.log(3600 / 0.001, _BUCKET_GROWTH)) + 2)
+)
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """固定几何桶的直方图：内存恒定，分位数按桶内线性插值。"""
+
+    __slots__ = ("bounds", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, bounds: Tuple[float, ...] = _BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else self.max
+                value = lo + (hi - lo) * (rank - seen) / c
+                return min(max(value, self.min), self.max)
+            seen += c
+        return self.max
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表：按 (名称, 标签) 区分的计数器与直方图。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[_LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[_LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[_LabelKey, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def add_gauge(self, name: str, delta: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.gauges.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + delta
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    def counter_value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self.counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        with self._lock:
+            return self.histograms.get(name, {}).get(_label_key(labels))
+
+    def snapshot(self) -> dict:
+        """锁内复制全部数值（直方图只复制桶计数），供抓取端在锁外格式化。"""
+        with self._lock:
+            return {
+                "counters": {n: dict(series) for n, series in self.counters.items()},
+                "gauges": {n: dict(series) for n, series in self.gauges.items()},
+                "histograms": {
+                    n: {k: (list(h.counts), h.count, h.sum, h.bounds) for k, h in series.items()}
+                    for n, series in self.histograms.items()
+                },
+            }
+
+    def label_values(self, name: str, label: str) -> List[str]:
+        """某指标出现过的某个标签的全部取值（计数器与直方图合并）。"""
+        values = set()
+        with self._lock:
+            for series in (self.counters.get(name, {}), self.histograms.get(name, {})):
+                for key in series:
+                    values.update(v for k, v in key if k == label)
+        return sorted(values)
+
+
+class Telemetry:
+    """LLM 尝试记录的汇聚点：写 JSONL 并更新注册表。
+
+    Args:
+        metrics_path: 指标 JSONL 路径（None 时只更新内存注册表）
+        measure_ttfb: 为 True 时 call_model 使用流式请求以测量首 token 时间
+    """
+
+    def __init__(self, metrics_path: Optional[str] = None, *, measure_ttfb: bool = False):
+        self.registry = MetricsRegistry()
+        self.metrics_path = metrics_path
+        self.measure_ttfb = measure_ttfb
+        self._lock = threading.Lock()
+        self._file = None
+        # backend -> [首次尝试开始, 最后一次尝试结束]（墙钟时间，用于计算吞吐）
+        self._spans: Dict[str, List[float]] = {}
+        if metrics_path:
+            ensure_dir(os.path.dirname(metrics_path) or ".")
+            self._file = open(metrics_path, "a", encoding="utf-8", buffering=1)
+
+    def record(self, rec: dict) -> None:
+        backend = rec.get("backend") or "default"
+        reg = self.registry
+        reg.inc("llm_attempts_total", backend=backend, outcome=rec.get("outcome", "unknown"))
+        if rec.get("attempt", 0) > 0:
+            reg.inc("llm_retries_total", backend=backend)
+        reg.observe("llm_latency_seconds", rec["latency_s"], backend=backend)
+        if rec.get("ttfb_s") is not None:
+            reg.observe("llm_ttfb_seconds", rec["ttfb_s"], backend=backend)
+        if rec.get("queue_wait_s") is not None and rec.get("attempt", 0) == 0:
+            reg.observe("llm_queue_wait_seconds", rec["queue_wait_s"], backend=backend)
+        reg.inc("llm_prompt_tokens_total", rec.get("prompt_tokens") or 0, backend=backend)
+        reg.inc("llm_completion_tokens_total", rec.get("completion_tokens") or 0, backend=backend)
+        end = rec["ts"] + rec["latency_s"]
+        with self._lock:
+            span = self._spans.setdefault(backend, [rec["ts"], end])
+            span[0] = min(span[0], rec["ts"])
+            span[1] = max(span[1], end)
+            if self._file is not None:
+                self._file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def summary(self) -> List[dict]:
+        """按 backend 汇总：请求数、成功率、延迟分位数与吞吐（completion tokens / 活跃墙钟时间）。"""
+        reg = self.registry
+        rows = []
+        for backend in reg.label_values("llm_latency_seconds", "backend"):
+            hist = reg.histogram("llm_latency_seconds", backend=backend)
+            if hist is None:
+                continue
+            outcomes = {
+                o: reg.counter_value("llm_attempts_total", backend=backend, outcome=o)
+                for o in ("ok", "json_block", "invalid_json", "error")
+            }
+            completion = reg.counter_value("llm_completion_tokens_total", backend=backend)
+            with self._lock:
+                start, end = self._spans.get(backend, (0.0, 0.0))
+            wall = max(end - start, 1e-9)
+            qw = reg.histogram("llm_queue_wait_seconds", backend=backend)
+            ttfb = reg.histogram("llm_ttfb_seconds", backend=backend)
+            rows.append(
+                {
+                    "backend": backend,
+                    "attempts": hist.count,
+                    "ok": int(outcomes["ok"] + outcomes["json_block"]),
+                    "invalid_json": int(outcomes["invalid_json"]),
+                    "errors": int(outcomes["error"]),
+                    "retries": int(reg.counter_value("llm_retries_total", backend=backend)),
+                    "p50_s": hist.quantile(0.50),
+                    "p95_s": hist.quantile(0.95),
+                    "p99_s": hist.quantile(0.99),
+                    "ttfb_p50_s": ttfb.quantile(0.50) if ttfb else None,
+                    "queue_wait_p50_s": qw.quantile(0.50) if qw else None,
+                    "prompt_tokens": int(reg.counter_value("llm_prompt_tokens_total", backend=backend)),
+                    "completion_tokens": int(completion),
+                    "tokens_per_s": completion / wall,
+                }
+            )
+        return rows
+
+    def print_summary(self) -> List[dict]:
+        rows = self.summary()
+        if not rows:
+            return rows
+
+        def _ms(v) -> str:
+            return "-" if v is None else f"{v * 1000:.0f}"
+
+        print("   LLM 调用统计（延迟单位 ms）:")
+        print(f"   {'backend':<32} {'尝试':>6} {'成功':>6} {'重试':>5} {'p50':>7} {'p95':>7} {'p99':>7} {'TTFB50':>7} {'排队50':>7} {'tok/s':>8}")
+        for r in rows:
+            print(
+                f"   {r['backend'][:32]:<32} {r['attempts']:>6} {r['ok']:>6} {r['retries']:>5} "
+                f"{_ms(r['p50_s']):>7} {_ms(r['p95_s']):>7} {_ms(r['p99_s']):>7} "
+                f"{_ms(r['ttfb_p50_s']):>7} {_ms(r['queue_wait_p50_s']):>7} {r['tokens_per_s']:>8.1f}"
+            )
+        return rows
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_TELEMETRY = Telemetry()
+_LOCAL = threading.local()
+
+
+def get_telemetry() -> Telemetry:
+    """当前进程的遥测实例（默认只记内存，不写文件）。"""
+    return _TELEMETRY
+
+
+def configure_telemetry(metrics_path: Optional[str] = None, *, measure_ttfb: bool = False) -> Telemetry:
+    """替换进程级遥测实例（关闭旧实例的文件），返回新实例。"""
+    global _TELEMETRY
+    old = _TELEMETRY
+    _TELEMETRY = Telemetry(metrics_path, measure_ttfb=measure_ttfb)
+    old.close()
+    return _TELEMETRY
+
+
+def set_queue_wait(seconds: Optional[float]) -> None:
+    """由线程池工作函数调用：记录当前任务的排队时间，随后的尝试记录都会带上。"""
+    _LOCAL.queue_wait = seconds
+
+
+def note_backend(url: str) -> None:
+    """由 MultiVLLMClient 在选定实例后调用：标记当前线程这次请求的 backend。"""
+    _LOCAL.backend = url
+
+
+def _backend_of(model) -> str:
+    return getattr(_LOCAL, "backend", None) or backend_of(model)
+
+
+def record_attempt(
+    model,
+    *,
+    attempt: int,
+    started: float,
+    latency_s: float,
+    outcome: str,
+    response=None,
+    ttfb_s: Optional[float] = None,
+    error: Optional[str] = None,
+    usage=None,
+) -> dict:
+    """构造并提交一条尝试记录（由 llm_runner 调用）。"""
+    usage = usage if usage is not None else getattr(response, "usage", None)
+    rec = {
+        "ts": started,
+        "backend": _backend_of(model),
+        "attempt": attempt,
+        "queue_wait_s": getattr(_LOCAL, "queue_wait", None),
+        "ttfb_s": ttfb_s,
+        "latency_s": latency_s,
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "outcome": outcome,
+    }
+    if error:
+        rec["error"] = error
+    _LOCAL.backend = None
+    _TELEMETRY.record(rec)
+    return rec
+
+
+@contextmanager
+def in_flight(backend: str):
+    """在途请求计数：进入时 +1，退出时 -1（按 backend 标签）。"""
+    reg = _TELEMETRY.registry
+    reg.add_gauge("llm_in_flight", 1, backend=backend)
+    try:
+        yield
+    finally:
+        reg.add_gauge("llm_in_flight", -1, backend=backend)
+
+
+def backend_of(model) -> str:
+    """单客户端的 backend 标识（base_url）；无法识别时为 "default"。"""
+    base_url = getattr(model, "base_url", None)
+    return str(base_url) if base_url else "default"
+
+
+def count_cache(cache: str, hit: bool) -> None:
+    """记录一次缓存查询（如 wordcloud、batch_render）。"""
+    _TELEMETRY.registry.inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+# ------------------------------------------------------------------ Prometheus
+_HELP = {
+    "llm_attempts_total": ("counter", "LLM 请求尝试次数（按解析结果）"),
+    "llm_retries_total": ("counter", "LLM 重试次数"),
+    "llm_prompt_tokens_total": ("counter", "prompt tokens"),
+    "llm_completion_tokens_total": ("counter", "completion tokens"),
+    "llm_latency_seconds": ("histogram", "LLM 请求延迟"),
+    "llm_ttfb_seconds": ("histogram", "LLM 首 token 时间（流式）"),
+    "llm_queue_wait_seconds": ("histogram", "任务在线程池中的排队时间"),
+    "llm_in_flight": ("gauge", "各 backend 的在途请求数"),
+    "pipeline_tasks_total": ("counter", "已完成的任务数（按状态）"),
+    "scheduler_speculative_total": ("counter", "推测执行的副本数（launched 派发 / won 先于原请求完成）"),
+    "pipeline_stage_seconds": ("gauge", "已完成阶段的耗时"),
+    "pipeline_stage_running": ("gauge", "当前运行中的阶段（1 为运行中）"),
+    "cache_requests_total": ("counter", "缓存查询次数（按缓存与命中结果）"),
+}
+
+# 导出的直方图上界（取不小于目标值的最近细粒度桶边界，累计计数精确）
+_EXPORT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _fmt_labels(key: _LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in items
+    )
+    return "{" + body + "}"
+
+
+def render_prometheus(registry: Optional[MetricsRegistry] = None) -> str:
+    """注册表快照 -> Prometheus 文本格式（0.0.4）。"""
+    snap = (registry or _TELEMETRY.registry).snapshot()
+    lines: List[str] = []
+
+    def _header(name: str, default_type: str) -> None:
+        mtype, help_text = _HELP.get(name, (default_type, name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {mtype}")
+
+    for kind in ("counters", "gauges"):
+        for name in sorted(snap[kind]):
+            _header(name, "counter" if kind == "counters" else "gauge")
+            for key, value in sorted(snap[kind][name].items()):
+                lines.append(f"{name}{_fmt_labels(key)} {value:g}")
+    for name in sorted(snap["histograms"]):
+        _header(name, "histogram")
+        for key, (counts, count, total, bounds) in sorted(snap["histograms"][name].items()):
+            cumulative = 0
+            i = 0
+            for target in _EXPORT_BUCKETS:
+                j = bisect.bisect_left(bounds, target)
+                if j >= len(bounds):
+                    break
+                cumulative += sum(counts[i:j + 1])
+                i = j + 1
+                lines.append(f"{name}_bucket{_fmt_labels(key, (('le', f'{bounds[j]:.6g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{_fmt_labels(key, (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_fmt_labels(key)} {total:g}")
+            lines.append(f"{name}_count{_fmt_labels(key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # noqa: N802
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # 抓取请求不打印到 stdout
+        pass
+
+
+class MetricsServer:
+    """后台 /metrics 端点：ThreadingHTTPServer 运行在守护线程中，读取当前遥测注册表。"""
+
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        self.httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Optional[MetricsServer]:
+    """启动 Prometheus 抓取端点；端口被占用等错误时提示并返回 None（不影响 pipeline）。"""
+    try:
+        return MetricsServer(port, host)
+    except OSError as e:
+        print(f"[警告] 指标端点启动失败（{host}:{port}）: {e}")
+        return None
@@ -0,0 +1,104 @@
+"""多次采样的不确定性度量与再标注样本筛选。
+
+对应 clean/README.md §9（争议样本再标注）：
+- 同一任务采样 k 次模型输出；
+- 对每个 (bad_id, 维度) 计算 Δ=good-bad 在 k 次采样间的方差与熵；
+- 任务级不确定性 = 各维度方差的均值；只把不确定性最高的任务送去人工再标注。
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional
+import math
+
+from .aggregate import _score_pairs
+from .schemas import Dimension
+
+
+def _sample_deltas(outputs: List[dict]) -> Dict[tuple, List[float]]:
+    """收集 (bad_id, dimension) -> 各次采样的 Δ 列表。"""
+    deltas: Dict[tuple, List[float]] = {}
+    for out in outputs:
+        for cmp in out.get("per_bad_comparisons") or []:
+            bad_id = str(cmp.get("bad_id", ""))
+            for name, (g, b) in _score_pairs(cmp).items():
+                deltas.setdefault((bad_id, name), []).append(g - b)
+    return deltas
+
+
+def _variance(xs: List[float]) -> float:
+    n = len(xs)
+    if n < 2:
+        return 0.0
+    mean = sum(xs) / n
+    return sum((x - mean) ** 2 for x in xs) / n
+
+
+def _entropy(xs: List[float]) -> float:
+    """离散取值分布的香农熵（bit）。"""
+    n = len(xs)
+    if n < 2:
+        return 0.0
+    counts: Dict[float, int] = {}
+    for x in xs:
+        counts[x] = counts.get(x, 0) + 1
+    return -sum((c / n) * math.log2(c / n) for c in counts.values())
+
+
+def samples_agree(outputs: List[dict], tol: float = 1.0) -> bool:
+    """判断多次采样是否一致：每个 (bad_id, 维度) 的 Δ 极差均不超过 tol。"""
+    for vals in _sample_deltas(outputs).values():
+        if len(vals) >= 2 and max(vals) - min(vals) > tol:
+            return False
+    return True
+
+
+def score_uncertainty(outputs: List[dict]) -> dict:
+    """计算多次采样的不确定性统计。
+
+    返回：
+    {samples, dimension_variance: {dim: float}, dimension_entropy: {dim: float}, score}
+    其中维度值为该维度在各 bad 上的均值，score 为各维度方差的均值。
+    """
+    per_dim_var: Dict[str, List[float]] = {d.value: [] for d in Dimension}
+    per_dim_ent: Dict[str, List[float]] = {d.value: [] for d in Dimension}
+    for (_, name), vals in _sample_deltas(outputs).items():
+        per_dim_var[name].append(_variance(vals))
+        per_dim_ent[name].append(_entropy(vals))
+
+    def _avg(xs: List[float]) -> float:
+        return round(sum(xs) / len(xs), 6) if xs else 0.0
+
+    dim_var = {name: _avg(v) for name, v in per_dim_var.items()}
+    dim_ent = {name: _avg(v) for name, v in per_dim_ent.items()}
+    observed = [v for name, v in dim_var.items() if per_dim_var[name]]
+    return {
+        "samples": len(outputs),
+        "dimension_variance": dim_var,
+        "dimension_entropy": dim_ent,
+        "score": _avg(observed),
+    }
+
+
+def select_for_reannotation(
+    results: Iterable[dict],
+    *,
+    top_fraction: float = 0.05,
+    top_k: Optional[int] = None,
+    min_score: float = 0.0,
+) -> List[dict]:
+    """按不确定性得分降序挑选需要人工再标注的任务。
+
+    只考虑带有 uncertainty 字段（即多次采样）的结果；top_k 优先于 top_fraction。
+    返回 {task_id, score, samples, dimension_variance, dimension_entropy} 列表。
+    """
+    scored = []
+    for r in results:
+        unc = r.get("uncertainty")
+        if not unc or float(unc.get("score", 0.0)) <= min_score:
+            continue
+        scored.append({"task_id": r.get("task_id", ""), **unc})
+    scored.sort(key=lambda x: -float(x["score"]))
+    if top_k is None:
+        top_k = max(1, math.ceil(len(scored) * top_fraction)) if scored else 0
+    return scored[:top_k]
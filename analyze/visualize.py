@@ -1,14 +1,112 @@
 """任务级与全局可视化。
 
 依赖：
-- matplotlib（函数内按需导入）
+- matplotlib（首次绘图时按需导入）
 - wordcloud（仅词云函数需要；函数内按需导入）
  未安装时会抛出 ImportError，请先安装：pip install matplotlib
   词云：pip install wordcloud pillow
+
+所有绘图函数共享一个惰性初始化的渲染上下文（_get_render_context）：
+首次绘图时强制 Agg 后端、解析并注册中文字体、设置 rcParams，之后不再重复；
+每类图复用同一个 Figure 对象（清空后重画），避免反复 plt.figure 的开销。
 """
 
 from __future__ import annotations
 
+import threading
+
+
+# 维度中文标签，各图共享
+DIM_CN = {
+    "correctness": "正确性",
+    "robustness": "鲁棒性",
+    "readability": "可读性",
+    "maintainability": "可维护性",
+    "complexity": "复杂度",
+    "performance": "性能",
+    "testing": "测试",
+    "security_dependency": "安全/依赖",
+    "style_consistency": "风格一致",
+}
+
+
+class _RenderContext:
+    """进程内共享的绘图状态：pyplot 模块、已注册字体与可复用的 Figure。"""
+
+    def __init__(self, plt, font_path: str | None):
+        self.plt = plt
+        self.font_path = font_path
+        self.figures: dict = {}
+
+    def figure(self, key: str, figsize, **kwargs):
+        """取出（或首次创建）名为 key 的 Figure，清空后按 figsize 重设尺寸。
+
+        kwargs（如 constrained_layout）仅在首次创建时生效，因此同一 key 应始终使用相同的布局参数。
+        """
+        fig = self.figures.get(key)
+        if fig is None:
+            fig = self.figures[key] = self.plt.figure(figsize=figsize, **kwargs)
+        else:
+            fig.clf()
+            fig.set_size_inches(figsize, forward=False)
+        return fig
+
+
+_RENDER_CTX: _RenderContext | None = None
+_RENDER_LOCK = threading.Lock()
+
+
+def _get_render_context() -> _RenderContext:
+    """返回渲染上下文；首次调用时完成 matplotlib 与字体的一次性初始化。
+
+    字体取 FONT_PATH 环境变量，否则自动探测常见中文字体；字体不可用时回退默认字体。
+    """
+    global _RENDER_CTX
+    if _RENDER_CTX is not None:
+        return _RENDER_CTX
+    with _RENDER_LOCK:
+        if _RENDER_CTX is not None:
+            return _RENDER_CTX
+        import os
+
+        try:
+            import matplotlib
+
+            matplotlib.use("Agg")
+            import matplotlib.pyplot as plt
+            from matplotlib import font_manager as _fm
+        except Exception as e:
+            raise ImportError("需要 matplotlib，安装：pip install matplotlib") from e
+
+        fp_path = _pick_font_path(os.environ.get("FONT_PATH"))
+        try:
+            if fp_path:
+                # 先注册字体，再设置 family 名称，避免未安装导致找不到
+                try:
+                    _fm.fontManager.addfont(fp_path)
+                except Exception:
+                    pass
+                plt.rcParams["font.family"] = _fm.FontProperties(fname=fp_path).get_name()
+            # 修正负号显示
+            plt.rcParams["axes.unicode_minus"] = False
+        except Exception:
+            # 字体不可用时忽略，回退默认字体
+            pass
+        _RENDER_CTX = _RenderContext(plt, fp_path)
+        return _RENDER_CTX
+
+
+def _load_task_obj(task_json_path: str) -> dict:
+    """读取单个任务对象：文件可以是单个 JSON 对象，或 JSONL（取首条记录）。"""
+    import json
+
+    with open(task_json_path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+        if content.startswith("{") and content.endswith("}"):
+            return json.loads(content)
+        # JSONL：取第一行
+        return json.loads(content.splitlines()[0])
+
 
 def plot_task_dimension_lollipop(task_json_path: str, out_path: str) -> str:
     """为单个任务绘制维度棒棒糖/误差线图。
@@ -17,55 +115,16 @@ def plot_task_dimension_lollipop(task_json_path: str, out_path: str) -> str:
     - 单个任务的 JSON 对象；
     - JSONL（多任务），则默认取首条记录。
     """
-    import json
-    import os
-    from .schemas import Dimension
+    return _render_task_dimension_lollipop(_load_task_obj(task_json_path), out_path)
 
-    try:
-        import matplotlib.pyplot as plt
-        from matplotlib import font_manager as _fm
-        import os as _os
-    except Exception as e:
-        raise ImportError("需要 matplotlib，安装：pip install matplotlib") from e
 
-    # 读取单个任务对象
-    with open(task_json_path, "r", encoding="utf-8") as f:
-        content = f.read().strip()
-        obj = None
-        if content.startswith("{") and content.endswith("}"):
-            obj = json.loads(content)
-        else:
-            # JSONL：取第一行
-            line = content.splitlines()[0]
-            obj = json.loads(line)
+def _render_task_dimension_lollipop(obj: dict, out_path: str) -> str:
+    import os
+    from .schemas import Dimension
 
-    # 字体设置（使用 FONT_PATH 或常见中文字体），并修正负号
-    try:
-        _font_path_env = _os.environ.get("FONT_PATH")
-        _fp_path = _font_path_env or _pick_font_path(None)
-        if _fp_path:
-            try:
-                _fm.fontManager.addfont(_fp_path)
-            except Exception:
-                pass
-            _fp = _fm.FontProperties(fname=_fp_path)
-            plt.rcParams["font.family"] = _fp.get_name()
-        plt.rcParams["axes.unicode_minus"] = False
-    except Exception:
-        pass
+    ctx = _get_render_context()
 
     dims = [d.value for d in Dimension]
-    dim_cn = {
-        "correctness": "正确性",
-        "robustness": "鲁棒性",
-        "readability": "可读性",
-        "maintainability": "可维护性",
-        "complexity": "复杂度",
-        "performance": "性能",
-        "testing": "测试",
-        "security_dependency": "安全/依赖",
-        "style_consistency": "风格一致",
-    }
     per_dim_values = {d: [] for d in dims}
     for cmp in obj.get("per_bad_comparisons") or []:
         dim_scores = (cmp.get("dimension_scores") or {})
@@ -107,25 +166,26 @@ def plot_task_dimension_lollipop(task_json_path: str, out_path: str) -> str:
 
     y = list(range(len(dims)))
 
-    plt.figure(figsize=(11, 6.5))
+    fig = ctx.figure("task_lollipop", (11, 6.5))
+    ax = fig.add_subplot(111)
     # 误差线（min-max）
     for i, (mn, mx) in enumerate(zip(mins, maxs)):
-        plt.plot([mn, mx], [i, i], color="#888", linewidth=2, zorder=1)
+        ax.plot([mn, mx], [i, i], color="#888", linewidth=2, zorder=1)
     # 点：min / median / mean / max
-    plt.scatter(mins, y, label="min", color="#d62728", zorder=2)
-    plt.scatter(meds, y, label="median", color="#1f77b4", zorder=3)
-    plt.scatter(means, y, label="mean", color="#2ca02c", zorder=4)
-    plt.scatter(maxs, y, label="max", color="#ff7f0e", zorder=5)
-
-    plt.yticks(y, [dim_cn.get(d, d) for d in dims], fontsize=12)
-    plt.xlabel("差值 (好 - 坏)", fontsize=12)
-    plt.title("任务维度差距（min/median/mean/max）", fontsize=14)
-    plt.grid(axis="x", linestyle=":", alpha=0.5)
-    plt.legend(loc="lower right", fontsize=11)
+    ax.scatter(mins, y, label="min", color="#d62728", zorder=2)
+    ax.scatter(meds, y, label="median", color="#1f77b4", zorder=3)
+    ax.scatter(means, y, label="mean", color="#2ca02c", zorder=4)
+    ax.scatter(maxs, y, label="max", color="#ff7f0e", zorder=5)
+
+    ax.set_yticks(y)
+    ax.set_yticklabels([DIM_CN.get(d, d) for d in dims], fontsize=12)
+    ax.set_xlabel("差值 (好 - 坏)", fontsize=12)
+    ax.set_title("任务维度差距（min/median/mean/max）", fontsize=14)
+    ax.grid(axis="x", linestyle=":", alpha=0.5)
+    ax.legend(loc="lower right", fontsize=11)
     os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=150)
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=150)
     return out_path
 
 
@@ -134,24 +194,13 @@ def plot_task_keywords_bar(task_json_path: str, out_path: str) -> str:
 
     默认取 Top-20（按 per_bad discriminative_keywords 累积权重排序）。
     """
-    import json
-    import os
+    return _render_task_keywords_bar(_load_task_obj(task_json_path), out_path)
 
-    try:
-        import matplotlib.pyplot as plt
-        from matplotlib import font_manager as _fm
-        import os as _os
-    except Exception as e:
-        raise ImportError("需要 matplotlib，安装：pip install matplotlib") from e
 
-    with open(task_json_path, "r", encoding="utf-8") as f:
-        content = f.read().strip()
-        obj = None
-        if content.startswith("{") and content.endswith("}"):
-            obj = json.loads(content)
-        else:
-            line = content.splitlines()[0]
-            obj = json.loads(line)
+def _render_task_keywords_bar(obj: dict, out_path: str) -> str:
+    import os
+
+    ctx = _get_render_context()
 
     kw_totals = {}
     for cmp in obj.get("per_bad_comparisons") or []:
@@ -179,34 +228,19 @@ def plot_task_keywords_bar(task_json_path: str, out_path: str) -> str:
     phrases = [f"{it['phrase']} ({it['dimension']})" for it in items]
     weights = [it["weight"] for it in items]
 
-    # 字体设置
-    try:
-        _font_path_env = _os.environ.get("FONT_PATH")
-        _fp_path = _font_path_env or _pick_font_path(None)
-        if _fp_path:
-            try:
-                _fm.fontManager.addfont(_fp_path)
-            except Exception:
-                pass
-            _fp = _fm.FontProperties(fname=_fp_path)
-            plt.rcParams["font.family"] = _fp.get_name()
-        plt.rcParams["axes.unicode_minus"] = False
-    except Exception:
-        pass
-
-    plt.figure(figsize=(11, max(4, len(items) * 0.5)))
+    fig = ctx.figure("task_keywords", (11, max(4, len(items) * 0.5)))
+    ax = fig.add_subplot(111)
     y = list(range(len(items)))
-    plt.barh(y, weights, color="#1f77b4")
-    plt.yticks(y, phrases, fontsize=11)
-    plt.xlabel("权重", fontsize=12)
-    plt.title("区分性关键词（Top-20）", fontsize=14)
-    plt.gca().invert_yaxis()
-    plt.grid(axis="x", linestyle=":", alpha=0.5)
-    import os as _os
-    _os.makedirs(_os.path.dirname(out_path) or ".", exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=150)
-    plt.close()
+    ax.barh(y, weights, color="#1f77b4")
+    ax.set_yticks(y)
+    ax.set_yticklabels(phrases, fontsize=11)
+    ax.set_xlabel("权重", fontsize=12)
+    ax.set_title("区分性关键词（Top-20）", fontsize=14)
+    ax.invert_yaxis()
+    ax.grid(axis="x", linestyle=":", alpha=0.5)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=150)
     return out_path
 
 
@@ -217,12 +251,7 @@ def plot_global_radar(agg_dimension_csv: str, out_path: str) -> str:
     import os
     from .schemas import Dimension
 
-    try:
-        import matplotlib.pyplot as plt
-        from matplotlib import font_manager as _fm
-        import os as _os
-    except Exception as e:
-        raise ImportError("需要 matplotlib，安装：pip install matplotlib") from e
+    ctx = _get_render_context()
 
     rows = []
     with open(agg_dimension_csv, "r", encoding="utf-8") as f:
@@ -239,29 +268,13 @@ def plot_global_radar(agg_dimension_csv: str, out_path: str) -> str:
         bad_values.append(float(r.get("avg_bad_score", 0.0)) if r else 0.0)
 
     # 闭合雷达多边形
-    labels = dims + [dims[0]]
     good_data = good_values + [good_values[0]]
     bad_data = bad_values + [bad_values[0]]
     angles = [n / float(len(dims)) * 2 * math.pi for n in range(len(dims))]
     angles += [angles[0]]
 
-    # 字体设置
-    try:
-        _font_path_env = _os.environ.get("FONT_PATH")
-        _fp_path = _font_path_env or _pick_font_path(None)
-        if _fp_path:
-            try:
-                _fm.fontManager.addfont(_fp_path)
-            except Exception:
-                pass
-            _fp = _fm.FontProperties(fname=_fp_path)
-            plt.rcParams["font.family"] = _fp.get_name()
-        plt.rcParams["axes.unicode_minus"] = False
-    except Exception:
-        pass
-
-    plt.figure(figsize=(8.6, 8.6))
-    ax = plt.subplot(111, polar=True)
+    fig = ctx.figure("global_radar", (8.6, 8.6))
+    ax = fig.add_subplot(111, polar=True)
     ax.plot(angles, good_data, linewidth=2, color="#2ca02c", label="好代码")
     ax.fill(angles, good_data, color="#2ca02c", alpha=0.20)
     ax.plot(angles, bad_data, linewidth=2, color="#d62728", label="坏代码")
@@ -279,26 +292,13 @@ def plot_global_radar(agg_dimension_csv: str, out_path: str) -> str:
         label="Gap (|Good - Bad|)"
     )
     ax.set_ylim(0, 5)
-    # 中文维度标签
-    dim_cn = {
-        "correctness": "正确性",
-        "robustness": "鲁棒性",
-        "readability": "可读性",
-        "maintainability": "可维护性",
-        "complexity": "复杂度",
-        "performance": "性能",
-        "testing": "测试",
-        "security_dependency": "安全/依赖",
-        "style_consistency": "风格一致",
-    }
-    ax.set_thetagrids([a * 180 / math.pi for a in angles[:-1]], [dim_cn.get(d, d) for d in dims], fontsize=12)
+    ax.set_thetagrids([a * 180 / math.pi for a in angles[:-1]], [DIM_CN.get(d, d) for d in dims], fontsize=12)
     ax.set_title("九维均分对比：好代码 vs 坏代码", fontsize=14)
     ax.grid(True, linestyle=":", alpha=0.5)
     ax.legend(loc="upper right", bbox_to_anchor=(1.2, 1.1), fontsize=11)
     os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=150)
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=150)
     return out_path
 
 
@@ -306,38 +306,20 @@ def plot_global_heatmaps(agg_dimension_csv: str, out_path_prefix: str) -> str:
     """绘制维度统计热力图：上=delta类指标(发散色, 0居中)，下=一致性(顺序色)。
 
     指标：avg_of_means / avg_of_medians / avg_of_mins / avg_of_maxes / avg_consistency
+    CSV 含置信区间列（export_aggregates 的 bootstrap_resamples）时，均值与一致性格子内标注
+    95% 区间，均值格另按配对检验 p 值加星号。
     输出：{out_path_prefix}/global_heatmap.png
     返回：图片路径
     """
     import csv
     import os
-    try:
-        import matplotlib.pyplot as plt
-        import matplotlib.colors as mcolors
-        import matplotlib.gridspec as gridspec
-        from matplotlib import font_manager as _fm
-        import os as _os
-    except Exception as e:
-        raise ImportError("需要 matplotlib，安装：pip install matplotlib") from e
 
-    from .schemas import Dimension
+    ctx = _get_render_context()
+    import matplotlib.colors as mcolors
+    import matplotlib.gridspec as gridspec
 
-    # 应用中文字体（与运行时 FONT_PATH 保持一致），并修正负号显示
-    try:
-        _font_path_env = _os.environ.get("FONT_PATH")
-        _fp_path = _font_path_env or _pick_font_path(None)
-        if _fp_path:
-            # 先注册字体，再设置 family 名称，避免未安装导致找不到
-            try:
-                _fm.fontManager.addfont(_fp_path)
-            except Exception:
-                pass
-            _fp = _fm.FontProperties(fname=_fp_path)
-            plt.rcParams["font.family"] = _fp.get_name()
-        plt.rcParams["axes.unicode_minus"] = False
-    except Exception:
-        # 字体不可用时忽略，回退默认字体
-        pass
+    from .schemas import Dimension
+    from .stats import significance_marker
 
     rows = []
     with open(agg_dimension_csv, "r", encoding="utf-8") as f:
@@ -363,19 +345,6 @@ def plot_global_heatmaps(agg_dimension_csv: str, out_path_prefix: str) -> str:
         "avg_consistency": "一致性(τ≥2)",
     }
 
-    # 维度中文标签，避免英文过长导致遮挡
-    dim_cn = {
-        "correctness": "正确性",
-        "robustness": "鲁棒性",
-        "readability": "可读性",
-        "maintainability": "可维护性",
-        "complexity": "复杂度",
-        "performance": "性能",
-        "testing": "测试",
-        "security_dependency": "安全/依赖",
-        "style_consistency": "风格一致",
-    }
-
     # 构建二维数据矩阵
     mat = [[0.0 for _ in range(len(dims))] for _ in range(len(metrics_all))]
     for j, d in enumerate(dims):
@@ -416,8 +385,8 @@ def plot_global_heatmaps(agg_dimension_csv: str, out_path_prefix: str) -> str:
 
     # 画两块子图
     # 提升可读性：更大画布 + 约束布局，避免标签被遮挡
-    fig = plt.figure(figsize=(14, 8), constrained_layout=True)
-    gs = gridspec.GridSpec(2, 1, height_ratios=[4, 1], hspace=0.12)
+    fig = ctx.figure("global_heatmap", (14, 8), constrained_layout=True)
+    gs = gridspec.GridSpec(2, 1, figure=fig, height_ratios=[4, 1], hspace=0.12)
 
     # 上：delta 指标
     ax1 = fig.add_subplot(gs[0])
@@ -428,6 +397,25 @@ def plot_global_heatmaps(agg_dimension_csv: str, out_path_prefix: str) -> str:
     # 仅在下图显示 X 轴标签，避免拥挤
     ax1.set_xticklabels([])
     ax1.set_title("质量差距（Δ=好-坏）", pad=6, fontsize=14)
+    # 置信区间标注（CSV 含 CI 列时）
+    row_by_dim = {r.get("dimension"): r for r in rows}
+    has_ci = any((r.get("avg_of_means_ci_low") or "") != "" for r in rows)
+    if has_ci:
+        def _ci_text(r, metric):
+            lo, hi = r.get(f"{metric}_ci_low") or "", r.get(f"{metric}_ci_high") or ""
+            if lo == "" or hi == "":
+                return ""
+            return f"{float(r[metric]):.2f}\n[{float(lo):.2f}, {float(hi):.2f}]"
+
+        for j, d in enumerate(dims):
+            r = row_by_dim.get(d)
+            if not r:
+                continue
+            text = _ci_text(r, "avg_of_means")
+            if text:
+                ax1.text(j, 0, text + significance_marker(r.get("p_value")),
+                         ha="center", va="center", fontsize=9, color="black")
+        ax1.set_title("质量差距（Δ=好-坏；格内为均值与 95% 置信区间，*/**/*** 表示 p<0.05/0.01/0.001）", pad=6, fontsize=14)
     cbar1 = fig.colorbar(im1, ax=ax1, fraction=0.046, pad=0.04)
     cbar1.set_label("差值 Δ (好-坏)", fontsize=12)
 
@@ -437,10 +425,15 @@ def plot_global_heatmaps(agg_dimension_csv: str, out_path_prefix: str) -> str:
     ax2.set_yticks([0])
     ax2.set_yticklabels([metric_labels["avg_consistency"]], fontsize=12)
     ax2.set_xticks(range(len(dims)))
-    ax2.set_xticklabels([dim_cn.get(d, d) for d in dims], rotation=30, ha="right", fontsize=12)
+    ax2.set_xticklabels([DIM_CN.get(d, d) for d in dims], rotation=30, ha="right", fontsize=12)
     # 为避免最右侧标签被裁切，适当留白
     for label in ax2.get_xticklabels():
         label.set_horizontalalignment("right")
+    if has_ci:
+        for j, d in enumerate(dims):
+            text = _ci_text(row_by_dim[d], "avg_consistency") if d in row_by_dim else ""
+            if text:
+                ax2.text(j, 0, text, ha="center", va="center", fontsize=9, color="black")
     cbar2 = fig.colorbar(im2, ax=ax2, fraction=0.046, pad=0.04)
     cbar2.set_label("一致性", fontsize=12)
 
@@ -449,51 +442,215 @@ def plot_global_heatmaps(agg_dimension_csv: str, out_path_prefix: str) -> str:
         out_path = os.path.join(out_path_prefix, "global_heatmap.png")
     os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
     # constrained_layout 已启用，这里不再调用 tight_layout，防止冲突
-    plt.savefig(out_path, dpi=150)
-    plt.close()
+    fig.savefig(out_path, dpi=150)
     return out_path
 
 
+_FONT_CANDIDATES = [
+    "/System/Library/Fonts/PingFang.ttc",  # macOS
+    "/System/Library/Fonts/STHeiti Light.ttc",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:/Windows/Fonts/simhei.ttf",  # Windows SimHei
+    "C:/Windows/Fonts/msyh.ttc",    # Microsoft YaHei
+    "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",  # Linux Noto
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+]
+
+# 自动探测结果缓存（None 表示尚未探测；空串表示未找到）
+_DETECTED_FONT: str | None = None
+
+
 def _pick_font_path(font_path: str | None = None) -> str | None:
+    global _DETECTED_FONT
     if font_path:
         return font_path
-    # 常见中文字体路径（按平台尝试）
-    candidates = [
-        "/System/Library/Fonts/PingFang.ttc",  # macOS
-        "/System/Library/Fonts/STHeiti Light.ttc",
-        "/Library/Fonts/Arial Unicode.ttf",
-        "C:/Windows/Fonts/simhei.ttf",  # Windows SimHei
-        "C:/Windows/Fonts/msyh.ttc",    # Microsoft YaHei
-        "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",  # Linux Noto
-        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-    ]
-    for p in candidates:
+    if _DETECTED_FONT is None:
+        import os
+
+        # 常见中文字体路径（按平台尝试），仅在进程内首次调用时探测
+        _DETECTED_FONT = next((p for p in _FONT_CANDIDATES if os.path.exists(p)), "")
+    return _DETECTED_FONT or None
+
+
+# 预览模式：画布缩放比例与词数上限（用于报告草稿的快速迭代）
+WORDCLOUD_PREVIEW_SCALE = 0.5
+WORDCLOUD_PREVIEW_MAX_WORDS = 60
+
+# 词云 PNG 缓存：默认放在用户缓存目录（不随 figs/ 发布），可用环境变量 WORDCLOUD_CACHE_DIR 覆盖；
+# 总大小超过 WORDCLOUD_CACHE_MAX_MB 时按最近使用时间淘汰。渲染逻辑变化时递增版本使旧缓存失效
+WORDCLOUD_CACHE_MAX_MB = 256
+_WORDCLOUD_CACHE_VERSION = "1"
+
+
+def _wordcloud_cache_dir() -> str:
+    """词云缓存目录：WORDCLOUD_CACHE_DIR > $XDG_CACHE_HOME/analyze/wordcloud > ~/.cache/analyze/wordcloud。"""
+    import os
+
+    custom = os.environ.get("WORDCLOUD_CACHE_DIR")
+    if custom:
+        return custom
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "analyze", "wordcloud")
+
+
+def _prune_wordcloud_cache(cache_dir: str, max_bytes: int) -> None:
+    """缓存总大小超过 max_bytes 时，按 mtime（命中时会刷新）从旧到新删除条目。"""
+    import os
+
+    entries = []
+    try:
+        with os.scandir(cache_dir) as it:
+            for e in it:
+                if not e.name.endswith(".png"):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
         try:
-            if p and __import__("os").path.exists(p):
-                return p
-        except Exception:
-            pass
-    return None
+            os.remove(path)
+        except OSError:
+            pass  # 可能已被并发进程删除
+        total -= size
 
 
-def plot_task_wordcloud(task_json_path: str, out_path: str, *, font_path: str | None = None, background_color: str = "white", max_words: int = 200) -> str:
-    """基于单任务 per_bad discriminative_keywords 绘制词云。"""
+def _wordcloud_cache_key(freqs: dict, font_path: str | None, params: dict) -> str:
+    """以频率表 + 字体 + 画布/布局参数计算缓存键。"""
+    import hashlib
     import json
     import os
 
+    font_sig = ""
+    if font_path:
+        try:
+            st = os.stat(font_path)
+            font_sig = f"{font_path}:{st.st_size}:{int(st.st_mtime)}"
+        except OSError:
+            font_sig = font_path
+    payload = json.dumps(
+        {
+            "v": _WORDCLOUD_CACHE_VERSION,
+            "freqs": sorted((str(k), round(float(w), 6)) for k, w in freqs.items()),
+            "font": font_sig,
+            "params": params,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _render_wordcloud_figure(
+    key: str,
+    freqs: dict,
+    out_path: str,
+    *,
+    font_path: str | None,
+    background_color: str,
+    width: int,
+    height: int,
+    max_words: int = 200,
+    seed: int = 42,
+    preview: bool = False,
+    cache: bool = True,
+) -> str:
+    """按频率表生成词云并保存为 PNG（词云函数共用）。
+
+    相同的 (频率表, 字体, 尺寸, 词数, 种子, 背景色) 直接复用缓存中的 PNG，跳过布局与绘制；
+    缓存位于 _wordcloud_cache_dir()，每次写入后按 WORDCLOUD_CACHE_MAX_MB 淘汰最久未用的条目
+    （设为 0 关闭缓存）。preview=True 时按 WORDCLOUD_PREVIEW_SCALE 缩小画布并限制词数。
+    """
+    import os
+    import shutil
+
+    from .telemetry import count_cache
+
+    if preview:
+        width = max(100, int(width * WORDCLOUD_PREVIEW_SCALE))
+        height = max(100, int(height * WORDCLOUD_PREVIEW_SCALE))
+        max_words = min(max_words, WORDCLOUD_PREVIEW_MAX_WORDS)
+
+    fp = _pick_font_path(font_path)
+
+    # 构建 WordCloud 参数，如果没有字体则不传 font_path（使用默认字体）
+    wc_params = {
+        "width": width,
+        "height": height,
+        "max_words": max_words,
+        "random_state": seed,
+        "background_color": background_color,
+        "prefer_horizontal": 0.9,
+        "collocations": False,
+    }
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    cached_png = ""
+    max_bytes = int(float(os.environ.get("WORDCLOUD_CACHE_MAX_MB", WORDCLOUD_CACHE_MAX_MB)) * 1024 * 1024)
+    if cache and max_bytes > 0:
+        cache_dir = _wordcloud_cache_dir()
+        cached_png = os.path.join(cache_dir, _wordcloud_cache_key(freqs, fp, wc_params) + ".png")
+        hit = os.path.exists(cached_png)
+        count_cache("wordcloud", hit)
+        if hit:
+            shutil.copyfile(cached_png, out_path)
+            try:
+                os.utime(cached_png)  # 刷新 mtime，淘汰时视为最近使用
+            except OSError:
+                pass
+            return out_path
+
     try:
         from wordcloud import WordCloud
-        import matplotlib.pyplot as plt
     except Exception as e:
         raise ImportError("需要 wordcloud 和 matplotlib：pip install wordcloud pillow matplotlib") from e
+    ctx = _get_render_context()
 
-    with open(task_json_path, "r", encoding="utf-8") as f:
-        content = f.read().strip()
-        if content.startswith("{") and content.endswith("}"):
-            obj = json.loads(content)
-        else:
-            obj = json.loads(content.splitlines()[0])
+    if fp:  # 只有找到字体文件时才设置
+        wc_params["font_path"] = fp
 
+    wc = WordCloud(**wc_params).generate_from_frequencies(freqs)
+
+    fig = ctx.figure(key, (width / 100, height / 100))
+    ax = fig.add_subplot(111)
+    ax.imshow(wc, interpolation="bilinear")
+    ax.axis("off")
+    fig.tight_layout(pad=0)
+    fig.savefig(out_path, dpi=150)
+
+    if cached_png:
+        os.makedirs(os.path.dirname(cached_png), exist_ok=True)
+        tmp = f"{cached_png}.{os.getpid()}.tmp"
+        shutil.copyfile(out_path, tmp)
+        os.replace(tmp, cached_png)
+        _prune_wordcloud_cache(os.path.dirname(cached_png), max_bytes)
+    return out_path
+
+
+def plot_task_wordcloud(task_json_path: str, out_path: str, *, font_path: str | None = None, background_color: str = "white", max_words: int = 200, seed: int = 42, preview: bool = False, cache: bool = True) -> str:
+    """基于单任务 per_bad discriminative_keywords 绘制词云。
+
+    preview=True 为低分辨率快速预览；cache=True 时输入不变则复用已渲染的 PNG。
+    """
+    return _render_task_wordcloud(
+        _load_task_obj(task_json_path),
+        out_path,
+        font_path=font_path,
+        background_color=background_color,
+        max_words=max_words,
+        seed=seed,
+        preview=preview,
+        cache=cache,
+    )
+
+
+def _render_task_wordcloud(obj: dict, out_path: str, *, font_path: str | None = None, background_color: str = "white", max_words: int = 200, seed: int = 42, preview: bool = False, cache: bool = True) -> str:
     freqs = {}
     for cmp in obj.get("per_bad_comparisons") or []:
         for k in cmp.get("discriminative_keywords") or []:
@@ -510,41 +667,27 @@ def plot_task_wordcloud(task_json_path: str, out_path: str, *, font_path: str |
         # 构造一个占位，避免报错
         freqs = {"No Keywords": 1.0}
 
-    fp = _pick_font_path(font_path)
-    
-    # 构建 WordCloud 参数，如果没有字体则不传 font_path（使用默认字体）
-    wc_params = {
-        "width": 1200,
-        "height": 800,
-        "background_color": background_color,
-        "prefer_horizontal": 0.9,
-        "collocations": False,
-    }
-    if fp:  # 只有找到字体文件时才设置
-        wc_params["font_path"] = fp
-    
-    wc = WordCloud(**wc_params).generate_from_frequencies(freqs)
+    return _render_wordcloud_figure(
+        "task_wordcloud",
+        freqs,
+        out_path,
+        font_path=font_path,
+        background_color=background_color,
+        width=1200,
+        height=800,
+        max_words=max_words,
+        seed=seed,
+        preview=preview,
+        cache=cache,
+    )
 
-    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-    plt.figure(figsize=(12, 8))
-    plt.imshow(wc, interpolation="bilinear")
-    plt.axis("off")
-    plt.tight_layout(pad=0)
-    plt.savefig(out_path, dpi=150)
-    plt.close()
-    return out_path
 
+def plot_pattern_wordcloud(pattern_csv: str, out_path: str, *, font_path: str | None = None, background_color: str = "white", top_k: int = 200, seed: int = 42, preview: bool = False, cache: bool = True) -> str:
+    """基于正/反向模式 CSV 绘制词云（pattern -> count）。
 
-def plot_pattern_wordcloud(pattern_csv: str, out_path: str, *, font_path: str | None = None, background_color: str = "white", top_k: int = 200) -> str:
-    """基于正/反向模式 CSV 绘制词云（pattern -> count）。"""
+    preview=True 为低分辨率快速预览；cache=True 时输入不变则复用已渲染的 PNG。
+    """
     import csv
-    import os
-
-    try:
-        from wordcloud import WordCloud
-        import matplotlib.pyplot as plt
-    except Exception as e:
-        raise ImportError("需要 wordcloud 和 matplotlib：pip install wordcloud pillow matplotlib") from e
 
     rows = []
     with open(pattern_csv, "r", encoding="utf-8") as f:
@@ -566,24 +709,16 @@ def plot_pattern_wordcloud(pattern_csv: str, out_path: str, *, font_path: str |
     if not freqs:
         freqs = {"No Patterns": 1.0}
 
-    fp = _pick_font_path(font_path)
-    wc_params = {
-        "width": 1400,
-        "height": 900,
-        "background_color": background_color,
-        "prefer_horizontal": 0.9,
-        "collocations": False,
-    }
-    if fp:
-        wc_params["font_path"] = fp
-
-    wc = WordCloud(**wc_params).generate_from_frequencies(freqs)
-
-    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-    plt.figure(figsize=(14, 9))
-    plt.imshow(wc, interpolation="bilinear")
-    plt.axis("off")
-    plt.tight_layout(pad=0)
-    plt.savefig(out_path, dpi=150)
-    plt.close()
-    return out_path
+    return _render_wordcloud_figure(
+        "pattern_wordcloud",
+        freqs,
+        out_path,
+        font_path=font_path,
+        background_color=background_color,
+        width=1400,
+        height=900,
+        max_words=top_k,
+        seed=seed,
+        preview=preview,
+        cache=cache,
+    )
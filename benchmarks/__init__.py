@@ -0,0 +1,10 @@
+"""
+analyze 流水线的离线基准测试。
+
+  benchmarks/mock_server.py  兼容 OpenAI 接口的 vLLM 替身（可注入延迟、错误与超时）
+  benchmarks/synthetic.py    规模可控的合成 TaskInput / per_task 生成器
+  benchmarks/run.py          基准测试入口：写出 JSON 结果并与基线比较
+
+在仓库根目录运行：
+  python -m benchmarks.run --quick
+"""
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+兼容 OpenAI 接口的本地 vLLM 替身服务。
+
+提供 POST /v1/chat/completions（普通、n>1 以及带 include_usage 的 stream=True）与
+GET /v1/models。响应按 Prompt 中嵌入的 task_id / bad_id（单任务或打包）生成，
+整条流水线无需 GPU 即可离线运行。
+
+用法：
+  python -m benchmarks.mock_server --port 8001
+  python -m benchmarks.mock_server --ports 8001,8002,8003,8004 --latency lognormal:0.8,0.5
+  python -m benchmarks.mock_server --port 8001 --error-rate 0.02 --timeout-rate 0.01 --invalid-rate 0.05
+
+  # 之后像 start_vllm.sh 启动的实例一样把流水线指向它：
+  VLLM_PORTS=8001,8002,8003,8004 python -m analyze.pipeline
+
+延迟规格（秒）：
+  const:0.2            固定值
+  uniform:0.1,0.5      [a, b] 内均匀分布
+  lognormal:0.8,0.5    中位数 0.8、sigma 0.5（与真实解码类似的长尾）
+  exp:0.5              均值 0.5 的指数分布
+可选的逐 token 耗时（--per-token-ms）按输出 token 数累加；--latency-scale 对总延迟整体缩放
+（如 3 表示该实例所在 GPU 更繁忙）。
+
+故障注入（按请求独立抽取）：
+  --error-rate     返回 HTTP 500 与 OpenAI 风格的错误体
+  --timeout-rate   应答前等待 --timeout-s（验证客户端超时）
+  --invalid-rate   返回 200，但文本中不含 JSON（验证 call_model 重试）
+  --prefix-rate    合法 JSON 前后包裹说明文字（验证 extract_json_block）
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import make_response_text  # noqa: E402
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """把延迟规格（"const:0.2" / "uniform:a,b" / "lognormal:中位数,sigma" / "exp:均值"）转为采样函数。"""
+    kind, _, args = (spec or "const:0").partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] or [0.0]
+    kind = kind.strip().lower()
+    if kind == "const":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        lo, hi = values[0], values[1] if len(values) > 1 else values[0]
+        return lambda rng: rng.uniform(lo, hi)
+    if kind == "lognormal":
+        median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+        mu = math.log(max(median, 1e-9))
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    if kind == "exp":
+        mean = max(values[0], 1e-9)
+        return lambda rng: rng.expovariate(1.0 / mean)
+    raise ValueError(f"未知的延迟规格: {spec!r}")
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 3)
+
+
+class MockConfig:
+    """单个模拟服务的行为配置（由其各处理线程共享）。"""
+
+    def __init__(
+        self,
+        *,
+        latency: str = "const:0",
+        per_token_ms: float = 0.0,
+        latency_scale: float = 1.0,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_s: float = 30.0,
+        invalid_rate: float = 0.0,
+        prefix_rate: float = 0.0,
+        canned: Optional[List[str]] = None,
+        seed: int = 0,
+    ):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.per_token_ms = per_token_ms
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_s = timeout_s
+        self.invalid_rate = invalid_rate
+        self.prefix_rate = prefix_rate
+        self.canned = canned or []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "ok": 0, "errors": 0, "timeouts": 0, "invalid": 0}
+
+    def draw(self) -> tuple:
+        """为一个请求抽取 (故障类型, 延迟, 随机种子, 是否包裹说明文字)；随机数访问串行化。"""
+        with self._lock:
+            self.stats["requests"] += 1
+            r = self._rng.random()
+            fault = ""
+            if r < self.error_rate:
+                fault = "error"
+            elif r < self.error_rate + self.timeout_rate:
+                fault = "timeout"
+            elif r < self.error_rate + self.timeout_rate + self.invalid_rate:
+                fault = "invalid"
+            prefix = self._rng.random() < self.prefix_rate
+            return fault, self.sample_latency(self._rng), self._rng.getrandbits(32), prefix
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):  # 不输出访问日志，保持基准测试输出整洁
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # noqa: N802
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        cfg = self.server.config
+        fault, latency, seed, prefix = cfg.draw()
+        if fault == "error":
+            time.sleep(latency)
+            cfg.count("errors")
+            self._send_json(500, {"error": {"message": "injected server error", "type": "server_error"}})
+            return
+        if fault == "timeout":
+            cfg.count("timeouts")
+            time.sleep(cfg.timeout_s)
+
+        rng = random.Random(seed)
+        prompt = "".join(
+            m.get("content") or "" for m in req.get("messages", []) if isinstance(m.get("content"), str)
+        )
+        n = int(req.get("n") or 1)
+        texts = []
+        for _ in range(n):
+            if fault == "invalid":
+                texts.append("抱歉，我无法完成这个请求。")
+            elif cfg.canned:
+                texts.append(rng.choice(cfg.canned))
+            else:
+                texts.append(make_response_text(prompt, rng, prefix="分析结果如下：\n" if prefix else ""))
+        cfg.count("invalid" if fault == "invalid" else "ok")
+
+        prompt_tokens = _approx_tokens(prompt)
+        completion_tokens = sum(_approx_tokens(t) for t in texts)
+        time.sleep(cfg.latency_scale * (latency + cfg.per_token_ms / 1000.0 * completion_tokens / n))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        created = int(time.time())
+        model = req.get("model") or "mock"
+        if req.get("stream"):
+            self._stream(texts, usage if (req.get("stream_options") or {}).get("include_usage") else None, model, created)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{seed:08x}",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [
+                {"index": i, "message": {"role": "assistant", "content": t}, "finish_reason": "stop"}
+                for i, t in enumerate(texts)
+            ],
+            "usage": usage,
+        })
+
+    def _stream(self, texts: List[str], usage: Optional[dict], model: str, created: int) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(payload) -> None:
+            data = ("data: " + (payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)) + "\n\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model}
+        for i, text in enumerate(texts):
+            step = max(1, len(text) // 8)
+            for start in range(0, len(text), step):
+                event({**base, "choices": [{"index": i, "delta": {"content": text[start:start + step]}, "finish_reason": None}]})
+        event({**base, "choices": [{"index": i, "delta": {}, "finish_reason": "stop"} for i in range(len(texts))]})
+        if usage is not None:
+            event({**base, "choices": [], "usage": usage})
+        event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认 backlog（5）在基准测试的并发下会丢弃连接
+    request_queue_size = 256
+
+    def __init__(self, addr, config: MockConfig):
+        super().__init__(addr, _Handler)
+        self.config = config
+
+
+class MockVLLMServer:
+    """在后台守护线程中运行的模拟服务。
+
+    可作为上下文管理器使用或手动调用 stop()；base_url 可直接传给 OpenAI(base_url=...)。
+    """
+
+    def __init__(self, port: int = 0, host: str = "127.0.0.1", config: Optional[MockConfig] = None, **kwargs):
+        self.config = config or MockConfig(**kwargs)
+        self.httpd = _Server((host, port), self.config)
+        self.host, self.port = self.httpd.server_address[:2]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=f"mock-vllm-{self.port}", daemon=True)
+        self._thread.start()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self.config._lock:
+            return dict(self.config.stats)
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockVLLMServer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="离线基准测试用的 OpenAI 兼容 vLLM 模拟服务")
+    ap.add_argument("--host", default="127.0.0.1", help="监听地址")
+    ap.add_argument("--port", type=int, default=8001, help="监听端口")
+    ap.add_argument("--ports", default="", help="逗号分隔的端口，每个端口一个服务（覆盖 --port）")
+    ap.add_argument("--latency", default="lognormal:0.5,0.4", help="延迟规格，见模块说明")
+    ap.add_argument("--per-token-ms", type=float, default=0.0, help="每个输出 token 额外的解码耗时（毫秒）")
+    ap.add_argument("--latency-scale", type=float, default=1.0, help="总响应延迟的缩放倍数")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 500 的比例")
+    ap.add_argument("--timeout-rate", type=float, default=0.0, help="应答前挂起 --timeout-s 的比例")
+    ap.add_argument("--timeout-s", type=float, default=30.0, help="模拟超时的挂起秒数")
+    ap.add_argument("--invalid-rate", type=float, default=0.0, help="返回不含 JSON 文本的比例")
+    ap.add_argument("--prefix-rate", type=float, default=0.0, help="JSON 前后包裹说明文字的比例")
+    ap.add_argument("--canned", default="", help="预置响应文本的 JSONL 文件（每行一个 JSON 字符串）")
+    ap.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = ap.parse_args(argv)
+
+    canned = []
+    if args.canned:
+        with open(args.canned, encoding="utf-8") as f:
+            canned = [json.loads(line) for line in f if line.strip()]
+    ports = [int(p) for p in args.ports.split(",") if p.strip()] or [args.port]
+    servers = [
+        MockVLLMServer(
+            port, args.host,
+            latency=args.latency, per_token_ms=args.per_token_ms, latency_scale=args.latency_scale,
+            error_rate=args.error_rate,
+            timeout_rate=args.timeout_rate, timeout_s=args.timeout_s, invalid_rate=args.invalid_rate,
+            prefix_rate=args.prefix_rate, canned=canned, seed=args.seed + i,
+        )
+        for i, port in enumerate(ports)
+    ]
+    for s in servers:
+        print(f"✓ 模拟服务已启动: {s.base_url}（延迟 {args.latency}）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for s in servers:
+            print(f"[提示] {s.base_url} 请求统计: {s.stats}")
+            s.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+analyze 流水线的离线基准测试入口。
+
+所有涉及 LLM 的基准都通过 openai 客户端以真实 HTTP 访问 benchmarks.mock_server，
+无需 GPU 即可覆盖连接管理、多线程与重试。
+
+测试套件：
+  analyze     analyze_tasks：串行 / 并发（4、16 线程）/ 打包 / 带故障注入的并发
+  multi_vllm  MultiVLLMClient 在 4 个模拟实例间轮询（延迟一致，以及其中一个实例较慢）
+  schedule    TaskScheduler 各派发顺序（fifo / sjf / lpt）及是否开启推测执行，
+              输入为大小混合、最大的任务位于末尾的任务集
+  prompt      build_1vN_prompt / build_packed_prompt 吞吐
+  json        parse_model_response / extract_json_block 处理纯 JSON 与带说明文字的响应，
+              以优化前的提取实现作为参照（speedup_vs_reference）
+  aggregate   export_aggregates（精确与近似 sketch）处理合成 per_task 记录
+  plot        雷达图、热力图与词云渲染
+
+用法：
+  python -m benchmarks.run --quick
+  python -m benchmarks.run --suite analyze,json --tasks 400 --latency lognormal:0.2,0.5
+  python -m benchmarks.run --out bench_new.json --baseline bench_old.json --fail-on-regression
+
+结果写为 JSON（默认 benchmarks/results/bench_<时间戳>.json）：
+  {"meta": {...}, "results": {"<套件>.<用例>": {"<指标>": 值, ...}}}
+以 "_s" 结尾的指标越小越好，以 "per_s" 结尾的越大越好；--baseline 输出两次结果共有指标的
+相对变化，并标出退化超过 --threshold 的指标。
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.mock_server import MockVLLMServer  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+SUITES = ("analyze", "multi_vllm", "schedule", "prompt", "json", "aggregate", "plot")
+
+
+@contextlib.contextmanager
+def _quiet():
+    """计时期间屏蔽流水线的进度输出。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _timed(fn: Callable[[], object], repeat: int = 1) -> float:
+    """repeat 次运行中最短的耗时（秒）。"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _llm_summary() -> dict:
+    from analyze.telemetry import get_telemetry
+
+    rows = get_telemetry().summary()
+    attempts = sum(r["attempts"] for r in rows)
+    if not attempts:
+        return {}
+    p50 = [r["p50_s"] for r in rows if r["p50_s"] is not None]
+    p95 = [r["p95_s"] for r in rows if r["p95_s"] is not None]
+    return {
+        "attempts": attempts,
+        "retries": sum(r["retries"] for r in rows),
+        "latency_p50_s": round(statistics.median(p50), 6) if p50 else None,
+        "latency_p95_s": round(max(p95), 6) if p95 else None,
+    }
+
+
+def _run_analyze(tasks, client, **kwargs) -> dict:
+    from analyze.per_task import analyze_tasks
+    from analyze.telemetry import configure_telemetry
+
+    configure_telemetry(None)
+    t0 = time.perf_counter()
+    with _quiet():
+        outs = analyze_tasks(tasks, model=client, show_progress=False, **kwargs)
+    wall = time.perf_counter() - t0
+    return {
+        "tasks": len(tasks),
+        "ok_tasks": len(outs),
+        "wall_s": round(wall, 4),
+        "tasks_per_s": round(len(tasks) / wall, 3),
+        **_llm_summary(),
+    }
+
+
+def _openai_client(base_url: str, timeout: float):
+    from openai import OpenAI
+
+    # 重试由 call_model 负责；SDK 自身的重试会掩盖注入的故障
+    return OpenAI(base_url=base_url, api_key="EMPTY", max_retries=0, timeout=timeout)
+
+
+def bench_analyze(args) -> Dict[str, dict]:
+    tasks = synthetic.make_tasks(args.tasks, seed=args.seed)
+    results = {}
+    cases = [
+        ("sequential", dict(use_concurrent=False), {}),
+        ("concurrent_4", dict(use_concurrent=True, max_workers=4), {}),
+        ("concurrent_16", dict(use_concurrent=True, max_workers=16), {}),
+        ("packed_16", dict(use_concurrent=True, max_workers=16, pack_budget_tokens=6000), {}),
+        (
+            "concurrent_16_faults",
+            dict(use_concurrent=True, max_workers=16),
+            dict(error_rate=0.03, invalid_rate=0.03, prefix_rate=0.2),
+        ),
+    ]
+    for name, kwargs, faults in cases:
+        with MockVLLMServer(latency=args.latency, seed=args.seed, **faults) as server:
+            client = _openai_client(server.base_url, args.timeout)
+            res = _run_analyze(tasks, client, **kwargs)
+            res["requests"] = server.stats["requests"]
+        results[f"analyze.{name}"] = res
+        print(f"  analyze.{name}: {res['tasks_per_s']} 任务/秒（成功 {res['ok_tasks']}/{res['tasks']}）")
+    return results
+
+
+def bench_multi_vllm(args) -> Dict[str, dict]:
+    from analyze.multi_vllm import MultiVLLMClient
+
+    tasks = synthetic.make_tasks(args.tasks, seed=args.seed)
+    results = {}
+    for name, slow in (("uniform_4", None), ("one_slow_4", 0)):
+        servers = [MockVLLMServer(latency=args.latency, seed=args.seed + i) for i in range(4)]
+        if slow is not None:
+            # 慢实例的应答延迟为 3 倍（如所在 GPU 更繁忙）
+            servers[slow].config.sample_latency = (
+                lambda rng, base=servers[slow].config.sample_latency: 3 * base(rng)
+            )
+        try:
+            with _quiet():
+                client = MultiVLLMClient([s.base_url for s in servers])
+            res = _run_analyze(tasks, client, use_concurrent=True, max_workers=16)
+            counts = [s.stats["requests"] for s in servers]
+            res["requests_per_backend"] = counts
+            res["balance_ratio"] = round(max(counts) / max(1, min(counts)), 3)
+        finally:
+            for s in servers:
+                s.stop()
+        results[f"multi_vllm.{name}"] = res
+        print(f"  multi_vllm.{name}: {res['tasks_per_s']} 任务/秒，各实例请求数 {counts}")
+    return results
+
+
+def _mixed_tasks(n: int, seed: int) -> list:
+    """大量小任务后接少量大任务（约 5%），模拟大任务位于文件末尾的批量输入。"""
+    n_large = max(2, n // 20)
+    small = synthetic.make_tasks(n - n_large, bads=(1, 2), lines=(10, 30), seed=seed)
+    large = synthetic.make_tasks(n_large, bads=(12, 16), lines=(60, 120), seed=seed + 1)
+    for i, t in enumerate(large):
+        t.task_id = f"L{i:06d}"
+    return small + large
+
+
+def bench_schedule(args) -> Dict[str, dict]:
+    from functools import partial
+
+    from analyze.multi_vllm import MultiVLLMClient
+    from analyze.per_task import _run_queued, analyze_task
+    from analyze.scheduling import TaskScheduler
+    from analyze.telemetry import configure_telemetry
+
+    tasks = _mixed_tasks(args.tasks, args.seed)
+    run_fn = partial(_run_queued, partial(analyze_task, context_tokens=None))
+    results = {}
+    cases = [
+        ("fifo", "fifo", None),
+        ("sjf", "sjf", None),
+        ("lpt", "lpt", None),
+        ("fifo_spec", "fifo", 0.5),
+        ("sjf_spec", "sjf", 0.5),
+        ("lpt_spec", "lpt", 0.5),
+    ]
+    for name, order, quantile in cases:
+        # 解码耗时随响应长度增长（逐 token 项）；其中一个实例慢 3 倍
+        servers = [
+            MockVLLMServer(latency=args.latency, per_token_ms=0.5, seed=args.seed + i) for i in range(4)
+        ]
+        servers[0].config.latency_scale = 3.0
+        try:
+            with _quiet():
+                client = MultiVLLMClient([s.base_url for s in servers])
+            configure_telemetry(None)
+            scheduler = TaskScheduler(8, order=order, speculate_quantile=quantile)
+            done_at = []
+            t0 = time.perf_counter()
+            with _quiet():
+                for _, future in scheduler.run(tasks, client, run_fn):
+                    done_at.append(time.perf_counter() - t0)
+            wall = time.perf_counter() - t0
+            done_at.sort()
+            res = {
+                "tasks": len(tasks),
+                "wall_s": round(wall, 4),
+                "task_done_mean_s": round(statistics.fmean(done_at), 4),
+                "task_done_p50_s": round(done_at[len(done_at) // 2], 4),
+                "task_done_p95_s": round(done_at[int(len(done_at) * 0.95)], 4),
+                "requests": sum(s.stats["requests"] for s in servers),
+                "speculated": scheduler.speculated,
+                "speculative_wins": scheduler.speculative_wins,
+            }
+        finally:
+            for s in servers:
+                s.stop()
+        results[f"schedule.{name}"] = res
+        print(
+            f"  schedule.{name}: 总耗时 {res['wall_s']:.2f}s，平均完成时间 {res['task_done_mean_s']:.2f}s，"
+            f"推测执行 {res['speculated']} 次（副本先完成 {res['speculative_wins']} 次）"
+        )
+    return results
+
+
+def bench_prompt(args) -> Dict[str, dict]:
+    from analyze.prompting import build_1vN_prompt, build_packed_prompt
+
+    tasks = synthetic.make_tasks(2000, seed=args.seed)
+    packs = [tasks[i:i + 4] for i in range(0, len(tasks), 4)]
+    loops = max(1, args.json_loops // 4)
+    cases = {
+        "build_1vN": (len(tasks), lambda: [build_1vN_prompt(t) for t in tasks]),
+        "build_packed_4": (len(tasks), lambda: [build_packed_prompt(p) for p in packs]),
+    }
+    results = {}
+    for name, (n, fn) in cases.items():
+        best = _timed(lambda: [fn() for _ in range(loops)], repeat=3) / loops
+        results[f"prompt.{name}"] = {
+            "tasks": n,
+            "per_task_s": round(best / n, 9),
+            "tasks_per_s": round(n / best, 1),
+        }
+        print(f"  prompt.{name}: {n / best:,.0f} 任务/秒（{best / n * 1e6:.1f} us/任务）")
+    return results
+
+
+def _extract_json_block_reference(raw: str) -> str:
+    """优化前的 extract_json_block（逐字符扫描），作为 json 套件的参照实现。"""
+    anchor = "输入："
+    start = raw.find(anchor)
+    start = start + len(anchor) if start != -1 else 0
+    i = raw.find("{", start)
+    if i == -1:
+        i = raw.find("{")
+        if i == -1:
+            raise ValueError("未找到 JSON 起始位置")
+    depth = 0
+    in_str = False
+    esc = False
+    for j in range(i, len(raw)):
+        ch = raw[j]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        else:
+            if ch == '"':
+                in_str = True
+            elif ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth == 0:
+                    return raw[i : j + 1]
+    raise ValueError("未找到完整的 JSON 块")
+
+
+def bench_json(args) -> Dict[str, dict]:
+    import random
+
+    from analyze.llm_runner import _remember_parsed, decode_response, extract_json_block, parse_model_response
+    from analyze.prompting import build_1vN_prompt
+
+    rng = random.Random(args.seed)
+    tasks = synthetic.make_tasks(200, seed=args.seed)
+    clean = [synthetic.make_response_text(build_1vN_prompt(t), rng) for t in tasks]
+    wrapped = ["分析结果如下：\n" + c + "\n以上。" for c in clean]
+    # 接近真实的长响应：6~8 组对比，缩进排版后放在带说明文字的代码块中
+    long_tasks = synthetic.make_tasks(50, bads=(6, 8), seed=args.seed)
+    long_wrapped = [
+        "下面是逐项对比的分析结果：\n```json\n"
+        + json.dumps(json.loads(synthetic.make_response_text(build_1vN_prompt(t), rng)), ensure_ascii=False, indent=2)
+        + "\n```\n如需进一步说明请告诉我。"
+        for t in long_tasks
+    ]
+
+    def _parse_outcome(text):
+        # 调用层的校验：只解码一次，对象留给 parse_model_response 取用
+        try:
+            data, outcome = decode_response(text)
+        except ValueError:
+            return "invalid_json"
+        _remember_parsed(text, data)
+        return outcome
+
+    def validate_then_parse(texts):
+        # call_model + per_task 对每条响应的处理
+        return [parse_model_response(t) for t in texts if _parse_outcome(t) != "invalid_json"]
+
+    # 优化后的提取结果必须与参照实现完全一致
+    for text in wrapped + long_wrapped:
+        if extract_json_block(text) != _extract_json_block_reference(text):
+            raise AssertionError("extract_json_block 与参照实现的提取结果不一致")
+
+    loops = max(1, args.json_loops)
+    results = {}
+    cases = {
+        "json_loads_baseline": (clean, lambda: [json.loads(c) for c in clean]),
+        "parse_clean": (clean, lambda: [parse_model_response(c) for c in clean]),
+        "parse_wrapped": (wrapped, lambda: [parse_model_response(w) for w in wrapped]),
+        "extract_json_block_reference": (wrapped, lambda: [_extract_json_block_reference(w) for w in wrapped]),
+        "extract_json_block": (wrapped, lambda: [extract_json_block(w) for w in wrapped]),
+        "extract_json_block_long_reference": (
+            long_wrapped,
+            lambda: [_extract_json_block_reference(w) for w in long_wrapped],
+        ),
+        "extract_json_block_long": (long_wrapped, lambda: [extract_json_block(w) for w in long_wrapped]),
+        "validate_parse_clean": (clean, lambda: validate_then_parse(clean)),
+        "validate_parse_wrapped": (wrapped, lambda: validate_then_parse(wrapped)),
+        "validate_parse_long": (long_wrapped, lambda: validate_then_parse(long_wrapped)),
+    }
+    for name, (texts, fn) in cases.items():
+        n = len(texts)
+        best = _timed(lambda: [fn() for _ in range(loops)], repeat=3) / loops
+        results[f"json.{name}"] = {
+            "responses": n,
+            "avg_bytes": int(statistics.mean(len(t.encode("utf-8")) for t in texts)),
+            "per_response_s": round(best / n, 9),
+            "responses_per_s": round(n / best, 1),
+        }
+        print(f"  json.{name}: {results[f'json.{name}']['responses_per_s']} 响应/秒")
+    for name in ("extract_json_block", "extract_json_block_long"):
+        new, ref = results[f"json.{name}"], results[f"json.{name}_reference"]
+        new["speedup_vs_reference"] = round(ref["per_response_s"] / new["per_response_s"], 2)
+        print(f"  json.{name}: 相对参照实现加速 {new['speedup_vs_reference']}x")
+    return results
+
+
+def _write_per_task(workdir: str, n: int, seed: int) -> str:
+    return synthetic.write_per_task_jsonl(os.path.join(workdir, "per_task.jsonl"), n, seed=seed)
+
+
+def bench_aggregate(args, workdir: str) -> Dict[str, dict]:
+    from analyze.aggregate import export_aggregates
+
+    per_task = _write_per_task(workdir, args.records, args.seed)
+    results = {}
+    cases = {
+        "exact": dict(),
+        "approx": dict(approx_capacity=1000),
+        "exact_bootstrap": dict(bootstrap_resamples=1000),
+    }
+    for name, kwargs in cases.items():
+        out = os.path.join(workdir, f"agg_{name}")
+        os.makedirs(out, exist_ok=True)
+
+        def run():
+            with _quiet():
+                export_aggregates(
+                    per_task, os.path.join(out, "agg_dimension.csv"), os.path.join(out, "agg_keywords.csv"), **kwargs
+                )
+
+        wall = _timed(run, repeat=args.repeat)
+        results[f"aggregate.{name}"] = {
+            "records": args.records,
+            "wall_s": round(wall, 4),
+            "records_per_s": round(args.records / wall, 1),
+        }
+        print(f"  aggregate.{name}: {args.records} 条记录耗时 {wall:.3f}s")
+    return results
+
+
+def bench_plot(args, workdir: str) -> Dict[str, dict]:
+    from analyze.aggregate import export_aggregates
+    from analyze.visualize import plot_global_heatmaps, plot_global_radar, plot_pattern_wordcloud
+
+    per_task = _write_per_task(workdir, min(args.records, 2000), args.seed)
+    out = os.path.join(workdir, "plot")
+    os.makedirs(out, exist_ok=True)
+    with _quiet():
+        dim_csv, _kw, pos_csv, _anti = export_aggregates(
+            per_task, os.path.join(out, "agg_dimension.csv"), os.path.join(out, "agg_keywords.csv"),
+            bootstrap_resamples=200,
+        )
+    cases = {
+        "radar": lambda: plot_global_radar(dim_csv, os.path.join(out, "radar.png")),
+        "heatmap": lambda: plot_global_heatmaps(dim_csv, out),
+        "wordcloud": lambda: plot_pattern_wordcloud(pos_csv, os.path.join(out, "wc.png"), cache=False),
+        "wordcloud_preview": lambda: plot_pattern_wordcloud(pos_csv, os.path.join(out, "wc_preview.png"), cache=False, preview=True),
+    }
+    results = {}
+    for name, fn in cases.items():
+        try:
+            with _quiet():
+                wall = _timed(fn, repeat=args.repeat)
+        except ImportError as e:
+            print(f"[提示] plot.{name}: 跳过（{e}）")
+            continue
+        results[f"plot.{name}"] = {"wall_s": round(wall, 4)}
+        print(f"  plot.{name}: {wall:.3f}s")
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """输出各指标相对基线的变化，返回退化指标的名称列表。"""
+    regressions = []
+    for case, metrics in sorted(current.get("results", {}).items()):
+        base = baseline.get("results", {}).get(case)
+        if not base:
+            continue
+        for metric, value in metrics.items():
+            old = base.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            if metric.endswith("per_s"):
+                change = value / old - 1.0
+            elif metric.endswith("_s"):
+                change = old / value - 1.0 if value else 0.0
+            else:
+                continue
+            # change > 0 表示变快
+            flag = ""
+            if change < -threshold:
+                flag = "  <-- 退化"
+                regressions.append(f"{case}.{metric}")
+            print(f"  {case}.{metric}: {old:g} -> {value:g} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="基于模拟 vLLM 服务的离线基准测试")
+    ap.add_argument("--suite", default=",".join(SUITES), help=f"逗号分隔的套件子集，可选 {','.join(SUITES)}")
+    ap.add_argument("--quick", action="store_true", help="小规模冒烟运行（约 1 分钟）")
+    ap.add_argument("--tasks", type=int, default=400, help="analyze / multi_vllm / schedule 套件的任务数")
+    ap.add_argument("--records", type=int, default=50_000, help="aggregate 套件的 per_task 记录数")
+    ap.add_argument("--latency", default="lognormal:0.2,0.5", help="模拟服务的延迟规格")
+    ap.add_argument("--timeout", type=float, default=60.0, help="客户端请求超时（秒）")
+    ap.add_argument("--json-loops", type=int, default=20, help="json / prompt 套件的循环次数")
+    ap.add_argument("--repeat", type=int, default=3, help="CPU 密集用例的重复次数（取最短耗时）")
+    ap.add_argument("--seed", type=int, default=0, help="随机种子")
+    ap.add_argument("--out", default="", help="结果 JSON 路径（默认 benchmarks/results/bench_<时间戳>.json）")
+    ap.add_argument("--baseline", default="", help="用于比较的历史结果 JSON")
+    ap.add_argument("--threshold", type=float, default=0.10, help="判定为退化的相对变慢比例")
+    ap.add_argument("--fail-on-regression", action="store_true", help="存在退化指标时以非零状态码退出")
+    args = ap.parse_args(argv)
+
+    if args.quick:
+        args.tasks = min(args.tasks, 48)
+        args.records = min(args.records, 5000)
+        args.latency = "const:0.05" if args.latency == ap.get_default("latency") else args.latency
+        args.json_loops = min(args.json_loops, 3)
+        args.repeat = 1
+
+    suites = [s.strip() for s in args.suite.split(",") if s.strip()]
+    unknown = [s for s in suites if s not in SUITES]
+    if unknown:
+        ap.error(f"未知的套件: {', '.join(unknown)}")
+
+    results: Dict[str, dict] = {}
+    started = time.time()
+    with tempfile.TemporaryDirectory(prefix="analyze-bench-") as workdir:
+        for suite in suites:
+            print(f"== {suite}")
+            if suite == "analyze":
+                results.update(bench_analyze(args))
+            elif suite == "multi_vllm":
+                results.update(bench_multi_vllm(args))
+            elif suite == "schedule":
+                results.update(bench_schedule(args))
+            elif suite == "prompt":
+                results.update(bench_prompt(args))
+            elif suite == "json":
+                results.update(bench_json(args))
+            elif suite == "aggregate":
+                results.update(bench_aggregate(args, workdir))
+            elif suite == "plot":
+                results.update(bench_plot(args, workdir))
+
+    report = {
+        "meta": {
+            "timestamp": started,
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+            "duration_s": round(time.time() - started, 2),
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join(
+        ROOT, "benchmarks", "results", time.strftime("bench_%Y%m%d-%H%M%S.json", time.localtime(started))
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✓ 基准结果: {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"[警告] {len(regressions)} 项指标退化超过 {args.threshold:.0%}")
+            if args.fail_on_regression:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
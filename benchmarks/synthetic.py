@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+基准测试的合成输入：任务、模型响应与 per_task 记录。
+
+用法：
+  python -m benchmarks.synthetic --tasks 1000 --out /tmp/bench_tasks.jsonl
+  python -m benchmarks.synthetic --tasks 1000 --bads 2-6 --lines 20-200 --out tasks.jsonl
+
+任务按 analyze.io_utils.read_tasks_jsonl 读取的原始输入格式写出
+（task / good_code[list] / bad_code[list] / task_id / language）。响应遵循
+analyze.prompting.build_1vN_prompt 要求的输出 Schema，与真实模型输出一样经过
+parse_model_response、聚合与绘图。
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from analyze.schemas import BadCode, Dimension, TaskInput  # noqa: E402
+
+DIMENSIONS = [d.value for d in Dimension]
+LANGUAGES = ("python", "java", "cpp", "go", "javascript")
+
+# 小词表：关键词 / 模式计数呈现接近真实的长尾分布
+_KEYWORDS = [
+    "异常处理", "边界检查", "输入校验", "资源释放", "命名规范", "重复代码", "魔法数字", "全局变量",
+    "单元测试", "日志记录", "类型注解", "早返回", "嵌套过深", "硬编码路径", "并发安全", "缓存复用",
+    "时间复杂度", "空指针检查", "依赖注入", "接口抽象", "SQL 注入", "路径遍历", "函数过长", "注释缺失",
+]
+_ANTI = [
+    "缺少输入校验", "吞掉异常", "重复逻辑未抽取", "使用魔法数字", "变量命名含糊", "嵌套层级过深",
+    "未关闭文件句柄", "拼接 SQL 字符串", "循环内重复计算", "全局可变状态", "缺少边界条件处理",
+]
+_POSITIVE = [
+    "清晰的函数划分", "完善的异常处理", "一致的命名风格", "提前返回减少嵌套", "使用标准库",
+    "边界条件全覆盖", "类型注解完整", "资源使用 with 管理", "复杂度合理",
+]
+_RULES = ["抽取公共函数", "为外部输入增加校验", "用常量替换魔法数字", "使用 with 管理资源", "补充单元测试"]
+
+
+def _code(rng: random.Random, lines: int, bad: bool) -> str:
+    out = ["def solve(data):"]
+    for i in range(max(1, lines - 2)):
+        if bad and rng.random() < 0.2:
+            out.append(f"    x{i} = data[{i}] * 42  # magic")
+        else:
+            out.append(f"    value_{i} = process(data, {i})")
+    out.append("    return data")
+    return "\n".join(out) + "\n"
+
+
+def make_tasks(
+    n: int,
+    *,
+    bads: Tuple[int, int] = (1, 4),
+    lines: Tuple[int, int] = (10, 60),
+    seed: int = 0,
+    languages: Sequence[str] = LANGUAGES,
+) -> List[TaskInput]:
+    """生成 n 个任务，bad code 数量与代码行数在给定区间内均匀分布。"""
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(n):
+        n_bad = rng.randint(*bads)
+        tasks.append(
+            TaskInput(
+                task_id=f"S{i:06d}",
+                language=rng.choice(list(languages)),
+                prompt=f"实现第 {i} 个数据处理函数，处理空输入与越界。",
+                good_code=_code(rng, rng.randint(*lines), bad=False),
+                bad_codes=[
+                    BadCode(bad_id=f"b{j + 1}", code=_code(rng, rng.randint(*lines), bad=True))
+                    for j in range(n_bad)
+                ],
+            )
+        )
+    return tasks
+
+
+def task_record(task: TaskInput) -> dict:
+    """原始输入记录（analyze.io_utils.read_tasks_jsonl 读取的格式）。"""
+    return {
+        "task_id": task.task_id,
+        "language": task.language,
+        "task": task.prompt,
+        "good_code": [task.good_code],
+        "bad_code": [b.code for b in task.bad_codes],
+    }
+
+
+def write_tasks_jsonl(path: str, tasks: Sequence[TaskInput]) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for t in tasks:
+            f.write(json.dumps(task_record(t), ensure_ascii=False) + "\n")
+    return path
+
+
+def make_output(task_id: str, bad_ids: Sequence[str], rng: random.Random) -> dict:
+    """一条遵循 build_1vN_prompt 输出 Schema 的模型响应。"""
+    comparisons = []
+    for bad_id in bad_ids or ["b1"]:
+        scores = {}
+        for d in DIMENSIONS:
+            good = rng.randint(3, 5)
+            bad = rng.randint(0, good)
+            scores[d] = {"good": good, "bad": bad, "evidence": "差异明显" if good - bad >= 2 else "?"}
+        comparisons.append(
+            {
+                "bad_id": bad_id,
+                "dimension_scores": scores,
+                "discriminative_keywords": [
+                    {"phrase": rng.choice(_KEYWORDS), "dimension": rng.choice(DIMENSIONS), "weight": round(rng.random(), 2)}
+                    for _ in range(rng.randint(2, 5))
+                ],
+                "anti_patterns": rng.sample(_ANTI, rng.randint(2, 4)),
+                "actionable_rules_local": rng.sample(_RULES, 2),
+            }
+        )
+    return {
+        "task_id": task_id,
+        "prompt_brief": "数据处理函数",
+        "per_bad_comparisons": comparisons,
+        "positive_patterns": rng.sample(_POSITIVE, rng.randint(2, 4)),
+        "task_level_agg": None,
+    }
+
+
+_TASK_ID_RE = re.compile(r'"task_id":\s*"')
+_BAD_ID_RE = re.compile(r'"bad_id":\s*"([^"]+)"')
+
+
+def parse_prompt_tasks(prompt: str) -> Tuple[List[Tuple[str, List[str]]], bool]:
+    """从单任务或打包 Prompt 中还原 (task_id, bad_ids) 列表，返回 (tasks, 是否打包)。"""
+    section = prompt.split("输入：", 1)[-1].split("输出 JSON Schema", 1)[0]
+    tasks = []
+    for part in _TASK_ID_RE.split(section)[1:]:
+        task_id = part.split('"', 1)[0]
+        bad_ids = list(dict.fromkeys(_BAD_ID_RE.findall(part)))
+        tasks.append((task_id, bad_ids))
+    return tasks, '"tasks": [' in section
+
+
+def make_response_text(prompt: str, rng: random.Random, *, prefix: str = "") -> str:
+    """为 Prompt 生成类似模型输出的响应文本（打包 Prompt 返回 {"results": [...]}）。"""
+    tasks, packed = parse_prompt_tasks(prompt)
+    outs = [make_output(tid, bids, rng) for tid, bids in tasks] or [make_output("T0000", ["b1"], rng)]
+    body = {"results": outs} if packed else outs[0]
+    return prefix + json.dumps(body, ensure_ascii=False)
+
+
+def iter_per_task(n: int, *, bads: Tuple[int, int] = (1, 4), seed: int = 0) -> Iterator[dict]:
+    """不调用模型直接生成 per_task.jsonl 记录（格式同 run_pipeline 第 3 步的输出）。"""
+    rng = random.Random(seed)
+    for i in range(n):
+        rec = make_output(f"S{i:06d}", [f"b{j + 1}" for j in range(rng.randint(*bads))], rng)
+        rec["language"] = rng.choice(LANGUAGES)
+        yield rec
+
+
+def write_per_task_jsonl(path: str, n: int, *, seed: int = 0) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in iter_per_task(n, seed=seed):
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    return path
+
+
+def _range(text: str) -> Tuple[int, int]:
+    lo, _, hi = text.partition("-")
+    return int(lo), int(hi or lo)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="生成基准测试用的合成输入")
+    ap.add_argument("--tasks", type=int, default=1000, help="任务数")
+    ap.add_argument("--bads", default="1-4", help="每个任务的 bad code 数量区间，如 1-4")
+    ap.add_argument("--lines", default="10-60", help="每段代码的行数区间，如 10-60")
+    ap.add_argument("--seed", type=int, default=0, help="随机种子")
+    ap.add_argument("--per-task", action="store_true", help="写出 per_task 记录而不是任务")
+    ap.add_argument("--out", required=True, help="输出 JSONL 路径")
+    args = ap.parse_args(argv)
+
+    if args.per_task:
+        write_per_task_jsonl(args.out, args.tasks, seed=args.seed)
+    else:
+        tasks = make_tasks(args.tasks, bads=_range(args.bads), lines=_range(args.lines), seed=args.seed)
+        write_tasks_jsonl(args.out, tasks)
+    print(f"✓ 写出 {args.tasks} 条记录: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Check that `import analyze` stays cheap.
+
+The package resolves its public names lazily, so importing it must not pull in
+heavy optional dependencies (openai, tqdm, matplotlib, wordcloud, numpy, pandas)
+and should finish within a small time budget.
+
+Usage:
+  python scripts/check_import_time.py                # default budget 100 ms
+  python scripts/check_import_time.py --budget-ms 50 --runs 7
+  python scripts/check_import_time.py --module analyze.aggregate
+
+Each run starts a fresh interpreter and measures the import with
+`python -X importtime`; the median over runs is compared with the budget.
+Exit code is 0 when within budget and no heavy module was imported, 1 otherwise.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+HEAVY_MODULES = ("openai", "tqdm", "matplotlib", "wordcloud", "numpy", "pandas", "requests")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def _print(msg: str):
+    print(f"[import-time] {msg}")
+
+
+def measure(module: str) -> Tuple[float, List[str]]:
+    """Import `module` in a fresh interpreter; return (cumulative ms, heavy modules loaded)."""
+    code = (
+        f"import sys, {module}\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        # top-level entries (no indentation) belong to the requested import chain
+        if m and m.group(4).split(".")[0] == module.split(".")[0] and len(m.group(3)) == 1:
+            total_us += int(m.group(2))
+    heavy = [m for m in proc.stdout.strip().split(",") if m]
+    return total_us / 1000.0, heavy
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the import-time budget of the analyze package")
+    parser.add_argument("--module", default="analyze", help="module to import (default: analyze)")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="median import-time budget in ms")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh-interpreter runs")
+    args = parser.parse_args(argv)
+
+    times = []
+    heavy: List[str] = []
+    for _ in range(max(1, args.runs)):
+        ms, heavy = measure(args.module)
+        times.append(ms)
+    median = statistics.median(times)
+    _print(f"{args.module}: median {median:.1f} ms over {len(times)} runs (budget {args.budget_ms:.0f} ms)")
+
+    ok = True
+    if heavy:
+        _print(f"FAIL: heavy modules imported eagerly: {', '.join(heavy)}")
+        ok = False
+    if median > args.budget_ms:
+        _print("FAIL: import time over budget")
+        ok = False
+    if ok:
+        _print("OK")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())